@@ -0,0 +1,119 @@
+"""Compare top-k retrieval with reduced precision embeddings against float32.
+
+The corpus is the backgrounds and targets from annotated PeerRead papers
+(`gpt.PeerReadAnnotated`), and a sample of them is used as queries. For each precision
+in `emb.StorageDtype`, we measure the storage size and the overlap between the top-k
+retrieved with that precision and with float32, for both storage paths:
+
+- Graph: `emb.MatrixData` matrices used by the PETER and SciMON graphs (int8 uses a
+  scale per row).
+- Vector DB: faiss indexes used by `VectorDatabase` (int8 uses a scale per dimension).
+"""
+
+import random
+from pathlib import Path
+from typing import Annotated
+
+import faiss  # type: ignore
+import numpy as np
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from paper import embedding as emb
+from paper import gpt
+from paper.util.serde import load_data
+from paper.vector_db import IndexConfig, create_index
+
+app = typer.Typer(
+    context_settings={"help_option_names": ["-h", "--help"]},
+    add_completion=False,
+    rich_markup_mode="rich",
+    pretty_exceptions_show_locals=False,
+    no_args_is_help=True,
+)
+
+
+@app.command(help=__doc__, no_args_is_help=True)
+def main(
+    ann_file: Annotated[
+        Path,
+        typer.Option(
+            "--peerread-ann",
+            help="File with PeerRead papers with extracted backgrounds and targets.",
+        ),
+    ],
+    model_name: Annotated[
+        str, typer.Option("--model", help="SentenceTransformer model to use.")
+    ] = emb.DEFAULT_SENTENCE_MODEL,
+    limit: Annotated[
+        int | None, typer.Option("--limit", "-n", help="Number of papers to use.")
+    ] = None,
+    num_queries: Annotated[
+        int,
+        typer.Option("--queries", help="Number of queries sampled from the corpus."),
+    ] = 500,
+    k: Annotated[int, typer.Option(help="Number of results retrieved per query.")] = 10,
+    seed: Annotated[int, typer.Option(help="Random seed to sample queries.")] = 0,
+) -> None:
+    """Report storage size and top-k overlap with float32 for each precision."""
+    papers = gpt.PromptResult.unwrap(
+        load_data(ann_file, gpt.PromptResult[gpt.PeerReadAnnotated])
+    )[:limit]
+    texts = [p.background for p in papers] + [p.target for p in papers]
+
+    encoder = emb.Encoder(model_name)
+    corpus = emb.normalize(encoder.batch_encode(texts, progress=True))
+    queries = corpus[
+        random.Random(seed).sample(range(len(corpus)), min(num_queries, len(corpus)))
+    ]
+
+    _, graph_reference = emb.top_k_cosine(queries, corpus, k)
+    _, db_reference = _index_search(corpus, queries, emb.StorageDtype.FLOAT32, k)
+
+    table = Table("Storage", "Precision", "Size (MiB)", "Ratio", f"Overlap@{k}")
+    graph_base = corpus.nbytes
+    for precision in emb.StorageDtype:
+        data = emb.MatrixData.from_matrix(corpus, precision)
+        matrix = emb.normalize(data.to_matrix())
+        _, indices = emb.top_k_cosine(queries, matrix, k)
+        table.add_row(
+            "Graph",
+            precision,
+            f"{data.nbytes / 2**20:.2f}",
+            f"{data.nbytes / graph_base:.2f}",
+            f"{emb.top_k_overlap(graph_reference, indices):.4f}",
+        )
+
+    db_base = None
+    for precision in emb.StorageDtype:
+        size, indices = _index_search(corpus, queries, precision, k)
+        db_base = db_base or size
+        table.add_row(
+            "Vector DB",
+            precision,
+            f"{size / 2**20:.2f}",
+            f"{size / db_base:.2f}",
+            f"{emb.top_k_overlap(db_reference, indices):.4f}",
+        )
+
+    Console().print(
+        f"{len(corpus)} vectors, {len(queries)} queries, {corpus.shape[1]} dimensions."
+    )
+    Console().print(table)
+
+
+def _index_search(
+    corpus: emb.Matrix, queries: emb.Matrix, precision: emb.StorageDtype, k: int
+) -> tuple[int, np.ndarray]:
+    """Build index with `precision` and search. Returns serialised size and indices."""
+    index = create_index(corpus.shape[1], IndexConfig(precision=precision))
+    if not index.is_trained:
+        index.train(corpus)  # type: ignore
+    index.add(corpus)  # type: ignore
+    _, indices = index.search(queries, k)  # type: ignore
+    return faiss.serialize_index(index).nbytes, indices
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,129 @@
+"""Compare sentence encoder backends: parity, latency, throughput and memory.
+
+Each backend in `emb.EncoderBackend` is checked against the PyTorch reference: the
+cosine similarity between their embeddings of the same texts should be at least
+`--min-cosine`. Latency is measured for single-text `encode` calls (like an API
+request), throughput for `batch_encode` over the whole corpus.
+
+Texts are the titles and backgrounds from annotated PeerRead papers
+(`gpt.PeerReadAnnotated`). The ONNX backends require the `onnx` extra.
+"""
+
+import gc
+import statistics
+import time
+from pathlib import Path
+from typing import Annotated
+
+import psutil
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from paper import embedding as emb
+from paper import gpt
+from paper.util.serde import load_data
+
+app = typer.Typer(
+    context_settings={"help_option_names": ["-h", "--help"]},
+    add_completion=False,
+    rich_markup_mode="rich",
+    pretty_exceptions_show_locals=False,
+    no_args_is_help=True,
+)
+
+
+def _rss_mb() -> float:
+    """Resident set size of the current process in MiB."""
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+@app.command(help=__doc__, no_args_is_help=True)
+def main(
+    ann_file: Annotated[
+        Path,
+        typer.Option(
+            "--peerread-ann",
+            help="File with PeerRead papers with extracted backgrounds and targets.",
+        ),
+    ],
+    model_name: Annotated[
+        str, typer.Option("--model", help="SentenceTransformer model to use.")
+    ] = emb.DEFAULT_SENTENCE_MODEL,
+    backends: Annotated[
+        list[emb.EncoderBackend] | None,
+        typer.Option("--backend", help="Backends to compare. Defaults to all."),
+    ] = None,
+    batch_size: Annotated[int, typer.Option(help="Encoding batch size.")] = 128,
+    limit: Annotated[
+        int | None, typer.Option("--limit", "-n", help="Number of papers to use.")
+    ] = None,
+    latency_queries: Annotated[
+        int, typer.Option(help="Number of single-text queries to time.")
+    ] = 200,
+    min_cosine: Annotated[
+        float, typer.Option(help="Minimum cosine similarity with the reference.")
+    ] = emb.PARITY_MIN_COSINE,
+) -> None:
+    """Compare sentence encoder backends on CPU."""
+    papers = gpt.PromptResult.unwrap(
+        load_data(ann_file, gpt.PromptResult[gpt.PeerReadAnnotated])
+    )[:limit]
+    texts = [p.title for p in papers] + [p.background for p in papers]
+    queries = texts[:latency_queries]
+
+    reference = emb.Encoder(model_name, "cpu", use_cache=False)
+
+    table = Table(
+        "Backend",
+        "Load (s)",
+        "RSS delta (MiB)",
+        "Latency p50 (ms)",
+        "Latency p95 (ms)",
+        "Throughput (texts/s)",
+        "Min cosine",
+        "Mean cosine",
+        "Parity",
+    )
+    for backend in backends or list(emb.EncoderBackend):
+        gc.collect()
+        rss_before = _rss_mb()
+
+        start = time.perf_counter()
+        encoder = emb.Encoder(model_name, "cpu", use_cache=False, backend=backend)
+        load_time = time.perf_counter() - start
+        rss_delta = _rss_mb() - rss_before
+
+        # Warm-up
+        encoder.batch_encode(texts[:batch_size], batch_size)
+
+        latencies: list[float] = []
+        for query in queries:
+            start = time.perf_counter()
+            encoder.encode(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        encoder.batch_encode(texts, batch_size)
+        throughput = len(texts) / (time.perf_counter() - start)
+
+        parity = emb.embedding_parity(reference, encoder, texts, batch_size)
+
+        table.add_row(
+            backend,
+            f"{load_time:.2f}",
+            f"{rss_delta:.0f}",
+            f"{statistics.median(latencies):.2f}",
+            f"{statistics.quantiles(latencies, n=20)[-1]:.2f}",
+            f"{throughput:.1f}",
+            f"{parity.min():.4f}",
+            f"{parity.mean():.4f}",
+            "[green]ok[/green]" if parity.min() >= min_cosine else "[red]FAIL[/red]",
+        )
+        del encoder
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,249 @@
+"""Measure PETER graph query throughput with validated and unvalidated result objects.
+
+Builds a synthetic PETER graph with random unit embeddings and random citation lists,
+then runs `Graph.query_many` on random queries. Query vectors are random too, so the
+encoder isn't part of the measurement.
+
+The "previous code" variant restores how results used to be built: every one of the 2K
+hits retrieved per side was converted to a `SemanticResult`, and each result went
+through full Pydantic validation (`SemanticResult.from_related` via `model_dump` and
+`model_validate`, and `PaperRelated.from_` and the query results via their
+constructors). The "validated" variant keeps the validation but only converts the
+selected hits. The "model_construct" variant is the current code. "Similarity only" is
+the time for the top-K matrix products alone, which is the lower bound for a query.
+"""
+# pyright: basic
+
+import contextlib
+import random
+import time
+from collections.abc import Generator, Sequence
+from typing import Annotated, Any
+
+import numpy as np
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from paper import embedding as emb
+from paper import related_papers as rp
+from paper.peerread import ContextPolarity
+from paper.peter import citations, semantic
+from paper.peter.graph import Graph
+
+app = typer.Typer(
+    context_settings={"help_option_names": ["-h", "--help"]},
+    add_completion=False,
+    rich_markup_mode="rich",
+    pretty_exceptions_show_locals=False,
+    no_args_is_help=True,
+)
+
+
+class _RandomEncoder:
+    """Stand-in encoder that returns random unit vectors."""
+
+    model_name = "random"
+
+    def __init__(self, dimensions: int, seed: int) -> None:
+        self.dimensions = dimensions
+        self.rng = np.random.default_rng(seed)
+
+    def batch_encode(self, texts: Sequence[str], **_: Any) -> emb.Matrix:
+        """Random unit vector for each text."""
+        return _random_unit(self.rng, len(texts), self.dimensions)
+
+
+class _Query:
+    """Paper used to query the graph."""
+
+    def __init__(self, id: str, background: str, target: str) -> None:
+        self.id = id
+        self.background = background
+        self.target = target
+
+
+@app.command(help=__doc__)
+def main(
+    num_papers: Annotated[
+        int, typer.Option("--papers", help="Number of papers in the graph.")
+    ] = 20_000,
+    num_queries: Annotated[
+        int, typer.Option("--queries", help="Number of papers to query.")
+    ] = 2_000,
+    num_cited: Annotated[
+        int, typer.Option("--cited", help="Cited papers per polarity for each paper.")
+    ] = 10,
+    dimensions: Annotated[int, typer.Option(help="Embedding dimensions.")] = 384,
+    k: Annotated[
+        int, typer.Option(help="Semantic and citation results per polarity.")
+    ] = 5,
+    seed: Annotated[int, typer.Option(help="Random seed.")] = 0,
+) -> None:
+    """Compare query throughput with and without result validation."""
+    rng = np.random.default_rng(seed)
+    encoder = _RandomEncoder(dimensions, seed)
+    graph = _synthetic_graph(rng, encoder, num_papers, num_cited)
+    ids = random.Random(seed).choices(range(num_papers), k=num_queries)
+    queries = [
+        _Query(str(i), f"query background {i}", f"query target {i}") for i in ids
+    ]
+
+    Console().print(
+        f"{num_papers} papers, {num_queries} queries, {dimensions} dimensions, k={k}."
+    )
+    table = Table("Variant", "Time (s)", "Queries/s", "Speedup")
+
+    matrix = _random_unit(rng, num_papers, dimensions)
+    query_vectors = _random_unit(rng, num_queries, dimensions)
+    start = time.perf_counter()
+    # Background and target sides, each retrieving 2K like the semantic graph.
+    for _ in range(2):
+        emb.top_k_cosine(query_vectors, matrix, 2 * k)
+    similarity_time = time.perf_counter() - start
+
+    with _previous_results():
+        previous_time = _time_queries(graph, queries, k)
+    with _validated_results():
+        validated_time = _time_queries(graph, queries, k)
+    construct_time = _time_queries(graph, queries, k)
+
+    for name, elapsed in [
+        ("Similarity only", similarity_time),
+        ("previous code", previous_time),
+        ("validated", validated_time),
+        ("model_construct", construct_time),
+    ]:
+        table.add_row(
+            name,
+            f"{elapsed:.3f}",
+            f"{num_queries / elapsed:.0f}",
+            f"{previous_time / elapsed:.2f}x",
+        )
+
+    Console().print(table)
+
+
+def _time_queries(graph: Graph, queries: Sequence[_Query], k: int) -> float:
+    start = time.perf_counter()
+    graph.query_many(queries, semantic_k=k, citation_k=k)
+    return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def _validated_results() -> Generator[None]:
+    """Temporarily build query results with full validation, like before."""
+
+    def from_related(
+        cls: type[semantic.SemanticResult],
+        *,
+        related: semantic._PaperRelated,
+        score: float,
+    ) -> semantic.SemanticResult:
+        return cls.model_validate(related.model_dump() | {"score": score})
+
+    def validated(cls: type[Any], **kwargs: Any) -> Any:
+        return cls(**kwargs)
+
+    patches = [
+        (semantic.SemanticResult, "from_related", classmethod(from_related)),
+        (rp.PaperRelated, "model_construct", classmethod(validated)),
+        (rp.QueryResult, "model_construct", classmethod(validated)),
+        (semantic.QueryResult, "model_construct", classmethod(validated)),
+        (citations.QueryResult, "model_construct", classmethod(validated)),
+    ]
+    # `model_construct` is inherited, so restoring it means deleting the patch.
+    originals = [(cls, name, cls.__dict__.get(name)) for cls, name, _ in patches]
+    try:
+        for cls, name, patch in patches:
+            setattr(cls, name, patch)
+        yield
+    finally:
+        for cls, name, original in originals:
+            if original is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, original)
+
+
+@contextlib.contextmanager
+def _previous_results() -> Generator[None]:
+    """Temporarily build results like before: validated, and for every retrieved hit."""
+    hits = semantic._hits  # noqa: SLF001
+
+    def all_converted(*args: Any) -> list[Any]:
+        # The previous code converted all retrieved hits before removing the common
+        # papers and taking the top K.
+        result = hits(*args)
+        for hit in result:
+            semantic.SemanticResult.from_related(related=hit.paper, score=hit.score)
+        return result
+
+    semantic._hits = all_converted  # noqa: SLF001
+    try:
+        with _validated_results():
+            yield
+    finally:
+        semantic._hits = hits  # noqa: SLF001
+
+
+def _synthetic_graph(
+    rng: np.random.Generator, encoder: _RandomEncoder, num_papers: int, num_cited: int
+) -> Graph:
+    papers = [
+        semantic._PaperRelated(  # noqa: SLF001
+            title=f"Paper {i}",
+            abstract=f"Abstract of paper {i}. " * 10,
+            paper_id=str(i),
+            background=f"background {i}",
+            target=f"target {i}",
+            year=2000 + i % 25,
+            authors=[f"Author {i}", f"Author {i + 1}"],
+            venue="Venue",
+            citation_count=i,
+        )
+        for i in range(num_papers)
+    ]
+
+    def components(nodes: list[str]) -> semantic._Components:
+        return semantic._Components(  # noqa: SLF001
+            nodes=nodes,
+            embeddings=_random_unit(rng, num_papers, encoder.dimensions),
+            node_to_paper=dict(zip(nodes, papers)),
+        )
+
+    def cited(polarity: ContextPolarity) -> list[citations.Citation]:
+        scores = np.sort(rng.random(num_cited))[::-1]
+        return [
+            citations.Citation(
+                score=float(score),
+                paper_id=f"cited {j}",
+                title=f"Cited paper {j}",
+                abstract=f"Abstract of cited paper {j}. " * 10,
+                polarity=polarity,
+                authors=[f"Author {j}"],
+            )
+            for j, score in enumerate(scores)
+        ]
+
+    citation_graph = citations.Graph(
+        title_to_id={},
+        id_polarity_to_cited={
+            str(i): {polarity: cited(polarity) for polarity in ContextPolarity}
+            for i in range(num_papers)
+        },
+    )
+    semantic_graph = semantic.Graph(
+        encoder=encoder,  # type: ignore
+        backgrounds=components([p.background for p in papers]),
+        targets=components([p.target for p in papers]),
+    )
+    return Graph(citation=citation_graph, semantic=semantic_graph, encoder_model="")
+
+
+def _random_unit(rng: np.random.Generator, n: int, dimensions: int) -> emb.Matrix:
+    return emb.normalize(rng.standard_normal((n, dimensions), dtype=np.float32))
+
+
+if __name__ == "__main__":
+    app()
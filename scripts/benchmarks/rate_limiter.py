@@ -0,0 +1,137 @@
+"""Compare chat rate limiters with many concurrent requests waiting for capacity.
+
+Starts N requests at once through a limiter with a small request limit, so most of them
+have to wait, and measures the wall and CPU time until all are admitted. The requests
+don't do anything once admitted, so the time is all the limiter's.
+
+"sliding window" is the previous `ChatRateLimiter`: every request is kept in a dict
+that is scanned on each check, and waiting requests poll every 50 ms. "token bucket"
+is the current one, where waiting requests are woken by a single timer. The minimum
+time is when the last request could be admitted at the configured rate.
+"""
+
+import asyncio
+import statistics
+import time
+import uuid
+from typing import Annotated
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from paper.util.rate_limiter import ChatRateLimiter, Message, count_request_tokens
+
+app = typer.Typer(
+    context_settings={"help_option_names": ["-h", "--help"]},
+    add_completion=False,
+    rich_markup_mode="rich",
+    pretty_exceptions_show_locals=False,
+    no_args_is_help=True,
+)
+
+_MESSAGES: list[Message] = [{"role": "user", "content": "How novel is this paper?"}]
+
+
+class _SlidingWindowLimiter:
+    """Admission logic of the previous `ChatRateLimiter`."""
+
+    def __init__(self, request_limit: int, token_limit: int, window: float) -> None:
+        self._request_limit = request_limit
+        self._token_limit = token_limit
+        self._window = window
+        self._requests: dict[int, tuple[float, int, bool]] = {}
+        self._lock = asyncio.Lock()
+
+    def _usage(self) -> tuple[int, int]:
+        cutoff = time.time() - self._window
+        for req_id in [
+            req_id for req_id, (ts, _, _) in self._requests.items() if ts < cutoff
+        ]:
+            del self._requests[req_id]
+        return len(self._requests), sum(t for _, t, _ in self._requests.values())
+
+    async def acquire(self, tokens: int) -> None:
+        request_id = uuid.uuid4().int
+        while True:
+            async with self._lock:
+                requests, used = self._usage()
+                if (
+                    requests < self._request_limit
+                    and used + tokens <= self._token_limit
+                ):
+                    self._requests[request_id] = (time.time(), tokens, False)
+                    return
+            await asyncio.sleep(0.05)
+
+
+@app.command(help=__doc__)
+def main(
+    waiters: Annotated[
+        int, typer.Option(help="Number of concurrent requests.")
+    ] = 10_000,
+    request_limit: Annotated[
+        int, typer.Option(help="Requests allowed per window.")
+    ] = 2_000,
+    window: Annotated[int, typer.Option(help="Window size in seconds.")] = 1,
+) -> None:
+    """Time how long each limiter takes to admit all requests."""
+    tokens = count_request_tokens(_MESSAGES)
+    token_limit = request_limit * tokens * 10  # Only the request limit matters
+
+    Console().print(
+        f"{waiters} requests, limit of {request_limit} requests per {window}s."
+    )
+    table = Table(
+        "Limiter", "Wall (s)", "CPU (s)", "Minimum (s)", "Mean wait (s)", "Max wait (s)"
+    )
+
+    async def sliding_window() -> list[float]:
+        limiter = _SlidingWindowLimiter(request_limit, token_limit, window)
+
+        async def request() -> float:
+            start = time.perf_counter()
+            await limiter.acquire(tokens)
+            return time.perf_counter() - start
+
+        return await asyncio.gather(*(request() for _ in range(waiters)))
+
+    async def token_bucket() -> list[float]:
+        limiter = ChatRateLimiter(request_limit, token_limit, window)
+
+        async def request() -> float:
+            start = time.perf_counter()
+            async with limiter.limit(messages=_MESSAGES):
+                return time.perf_counter() - start
+
+        return await asyncio.gather(*(request() for _ in range(waiters)))
+
+    # The sliding window admits a full window's worth, then waits for it to expire.
+    sliding_minimum = (waiters - 1) // request_limit * window
+    # The bucket starts full, then admits at the refill rate.
+    bucket_minimum = max(0, waiters - request_limit) * window / request_limit
+
+    for name, run, minimum in [
+        ("sliding window", sliding_window, sliding_minimum),
+        ("token bucket", token_bucket, bucket_minimum),
+    ]:
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        waits = asyncio.run(run())
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+
+        table.add_row(
+            name,
+            f"{wall:.2f}",
+            f"{cpu:.2f}",
+            f"{minimum:.2f}",
+            f"{statistics.mean(waits):.3f}",
+            f"{max(waits):.3f}",
+        )
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    app()
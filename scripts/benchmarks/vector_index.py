@@ -0,0 +1,145 @@
+"""Compare approximate vector indexes with the exact flat index: recall@k vs latency.
+
+The vectors come from an existing flat `VectorDatabase` (e.g. from `paper baselines
+nova build`), so nothing is encoded. A random sample of them is held out as queries
+and the rest is indexed. Recall@k is the fraction of the exact top-k that each index
+retrieves, and latency is the mean search time per query, searching one query at a
+time like `VectorDatabase.search` calls from an API.
+
+Each index type is measured for several values of its query-time parameter (`nprobe`
+for IVF, `efSearch` for HNSW).
+"""
+
+import random
+import time
+from pathlib import Path
+from typing import Annotated
+
+import faiss  # type: ignore
+import numpy as np
+import numpy.typing as npt
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from paper import embedding as emb
+from paper.vector_db import (
+    DEFAULT_IVF_NLIST,
+    IndexConfig,
+    IndexType,
+    VectorDatabase,
+    create_index,
+    set_search_params,
+)
+
+app = typer.Typer(
+    context_settings={"help_option_names": ["-h", "--help"]},
+    add_completion=False,
+    rich_markup_mode="rich",
+    pretty_exceptions_show_locals=False,
+    no_args_is_help=True,
+)
+
+_SEARCH_PARAMS = [1, 4, 16, 64, 256]
+"""Values of `nprobe` (IVF) and `efSearch` (HNSW) to measure."""
+
+
+@app.command(help=__doc__, no_args_is_help=True)
+def main(
+    db_dir: Annotated[
+        Path, typer.Option("--db", help="Directory with a flat vector database.")
+    ],
+    num_queries: Annotated[
+        int, typer.Option("--queries", help="Number of vectors held out as queries.")
+    ] = 1000,
+    k: Annotated[int, typer.Option(help="Number of results retrieved per query.")] = 10,
+    nlist: Annotated[
+        int, typer.Option(help="Number of clusters for IVF indexes.")
+    ] = DEFAULT_IVF_NLIST,
+    index_types: Annotated[
+        list[IndexType] | None,
+        typer.Option("--index", help="Index types to compare. Defaults to all."),
+    ] = None,
+    seed: Annotated[int, typer.Option(help="Random seed to sample queries.")] = 0,
+) -> None:
+    """Measure recall@k and latency of approximate indexes against the flat index."""
+    db = VectorDatabase.load(db_dir)
+    vectors = db.index.reconstruct_n(0, db.index.ntotal)
+    db.encoder.close()
+
+    query_idx = random.Random(seed).sample(range(len(vectors)), num_queries)
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[query_idx] = False
+    corpus, queries = vectors[mask], vectors[query_idx]
+
+    flat = create_index(corpus.shape[1])
+    flat.add(corpus)  # type: ignore
+    exact = _search(flat, queries, k)
+
+    Console().print(
+        f"{len(corpus)} vectors, {len(queries)} queries, {corpus.shape[1]} dimensions."
+    )
+
+    table = Table(
+        "Index", "Param", "Build (s)", "Size (MiB)", f"Recall@{k}", "Latency (ms)"
+    )
+    table.add_row(
+        IndexType.FLAT,
+        "-",
+        "-",
+        f"{_size_mb(flat):.1f}",
+        "1.0000",
+        f"{_latency_ms(flat, queries, k):.3f}",
+    )
+
+    for index_type in index_types or list(IndexType):
+        if index_type is IndexType.FLAT:
+            continue
+
+        config = IndexConfig(type=index_type, nlist=nlist)
+        start = time.perf_counter()
+        index = create_index(corpus.shape[1], config)
+        if not index.is_trained:
+            index.train(corpus)  # type: ignore
+        index.add(corpus)  # type: ignore
+        build_time = time.perf_counter() - start
+
+        for param in _SEARCH_PARAMS:
+            if index_type is not IndexType.HNSW and param > nlist:
+                continue
+
+            set_search_params(index, config, nprobe=param, ef_search=param)
+            indices = _search(index, queries, k)
+            table.add_row(
+                index_type,
+                f"{'efSearch' if index_type is IndexType.HNSW else 'nprobe'}={param}",
+                f"{build_time:.1f}",
+                f"{_size_mb(index):.1f}",
+                f"{emb.top_k_overlap(exact, indices):.4f}",
+                f"{_latency_ms(index, queries, k):.3f}",
+            )
+
+    Console().print(table)
+
+
+def _search(index: faiss.Index, queries: emb.Matrix, k: int) -> npt.NDArray[np.int64]:
+    """Indices of the top `k` results in `index` for each query."""
+    _, indices = index.search(queries, k)  # type: ignore
+    return indices
+
+
+def _size_mb(index: faiss.Index) -> float:
+    """Serialised size of the index in MiB."""
+    return faiss.serialize_index(index).nbytes / 2**20
+
+
+def _latency_ms(index: faiss.Index, queries: emb.Matrix, k: int) -> float:
+    """Mean time in milliseconds to search each query on its own."""
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query[None, :], k)  # type: ignore
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+if __name__ == "__main__":
+    app()
@@ -14,6 +14,7 @@ from paper.gpt.run_gpt import LLMClient
 from paper.util import rate_limiter
 
 ENABLE_NETWORK = os.getenv("XP_ENABLE_NETWORK", "0") == "1"
+ENCODER_BACKEND = emb.EncoderBackend(os.getenv("XP_ENCODER_BACKEND", "torch"))
 
 
 @asynccontextmanager
@@ -34,7 +35,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     dotenv.load_dotenv()
     app.state.limiter = rate_limiter.get_limiter(use_semaphore=False)
     app.state.llm_registry = LLMClientRegistry()
-    app.state.encoder = emb.Encoder(device="cpu")
+    app.state.encoder = emb.Encoder(device="cpu", backend=ENCODER_BACKEND)
 
     db: DatabaseManager | None = None
     try:
@@ -17,15 +17,21 @@ import typer
 from pydantic import computed_field
 from tqdm import tqdm
 
+from paper import embedding as emb
 from paper import gpt
 from paper import semantic_scholar as s2
 from paper.evaluation_metrics import calculate_paper_metrics, display_metrics
+from paper.sharded_vector_db import ShardedVectorDatabase, open_database
 from paper.types import Immutable
 from paper.util import get_params, render_params, sample, setup_logging
 from paper.util.cli import die
 from paper.util.serde import load_data, load_data_jsonl, save_data, save_data_jsonl
 from paper.vector_db import (
+    DEFAULT_HNSW_M,
+    DEFAULT_IVF_NLIST,
     DEFAULT_SENTENCE_MODEL,
+    IndexConfig,
+    IndexType,
     SearchMatch,
     SearchResult,
     VectorDatabase,
@@ -89,6 +95,38 @@ def build(
         ),
     ] = 500_000,
     seed: Annotated[int, typer.Option(help="Random seed for sampling.")] = 0,
+    encode_workers: Annotated[
+        int,
+        typer.Option(
+            "--encode-workers",
+            help="Number of CPU processes used to encode text. Use >1 without a GPU.",
+            min=1,
+        ),
+    ] = 1,
+    index_type: Annotated[
+        IndexType,
+        typer.Option("--index", help="Type of vector index. Only for new databases."),
+    ] = IndexType.FLAT,
+    precision: Annotated[
+        emb.StorageDtype,
+        typer.Option(help="Precision of the stored vectors. Only for new databases."),
+    ] = emb.StorageDtype.FLOAT32,
+    nlist: Annotated[
+        int,
+        typer.Option(help="Number of clusters for IVF indexes.", min=1),
+    ] = DEFAULT_IVF_NLIST,
+    hnsw_m: Annotated[
+        int,
+        typer.Option(help="Number of neighbours per node for HNSW indexes.", min=2),
+    ] = DEFAULT_HNSW_M,
+    sharded: Annotated[
+        bool,
+        typer.Option(
+            "--sharded",
+            help="Use a sharded database in the output directory. If it exists, the"
+            " sentences are added to it as a new shard.",
+        ),
+    ] = False,
 ) -> None:
     """Build a vector database from sentences in the `acus` field of input JSON documents.
 
@@ -96,12 +134,33 @@ def build(
     `peerrelated.json` from `paper construct`).
 
     If `--db` is given, we load an existing database and add to it. If not, we create
-    a new from scratch with `--model`.
+    a new from scratch with `--model` and the index options. IVF indexes are trained on
+    the sampled sentences.
+
+    With `--sharded`, the output is a sharded database. The sentences are saved as a
+    new shard, so adding to an existing database doesn't rewrite it.
     """
-    if db_dir is not None:
-        db = VectorDatabase.load(db_dir, batch_size)
+    if sharded and db_dir is not None:
+        die("--db can't be used with --sharded. New shards are added to --output.")
+
+    config = IndexConfig(
+        type=index_type, precision=precision, nlist=nlist, hnsw_m=hnsw_m
+    )
+    db: VectorDatabase | ShardedVectorDatabase
+    if sharded and ShardedVectorDatabase.exists(output_dir):
+        db = ShardedVectorDatabase.load(
+            output_dir, batch_size, encode_workers=encode_workers
+        )
+    elif sharded:
+        db = ShardedVectorDatabase.create(
+            output_dir, model, batch_size, encode_workers=encode_workers, config=config
+        )
+    elif db_dir is not None:
+        db = VectorDatabase.load(db_dir, batch_size, encode_workers=encode_workers)
     else:
-        db = VectorDatabase.empty(model, batch_size)
+        db = VectorDatabase.empty(
+            model, batch_size, encode_workers=encode_workers, config=config
+        )
 
     if limit_papers == 0:
         limit_papers = None
@@ -125,8 +184,10 @@ def build(
     sentences = sample(sentences, limit_sentences, rng)
 
     db.add_sentences(sentences)
+    db.encoder.close()
 
-    db.save(output_dir)
+    if isinstance(db, VectorDatabase):
+        db.save(output_dir)
     logger.info(
         f"Built database with {len(sentences)} sentences from {len(papers)} documents"
     )
@@ -146,12 +207,14 @@ class PaperResult(Immutable):
 
 
 def _query_papers(
-    db: VectorDatabase,
+    db: VectorDatabase | ShardedVectorDatabase,
     output_file: Path,
     papers: Sequence[gpt.PaperWithACUs[s2.PaperWithS2Refs]],
     threshold: float,
     top_k: int,
     batch_size: int,
+    *,
+    range_search: bool = False,
 ) -> int:
     total_queries = 0
 
@@ -168,7 +231,10 @@ def _query_papers(
                     logger.warning(f"Document {paper.id} has no ACUs to query")
                     continue
 
-                query_results = db.search(sentences, k=top_k, threshold=threshold)
+                if range_search:
+                    query_results = db.search_range(sentences, threshold, limit=top_k)
+                else:
+                    query_results = db.search(sentences, k=top_k, threshold=threshold)
                 result = PaperResult.model_construct(paper=paper, results=query_results)
                 save_data_jsonl(output_file, result)
 
@@ -216,6 +282,24 @@ def query(
     batch_size: Annotated[
         int, typer.Option(help="Size of batches when processing papers.")
     ] = 100,
+    nprobe: Annotated[
+        int | None,
+        typer.Option(
+            help="IVF clusters visited per query. Defaults to the saved value."
+        ),
+    ] = None,
+    ef_search: Annotated[
+        int | None,
+        typer.Option(help="HNSW search candidates. Defaults to the saved value."),
+    ] = None,
+    range_search: Annotated[
+        bool,
+        typer.Option(
+            "--range-search",
+            help="Retrieve only matches over the threshold (up to top-k) instead of"
+            " fetching the top-k and filtering. Best with high thresholds.",
+        ),
+    ] = False,
 ) -> None:
     """Query the vector database with sentences from the papers ACUs.
 
@@ -227,7 +311,7 @@ def query(
     params = get_params()
     logger.info(render_params(params))
 
-    db = VectorDatabase.load(db_dir)
+    db = open_database(db_dir, nprobe=nprobe, ef_search=ef_search)
 
     if limit_papers == 0:
         limit_papers = None
@@ -247,12 +331,69 @@ def query(
     output_file = output_dir / "result.jsonl"
     output_file.unlink(missing_ok=True)
 
-    total_queries = _query_papers(db, output_file, papers, threshold, top_k, batch_size)
+    total_queries = _query_papers(
+        db,
+        output_file,
+        papers,
+        threshold,
+        top_k,
+        batch_size,
+        range_search=range_search,
+    )
 
     logger.info(f"Processed {len(papers)} documents with {total_queries} queries")
     save_data(output_dir / "params.json", params)
 
 
+@app.command(no_args_is_help=True)
+def delete(
+    db_dir: Annotated[
+        Path, typer.Option("--db", help="Directory with sharded vector database.")
+    ],
+    input_file: Annotated[
+        Path,
+        typer.Option("--input", "-i", help="Input JSON file with documents to delete."),
+    ],
+) -> None:
+    """Delete the ACUs of the input documents from a sharded vector database.
+
+    The input documents have the same format as for `build`. The sentences are marked as
+    deleted and skipped by queries. Use `compact` to remove them from disk.
+    """
+    if not ShardedVectorDatabase.exists(db_dir):
+        die(f"No sharded vector database in {db_dir}.")
+
+    papers = gpt.PromptResult.unwrap(
+        load_data(input_file, gpt.PromptResult[gpt.PaperWithACUs[s2.Paper]])
+    )
+    db = ShardedVectorDatabase.load(db_dir)
+    deleted = db.delete_sentences(acu for paper in papers for acu in paper.acus)
+    logger.info(f"Deleted {deleted} sentences from {len(papers)} documents")
+
+
+@app.command(no_args_is_help=True)
+def compact(
+    db_dir: Annotated[
+        Path, typer.Option("--db", help="Directory with sharded vector database.")
+    ],
+    min_size: Annotated[
+        int,
+        typer.Option(help="Shards with fewer live sentences than this are merged."),
+    ] = 100_000,
+) -> None:
+    """Merge small shards and shards with deleted sentences of a sharded database.
+
+    The old shards are kept until the next compaction, so the database can still be
+    loaded and queried while this runs.
+    """
+    if not ShardedVectorDatabase.exists(db_dir):
+        die(f"No sharded vector database in {db_dir}.")
+
+    db = ShardedVectorDatabase.load(db_dir)
+    merged = db.compact(min_size)
+    logger.info(f"Merged {merged} shards. The database now has {db.num_shards}.")
+
+
 def _evaluate_paper(
     paper_result: PaperResult,
     *,
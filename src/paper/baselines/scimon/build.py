@@ -55,8 +55,36 @@ def main(
         typer.Option(help="Number of annotated papers used for graph (sampled)."),
     ] = None,
     seed: Annotated[int, typer.Option(help="Seed for random sample")] = 0,
+    encode_workers: Annotated[
+        int,
+        typer.Option(
+            "--encode-workers",
+            help="Number of CPU processes used to encode text. Use >1 without a GPU.",
+            min=1,
+        ),
+    ] = 1,
+    matrix_dtype: Annotated[
+        emb.StorageDtype,
+        typer.Option(help="Data type of the stored embedding matrices."),
+    ] = emb.StorageDtype.FLOAT32,
+    kg_embeddings: Annotated[
+        bool,
+        typer.Option(
+            help="Encode the KG nodes. Only the KG similarity fallback uses them."
+        ),
+    ] = True,
+    parallel: Annotated[
+        bool,
+        typer.Option(
+            help="Build the three graphs at the same time in separate processes. Faster"
+            " with many CPU cores, but uses more memory."
+        ),
+    ] = False,
 ) -> None:
     """Build the three SciMON graphs (KG, semantic and citations)."""
+    if parallel and encode_workers > 1:
+        raise typer.BadParameter("--parallel can't be used with --encode-workers.")
+
     output_dir.mkdir(parents=True, exist_ok=True)
 
     rng = random.Random(seed)
@@ -72,21 +100,37 @@ def main(
     )
     ann = sample(ann, num_annotated, rng)
 
-    logger.info("Initialising encoder.")
-    encoder = emb.Encoder(model_name)
-
     peerread_papers = load_data(peerread_file, s2.PaperWithS2Refs)
 
-    with Timer("Building all graphs") as timer_all:
-        Graph.build(
-            encoder=encoder,
-            annotated=ann,
-            peerread_papers=peerread_papers,
-            output_dir=output_dir,
-            metadata=params,
-            progress=True,
-        )
-    logger.info(timer_all)
+    if parallel:
+        with Timer("Building all graphs") as timer_all:
+            Graph.build_parallel(
+                model_name=model_name,
+                annotated=ann,
+                peerread_papers=peerread_papers,
+                output_dir=output_dir,
+                metadata=params,
+                matrix_dtype=matrix_dtype,
+                kg_embeddings=kg_embeddings,
+            )
+        logger.info(timer_all)
+    else:
+        logger.info("Initialising encoder.")
+        encoder = emb.Encoder(model_name, workers=encode_workers)
+
+        with Timer("Building all graphs") as timer_all:
+            Graph.build(
+                encoder=encoder,
+                annotated=ann,
+                peerread_papers=peerread_papers,
+                output_dir=output_dir,
+                metadata=params,
+                progress=True,
+                matrix_dtype=matrix_dtype,
+                kg_embeddings=kg_embeddings,
+            )
+        logger.info(timer_all)
+        encoder.close()
 
     if test:
         logger.debug("Testing loading the graph from saved data.")
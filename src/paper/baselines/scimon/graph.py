@@ -4,16 +4,22 @@ from __future__ import annotations
 
 import gc
 import logging
-from collections.abc import Sequence
+import multiprocessing
+import os
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, ClassVar, Self
+from typing import Any, ClassVar, Concatenate, Self
+
+import torch
 
 from paper import embedding as emb
 from paper import gpt
 from paper import semantic_scholar as s2
 from paper.baselines.scimon import citations, kg, semantic
 from paper.types import Immutable
+from paper.util import setup_logging
 from paper.util.serde import Record, load_data_single, save_data
 
 logger = logging.getLogger(__name__)
@@ -72,7 +78,9 @@ class Graph:
 
     CITATION_DEFAULT_K: ClassVar[int] = 5
     KG_FILENAME: ClassVar[str] = "kg_graph.json"
+    KG_MATRIX_FILENAME: ClassVar[str] = "kg_embeddings.npy"
     SEMANTIC_FILENAME: ClassVar[str] = "semantic_graph.json"
+    SEMANTIC_MATRIX_FILENAME: ClassVar[str] = "semantic_embeddings.npy"
     CITATIONS_FILENAME: ClassVar[str] = "citation_graph.json"
     METADATA_FILENAME: ClassVar[str] = "metadata.json"
 
@@ -91,11 +99,14 @@ class Graph:
         metadata: dict[str, Any] | None = None,
         *,
         progress: bool = False,
+        matrix_dtype: emb.StorageDtype = emb.StorageDtype.FLOAT32,
+        kg_embeddings: bool = True,
     ) -> None:
         """Build and save all SciMON graphs separately to minimize memory usage.
 
         Each graph is built, saved to disk, and then cleared from memory before
-        building the next one.
+        building the next one. Embedding matrices are saved as `.npy` sidecars so they
+        can be memory-mapped on load.
 
         Args:
             encoder: Encoder to use for text embeddings.
@@ -104,52 +115,126 @@ class Graph:
             output_dir: Directory where to save the graph files.
             metadata: Optional metadata to save with the graph.
             progress: Whether to show progress bars.
+            matrix_dtype: Data type of the stored embedding matrices.
+            kg_embeddings: Whether to encode the KG nodes. They're only used by the KG
+                similarity fallback, which encodes them on demand if they're missing.
         """
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        logger.info("Building KG graph: %d annotations", len(annotated))
-        kg_graph = kg.Graph.from_terms(
-            encoder, (x.terms for x in annotated), progress=progress
+        _save_kg(
+            encoder,
+            annotated,
+            output_dir,
+            progress=progress,
+            matrix_dtype=matrix_dtype,
+            kg_embeddings=kg_embeddings,
         )
-        kg_data = kg_graph.to_data()
-        save_data(output_dir / cls.KG_FILENAME, kg_data)
         # Clear memory
-        del kg_graph
-        del kg_data
         gc.collect()
         gc.collect()
 
-        logger.info("Building Semantic graph: %d annotations", len(annotated))
-        semantic_graph = semantic.Graph.from_annotated(
-            encoder, annotated, progress=progress
+        _save_semantic(
+            encoder, annotated, output_dir, progress=progress, matrix_dtype=matrix_dtype
         )
-        semantic_data = semantic_graph.to_data()
-        save_data(output_dir / cls.SEMANTIC_FILENAME, semantic_data)
         # Clear memory
-        del semantic_graph
-        del semantic_data
         gc.collect()
         gc.collect()
 
-        # Build and save Citations graph
-        logger.info("Building Citation graph: %d papers", len(peerread_papers))
-        citation_graph = citations.Graph.from_papers(
-            encoder, peerread_papers, progress=progress
-        )
-        save_data(output_dir / cls.CITATIONS_FILENAME, citation_graph)
+        _save_citations(encoder, peerread_papers, output_dir, progress=progress)
+        cls._save_metadata(output_dir, encoder.model_name, metadata)
 
-        metadata_model = MetadataModel(
-            encoder_model=encoder.model_name,
-            metadata=metadata,
+    @classmethod
+    def build_parallel(
+        cls,
+        model_name: str,
+        annotated: Sequence[gpt.PaperAnnotated],
+        peerread_papers: Sequence[s2.PaperWithS2Refs],
+        output_dir: Path,
+        metadata: dict[str, Any] | None = None,
+        *,
+        backend: emb.EncoderBackend = emb.EncoderBackend.TORCH,
+        matrix_dtype: emb.StorageDtype = emb.StorageDtype.FLOAT32,
+        kg_embeddings: bool = True,
+    ) -> None:
+        """Build and save the three SciMON graphs at the same time in worker processes.
+
+        Produces the same files as `build`. Each graph is built in its own process with
+        its own copy of the encoder, and the CPU threads are split between them. This
+        is faster on machines with many cores, but needs memory for all three graphs
+        and encoders at once. Use `build` when memory is limited.
+
+        Args:
+            model_name: Name of the SentenceTransformer model for the encoders.
+            annotated: Annotated papers for KG and semantic graphs.
+            peerread_papers: PeerRead papers with S2 references for citation graph.
+            output_dir: Directory where to save the graph files.
+            metadata: Optional metadata to save with the graph.
+            backend: Inference backend of the encoders.
+            matrix_dtype: Data type of the stored embedding matrices.
+            kg_embeddings: Whether to encode the KG nodes. See `build`.
+
+        Raises:
+            Exception: any error raised while building a graph, after all workers end.
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        spec = _EncoderSpec(
+            model_name=model_name,
+            backend=backend,
+            threads=max(1, (os.cpu_count() or 1) // 3),
         )
-        save_data(output_dir / cls.METADATA_FILENAME, metadata_model)
+        logger.info("Building graphs in parallel with %d threads each.", spec.threads)
+
+        # Workers are started with `spawn` so they don't inherit the parent's torch
+        # state. See `emb.EncoderPool`.
+        with ProcessPoolExecutor(
+            max_workers=3, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _build_worker,
+                    spec,
+                    _save_kg,
+                    annotated,
+                    output_dir,
+                    matrix_dtype=matrix_dtype,
+                    kg_embeddings=kg_embeddings,
+                ): "KG",
+                executor.submit(
+                    _build_worker,
+                    spec,
+                    _save_semantic,
+                    annotated,
+                    output_dir,
+                    matrix_dtype=matrix_dtype,
+                ): "Semantic",
+                executor.submit(
+                    _build_worker, spec, _save_citations, peerread_papers, output_dir
+                ): "Citation",
+            }
+            for future in as_completed(futures):
+                future.result()
+                logger.info("%s graph done.", futures[future])
+
+        cls._save_metadata(output_dir, model_name, metadata)
 
+    @classmethod
+    def _save_metadata(
+        cls, output_dir: Path, encoder_model: str, metadata: dict[str, Any] | None
+    ) -> None:
+        save_data(
+            output_dir / cls.METADATA_FILENAME,
+            MetadataModel(encoder_model=encoder_model, metadata=metadata),
+        )
         logger.info("All graphs saved to %s", output_dir)
 
     @classmethod
     def load(cls, graph_dir: Path) -> Self:
         """Load graph from a directory containing the separate graph files.
 
+        Supports both graphs with embedding matrices in `.npy` sidecars, which are
+        memory-mapped, and older graphs with the matrices inline in the JSON.
+
         Args:
             graph_dir: Directory containing the graph files.
 
@@ -169,14 +254,14 @@ class Graph:
         if not kg_path.exists():
             raise FileNotFoundError(f"KG graph file not found at {kg_path}")
         kg_data = load_data_single(kg_path, kg.GraphData)
-        kg_graph = kg_data.to_graph(encoder)
+        kg_graph = kg_data.to_graph(encoder, graph_dir)
         del kg_data
 
         semantic_path = graph_dir / cls.SEMANTIC_FILENAME
         if not semantic_path.exists():
             raise FileNotFoundError(f"Semantic graph file not found at {semantic_path}")
         semantic_data = load_data_single(semantic_path, semantic.GraphData)
-        semantic_graph = semantic_data.to_graph(encoder)
+        semantic_graph = semantic_data.to_graph(encoder, graph_dir)
         del semantic_data
 
         citations_path = graph_dir / cls.CITATIONS_FILENAME
@@ -212,33 +297,151 @@ class Graph:
         sure that if a node appears in the KG results, it won't appear in the Semantic
         results.
         """
+        return self.query_many([ann], use_kg=use_kg, k=k)[0]
 
-        if use_kg:
-            kg_terms = {
-                node
-                for relation in ann.terms.relations
-                for node in self.kg.query(relation.head).nodes
-            }
-        else:
-            kg_terms: set[str] = set()
-
-        semantic_terms = {
-            target
-            for relation in ann.terms.relations
-            for target in self.semantic.query(
-                ann.background, relation.head, relation.tail
-            ).targets
-        }
-        citation_terms = {
-            item.title for item in self.citations.query(ann.id, k).citations
-        }
-
-        return QueryResult(
-            citations=sorted(citation_terms),
-            kg=sorted(kg_terms),
-            semantic=sorted(semantic_terms - kg_terms),
+    def query_many(
+        self,
+        anns: Sequence[gpt.PeerReadAnnotated],
+        use_kg: bool = False,
+        k: int = CITATION_DEFAULT_K,
+        *,
+        progress: bool = False,
+    ) -> list[QueryResult]:
+        """Retrieve terms for many annotated papers. See `query_all`.
+
+        The semantic queries for the relations of all papers are encoded and matched
+        together (see `semantic.Graph.query_many`). Results are in the same order as
+        `anns`.
+        """
+        semantic_results = iter(
+            self.semantic.query_many(
+                [
+                    (ann.background, relation.head, relation.tail)
+                    for ann in anns
+                    for relation in ann.terms.relations
+                ],
+                progress=progress,
+            )
         )
 
+        results: list[QueryResult] = []
+        for ann in anns:
+            if use_kg:
+                kg_terms = {
+                    node
+                    for relation in ann.terms.relations
+                    for node in self.kg.query(relation.head).nodes
+                }
+            else:
+                kg_terms: set[str] = set()
+
+            semantic_terms = {
+                target
+                for _ in ann.terms.relations
+                for target in next(semantic_results).targets
+            }
+            citation_terms = {
+                item.title for item in self.citations.query(ann.id, k).citations
+            }
+
+            results.append(
+                QueryResult(
+                    citations=sorted(citation_terms),
+                    kg=sorted(kg_terms),
+                    semantic=sorted(semantic_terms - kg_terms),
+                )
+            )
+
+        return results
+
+
+def _save_kg(
+    encoder: emb.Encoder,
+    annotated: Sequence[gpt.PaperAnnotated],
+    output_dir: Path,
+    *,
+    progress: bool = False,
+    matrix_dtype: emb.StorageDtype = emb.StorageDtype.FLOAT32,
+    kg_embeddings: bool = True,
+) -> None:
+    """Build the KG graph and save it and its embeddings sidecar to `output_dir`."""
+    logger.info("Building KG graph: %d annotations", len(annotated))
+    kg_graph = kg.Graph.from_terms(
+        encoder, (x.terms for x in annotated), progress=progress, embed=kg_embeddings
+    )
+    kg_matrix_path = output_dir / Graph.KG_MATRIX_FILENAME
+    kg_data = kg_graph.to_data(kg_matrix_path, matrix_dtype)
+    if kg_data.embeddings is None:
+        # Don't leave a sidecar from a previous build behind.
+        kg_matrix_path.unlink(missing_ok=True)
+        kg_matrix_path.with_suffix(".scales.npy").unlink(missing_ok=True)
+    save_data(output_dir / Graph.KG_FILENAME, kg_data)
+
+
+def _save_semantic(
+    encoder: emb.Encoder,
+    annotated: Sequence[gpt.PaperAnnotated],
+    output_dir: Path,
+    *,
+    progress: bool = False,
+    matrix_dtype: emb.StorageDtype = emb.StorageDtype.FLOAT32,
+) -> None:
+    """Build the semantic graph and save it and its embeddings sidecar to `output_dir`."""
+    logger.info("Building Semantic graph: %d annotations", len(annotated))
+    semantic_graph = semantic.Graph.from_annotated(
+        encoder, annotated, progress=progress
+    )
+    semantic_data = semantic_graph.to_data(
+        output_dir / Graph.SEMANTIC_MATRIX_FILENAME, matrix_dtype
+    )
+    save_data(output_dir / Graph.SEMANTIC_FILENAME, semantic_data)
+
+
+def _save_citations(
+    encoder: emb.Encoder,
+    peerread_papers: Sequence[s2.PaperWithS2Refs],
+    output_dir: Path,
+    *,
+    progress: bool = False,
+) -> None:
+    """Build the citation graph and save it to `output_dir`."""
+    logger.info("Building Citation graph: %d papers", len(peerread_papers))
+    citation_graph = citations.Graph.from_papers(
+        encoder, peerread_papers, progress=progress
+    )
+    save_data(output_dir / Graph.CITATIONS_FILENAME, citation_graph)
+
+
+@dataclass(frozen=True, kw_only=True)
+class _EncoderSpec:
+    """How to create the encoder in a `Graph.build_parallel` worker process."""
+
+    model_name: str
+    backend: emb.EncoderBackend
+    threads: int
+    """Number of CPU threads the worker can use."""
+
+    def load(self) -> emb.Encoder:
+        """Create the encoder, limiting this process to `threads` CPU threads."""
+        torch.set_num_threads(self.threads)
+        return emb.Encoder(self.model_name, backend=self.backend)
+
+
+def _build_worker[T](
+    spec: _EncoderSpec,
+    save: Callable[Concatenate[emb.Encoder, T, Path, ...], None],
+    items: T,
+    output_dir: Path,
+    **kwargs: Any,
+) -> None:
+    """Build and save a graph with `save` in a worker process with its own encoder."""
+    setup_logging()
+    encoder = spec.load()
+    try:
+        save(encoder, items, output_dir, **kwargs)
+    finally:
+        encoder.close()
+
 
 class QueryResult(Immutable):
     """Query results across graphs, delimited by where they came from."""
@@ -48,6 +48,12 @@ def main(
         str, typer.Option("--model", help="SentenceTransformer model to use.")
     ] = emb.DEFAULT_SENTENCE_MODEL,
     query: Annotated[str | None, typer.Option(help="Test query for the graph")] = None,
+    embeddings: Annotated[
+        bool,
+        typer.Option(
+            help="Encode the nodes for similarity fallback. Exact queries don't use it."
+        ),
+    ] = True,
 ) -> None:
     """Build a KG graph from extracted terms from papers."""
     setup_logging()
@@ -59,10 +65,10 @@ def main(
 
     logger.debug("Initialising encoder.")
     encoder = emb.Encoder(model_name)
-    graph = Graph.from_terms(encoder, terms)
+    graph = Graph.from_terms(encoder, terms, embed=embeddings)
 
     if query:
-        result = graph.query(query)
+        result = graph.query(query, fallback=True)
         logger.info("\nQuery: %s\nResult: %s", query, result)
 
     save_data(output_file, graph.to_data())
@@ -72,13 +78,22 @@ class Graph:
     """Conventional graph created by used-for relations.
 
     Querying the graph can be made by exact match between nodes in the graph and a query
-    term. Failing that, we retrieve the closest match by semantic similarity.
+    term. Failing that, we can retrieve the closest match by semantic similarity if
+    `fallback` is requested.
+
+    The node embeddings are only needed for the fallback, so they're only loaded (or
+    encoded, if the graph was built without them) the first time it's used.
     """
 
     _nodes: Sequence[str]
     """Nodes are relation heads after processing."""
-    _embeddings: emb.Matrix
-    """Nodes converted to vectors. Each row corresponds to an element in `_nodes`."""
+    _embeddings: emb.Matrix | None
+    """Nodes converted to vectors. Each row corresponds to an element in `_nodes`. None
+    until they're needed."""
+    _embeddings_data: emb.MatrixData | None
+    """Serialised embeddings to load `_embeddings` from. None if there are none stored."""
+    _base_dir: Path | None
+    """Directory with the sidecar file of `_embeddings_data`, if any."""
     _head_to_tails: Mapping[str, Sequence[str]]
     """Mapping of processed text (relation head) to list of normal text (tails)."""
     _encoder: emb.Encoder
@@ -88,15 +103,51 @@ class Graph:
         self,
         *,
         nodes: Sequence[str],
-        embeddings: emb.Matrix,
         head_to_tails: Mapping[str, Sequence[str]],
         encoder: emb.Encoder,
+        embeddings: emb.Matrix | None = None,
+        embeddings_data: emb.MatrixData | None = None,
+        base_dir: Path | None = None,
     ) -> None:
+        """Create graph from its nodes and edges.
+
+        Args:
+            nodes: Processed relation heads.
+            head_to_tails: Mapping of each node to its relation tails.
+            encoder: Encoder used for the similarity fallback.
+            embeddings: Node vectors, if already available.
+            embeddings_data: Serialised node vectors to load when they're first needed.
+                Ignored if `embeddings` is given.
+            base_dir: Directory with the sidecar file of `embeddings_data`.
+        """
         self._nodes = nodes
         self._embeddings = embeddings
+        self._embeddings_data = embeddings_data
+        self._base_dir = base_dir
         self._head_to_tails = head_to_tails
         self._encoder = encoder
 
+    @property
+    def embeddings(self) -> emb.Matrix:
+        """Node vectors, loaded or encoded on first access.
+
+        The rows are L2-normalised, as `emb.top_k_cosine` requires.
+        """
+        if self._embeddings is None:
+            if self._embeddings_data is not None:
+                logger.debug("Loading KG node embeddings.")
+                matrix = self._embeddings_data.to_matrix(self._base_dir)
+            else:
+                logger.debug("Encoding KG nodes.")
+                matrix = self._encoder.batch_encode(self._nodes)
+            self._embeddings = emb.normalize(matrix)
+        return self._embeddings
+
+    @property
+    def has_embeddings(self) -> bool:
+        """Whether the node vectors are available without encoding the nodes."""
+        return self._embeddings is not None or self._embeddings_data is not None
+
     @classmethod
     def from_terms(
         cls,
@@ -104,8 +155,13 @@ class Graph:
         terms: Iterable[gpt.PaperTerms],
         *,
         progress: bool = False,
+        embed: bool = True,
     ) -> Self:
-        """Build a graph from a collection of annotated `PaperTerms`."""
+        """Build a graph from a collection of annotated `PaperTerms`.
+
+        If `embed` is False, the nodes aren't encoded. Exact-match queries work the
+        same, and the similarity fallback encodes them when it's first used.
+        """
         logger.debug("Building node and edge lists.")
 
         head_to_tails: defaultdict[str, list[str]] = defaultdict(list)
@@ -114,8 +170,10 @@ class Graph:
                 head_to_tails[_process_text(relation.head)].append(relation.tail)
         nodes = list(head_to_tails)
 
-        logger.debug("Encoding nodes.")
-        embeddings = encoder.batch_encode(nodes, progress=progress)
+        embeddings = None
+        if embed:
+            logger.debug("Encoding nodes.")
+            embeddings = emb.normalize(encoder.batch_encode(nodes, progress=progress))
 
         logger.debug("Done.")
         return cls(
@@ -125,20 +183,46 @@ class Graph:
             encoder=encoder,
         )
 
-    def query(self, text: str) -> QueryResult:
+    def query(self, text: str, *, fallback: bool = False) -> QueryResult:
         """Get neighbours of the node matching `text`.
 
-        If there isn't a match, returns an empty list.
+        If there isn't an exact match and `fallback` is True, uses the node most similar
+        to `text` instead. Otherwise, returns an empty list.
         """
         processed = _process_text(text)
         if neighbours := self._head_to_tails.get(processed):
             return QueryResult(match=processed, nodes=neighbours)
+
+        if fallback and self._nodes:
+            vector = self._encoder.batch_encode([processed])
+            _, indices = emb.top_k_cosine(vector, self.embeddings, k=1)
+            match = self._nodes[int(indices[0, 0])]
+            return QueryResult(match=match, nodes=self._head_to_tails[match])
+
         return QueryResult(match=processed, nodes=[])
 
-    def to_data(self) -> GraphData:
-        """Convert KG Graph to a data object."""
+    def to_data(
+        self,
+        matrix_file: Path | None = None,
+        dtype: emb.StorageDtype = emb.StorageDtype.FLOAT32,
+    ) -> GraphData:
+        """Convert KG Graph to a data object.
+
+        If `matrix_file` is given, the embeddings are saved there as a `.npy` sidecar
+        with `dtype`. Otherwise, they're embedded in the data as base64. If the graph
+        has no embeddings, none are stored.
+        """
+        if not self.has_embeddings:
+            embeddings = None
+        elif matrix_file is None:
+            embeddings = emb.MatrixData.from_matrix(self.embeddings)
+        else:
+            embeddings = emb.MatrixData.from_matrix_npy(
+                self.embeddings, matrix_file, dtype
+            )
+
         return GraphData(
-            embeddings=emb.MatrixData.from_matrix(self._embeddings),
+            embeddings=embeddings,
             head_to_tails=self._head_to_tails,
             nodes=self._nodes,
             encoder_model=self._encoder.model_name,
@@ -159,14 +243,18 @@ class GraphData(Immutable):
     text-based representation. We don't store the encoder, only its model name.
     """
 
-    embeddings: emb.MatrixData
+    embeddings: emb.MatrixData | None = None
+    """Node vectors. None if the graph was built without them."""
     head_to_tails: Mapping[str, Sequence[str]]
     nodes: Sequence[str]
     encoder_model: str
 
-    def to_graph(self, encoder: emb.Encoder) -> Graph:
+    def to_graph(self, encoder: emb.Encoder, base_dir: Path | None = None) -> Graph:
         """Initialise KG Graph from data object.
 
+        The embeddings aren't loaded until the graph needs them. Sidecar matrices are
+        loaded from `base_dir`.
+
         Raises:
             ValueError: `encoder` model is different from the one that generated the
             graph.
@@ -179,9 +267,10 @@ class GraphData(Immutable):
 
         return Graph(
             nodes=self.nodes,
-            embeddings=self.embeddings.to_matrix(),
             head_to_tails=self.head_to_tails,
             encoder=encoder,
+            embeddings_data=self.embeddings,
+            base_dir=base_dir,
         )
 
 
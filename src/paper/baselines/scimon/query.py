@@ -11,9 +11,8 @@ from pathlib import Path
 from typing import Annotated
 
 import typer
-from tqdm import tqdm
 
-from paper import gpt
+from paper import gpt, graph_client
 from paper.baselines.scimon.graph import AnnotatedGraphResult, Graph
 from paper.util.serde import load_data, save_data
 
@@ -55,11 +54,14 @@ def main(
     anns = gpt.PromptResult.unwrap(
         load_data(annotated_file, gpt.PromptResult[gpt.PeerReadAnnotated])
     )
-    graph = Graph.load(graph_dir)
+    if client := graph_client.connect_scimon(graph_dir):
+        results = client.query_many(anns)
+    else:
+        results = Graph.load(graph_dir).query_many(anns, progress=True)
 
     ann_result = [
-        AnnotatedGraphResult(ann=ann, result=graph.query_all(ann))
-        for ann in tqdm(anns, desc="Querying graph with annotated papers")
+        AnnotatedGraphResult(ann=ann, result=result)
+        for ann, result in zip(anns, results)
     ]
 
     save_data(output_file, ann_result)
@@ -12,6 +12,7 @@ from pathlib import Path
 from typing import Annotated, Self
 
 import typer
+from tqdm import tqdm
 
 from paper import embedding as emb
 from paper import gpt
@@ -21,6 +22,9 @@ from paper.util.serde import load_data, save_data
 
 logger = logging.getLogger(__name__)
 
+_QUERY_CHUNK_SIZE = 1024
+"""Number of base inputs encoded and matched against the nodes at a time."""
+
 app = typer.Typer(
     context_settings={"help_option_names": ["-h", "--help"]},
     add_completion=False,
@@ -81,7 +85,8 @@ class Graph:
     _encoder: emb.Encoder
     """Encoder used to convert text nodes to vectors."""
     _embeddings: emb.Matrix
-    """Nodes converted to vectors. Each row corresponds to an element in `_nodes`."""
+    """Nodes converted to L2-normalised vectors. Each row corresponds to an element in
+    `_nodes`."""
 
     def __init__(
         self,
@@ -127,7 +132,7 @@ class Graph:
             nodes=nodes,
             node_to_targets=node_to_targets,
             encoder=encoder,
-            embeddings=embeddings,
+            embeddings=emb.normalize(embeddings),
         )
 
     def query(self, background: str, source: str, target: str) -> QueryResult:
@@ -137,26 +142,68 @@ class Graph:
         prompts, queries the constructed embeddings and returns the match by highest
         cosine similarity.
         """
-        results = (
-            self._query_single(base_input)
-            for base_input in _make_base_inputs(background, source, target)
+        return self.query_many([(background, source, target)])[0]
+
+    def query_many(
+        self, queries: Sequence[tuple[str, str, str]], *, progress: bool = False
+    ) -> list[QueryResult]:
+        """Get best-matching node for many (background, source, target) queries.
+
+        Same as calling `query` for each, but the base inputs from all queries are
+        deduplicated and encoded in batches of `_QUERY_CHUNK_SIZE`, and each batch is
+        matched against the nodes with a single matrix product. Results are in the same
+        order as `queries`.
+        """
+        base_inputs = [
+            _make_base_inputs(background, source, target)
+            for background, source, target in queries
+        ]
+        unique_inputs = list(
+            dict.fromkeys(text for inputs in base_inputs for text in inputs)
         )
-        return max(results, key=lambda r: r.score)
 
-    def _query_single(self, base_input: str) -> QueryResult:
-        """Query a base input from the embeddings, returning the most similar."""
-        embedding = self._encoder.encode(base_input)
-        similarities = emb.similarities(embedding, self._embeddings)
-        best = int(similarities.argmax())
+        chunks = range(0, len(unique_inputs), _QUERY_CHUNK_SIZE)
+        best: dict[str, tuple[float, int]] = {}
+        for start in tqdm(chunks, desc="Querying semantic graph", disable=not progress):
+            chunk = unique_inputs[start : start + _QUERY_CHUNK_SIZE]
+            embeddings = self._encoder.batch_encode(chunk)
+            scores, indices = emb.top_k_cosine(embeddings, self._embeddings, k=1)
+            best.update(
+                (text, (float(score[0]), int(index[0])))
+                for text, score, index in zip(chunk, scores, indices)
+            )
+
+        results: list[QueryResult] = []
+        for inputs in base_inputs:
+            # Like `max`, keep the first input in case of ties.
+            score, index = max((best[text] for text in inputs), key=lambda r: r[0])
+            node = self._nodes[index]
+            results.append(
+                QueryResult(
+                    match=node, targets=self._node_to_targets[node], score=score
+                )
+            )
+        return results
+
+    def to_data(
+        self,
+        matrix_file: Path | None = None,
+        dtype: emb.StorageDtype = emb.StorageDtype.FLOAT32,
+    ) -> GraphData:
+        """Convert semantic Graph to a data object.
 
-        node = self._nodes[best]
-        score = similarities[best]
-        return QueryResult(match=node, targets=self._node_to_targets[node], score=score)
+        If `matrix_file` is given, the embeddings are saved there as a `.npy` sidecar
+        with `dtype`. Otherwise, they're embedded in the data as base64.
+        """
+        if matrix_file is None:
+            embeddings = emb.MatrixData.from_matrix(self._embeddings)
+        else:
+            embeddings = emb.MatrixData.from_matrix_npy(
+                self._embeddings, matrix_file, dtype
+            )
 
-    def to_data(self) -> GraphData:
-        """Convert semantic Graph to a data object."""
         return GraphData(
-            embeddings=emb.MatrixData.from_matrix(self._embeddings),
+            embeddings=embeddings,
             node_to_targets=self._node_to_targets,
             nodes=self._nodes,
             encoder_model=self._encoder.model_name,
@@ -183,9 +230,13 @@ class GraphData(Immutable):
     nodes: Sequence[str]
     encoder_model: str
 
-    def to_graph(self, encoder: emb.Encoder) -> Graph:
+    def to_graph(self, encoder: emb.Encoder, base_dir: Path | None = None) -> Graph:
         """Initialise Semantic Graph from data object.
 
+        Sidecar matrices are loaded from `base_dir`. Float32 sidecars are used as-is,
+        since they're saved normalised. Other matrices are normalised, as older graphs
+        stored them raw and reduced precision loses unit norm.
+
         Raises:
             ValueError: `encoder` model is different from the one that generated the
             graph.
@@ -195,9 +246,13 @@ class GraphData(Immutable):
                 f"Incompatible encoder. Expected '{self.encoder_model}', got"
                 f" '{encoder.model_name}'"
             )
+        embeddings = self.embeddings.to_matrix(base_dir)
+        if not self.embeddings.is_mapped:
+            embeddings = emb.normalize(embeddings)
+
         return Graph(
             nodes=self.nodes,
-            embeddings=self.embeddings.to_matrix(),
+            embeddings=embeddings,
             node_to_targets=self.node_to_targets,
             encoder=encoder,
         )
@@ -2,7 +2,14 @@
 
 import typer
 
-from paper import construct_dataset, demo_data, find_type, single_paper, split
+from paper import (
+    construct_dataset,
+    demo_data,
+    find_type,
+    graph_server,
+    single_paper,
+    split,
+)
 from paper.baselines import cli as baselines
 from paper.deps import pipeline_viz
 from paper.gpt import cli as gpt
@@ -32,6 +39,7 @@ app.command(no_args_is_help=True, name="findtype")(find_type.main)
 app.command(no_args_is_help=True, name="demo_data")(demo_data.main)
 app.command(no_args_is_help=False, name="deps")(pipeline_viz.main)
 app.command(no_args_is_help=False, name="single")(single_paper.main)
+app.command(no_args_is_help=True, name="graph-server")(graph_server.main)
 
 
 def _version_callback(value: bool) -> None:
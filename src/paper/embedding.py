@@ -1,20 +1,31 @@
 """Tools to generate embeddings from text using SentenceTransformers."""
 
+from __future__ import annotations
+
 import base64
 import itertools
 import logging
 import math
+import multiprocessing
 import os
-from collections.abc import Sequence
-from typing import Self, cast
+import platform
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from enum import StrEnum
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Self, cast
 
 import numpy as np
 import numpy.typing as npt
 import torch
 from tqdm import tqdm
 
+from paper.embedding_cache import EmbeddingCache
 from paper.types import Immutable
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
 type Vector = npt.NDArray[np.float32]
 type Matrix = npt.NDArray[np.float32]
 
@@ -22,25 +33,83 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_SENTENCE_MODEL = "all-MiniLM-L6-v2"
 
+ONNX_EXPORT_DIR_ENV_VAR = "ONNX_EXPORT_DIR"
+"""Environment variable with the directory where quantised ONNX models are exported."""
+_QUANTISED_ONNX_FILE = "onnx/model_qint8.onnx"
+"""Path of the quantised model file inside its export directory."""
+PARITY_MIN_COSINE = 0.99
+"""Minimum cosine similarity with the PyTorch reference for a compatible backend."""
+
+
+class EncoderBackend(StrEnum):
+    """Inference backend used to run the SentenceTransformer model."""
+
+    TORCH = "torch"
+    """PyTorch model. Supports any device."""
+    ONNX = "onnx"
+    """Model exported to ONNX, run with ONNX Runtime. Faster on CPU."""
+    ONNX_INT8 = "onnx-int8"
+    """ONNX model with int8 dynamically-quantised weights. Fastest and smallest on CPU,
+    with a small accuracy cost. See `embedding_parity`."""
+
 
 class Encoder:
     """SentenceTransformer-based text to vector encoder.
 
     Supports both single-item query and multipe-items queries in parallel.
+
+    If an `EmbeddingCache` is available, embeddings are read from it and only the texts
+    missing from the cache are sent to the model. By default, the cache is taken from
+    the `EMBEDDING_CACHE` environment variable. See `paper.embedding_cache`.
     """
 
     def __init__(
-        self, model_name: str = DEFAULT_SENTENCE_MODEL, device: str | None = None
+        self,
+        model_name: str = DEFAULT_SENTENCE_MODEL,
+        device: str | None = None,
+        cache: EmbeddingCache | None = None,
+        *,
+        use_cache: bool = True,
+        workers: int = 1,
+        backend: EncoderBackend = EncoderBackend.TORCH,
     ) -> None:
+        """Load the SentenceTransformer model.
+
+        Args:
+            model_name: Name of the SentenceTransformer model.
+            device: Device to run the model on. If None, uses the best available.
+            cache: Embedding cache to use. If None, uses `EmbeddingCache.from_env`.
+            use_cache: If False, never use an embedding cache, even if `cache` is given
+                or the environment variable is set.
+            workers: Default number of CPU worker processes for `batch_encode`. See
+                `EncoderPool`.
+            backend: Inference backend. The ONNX backends require the `onnx` extra.
+        """
         # `sentence_transformers` has a bug where they don't clean up their semaphores
         # properly, so we suppress this.
         os.environ["TOKENIZERS_PARALLELISM"] = "false"
-        from sentence_transformers import SentenceTransformer
 
         self.model_name = model_name
-        self._model = SentenceTransformer(
-            model_name, device=device or _get_best_device()
+        self.backend = EncoderBackend(backend)
+        self._model = _load_model(
+            model_name, device or _get_best_device(), self.backend
         )
+        self.cache = (cache or EmbeddingCache.from_env()) if use_cache else None
+        self.workers = workers
+        self._pool: EncoderPool | None = None
+
+    def close(self) -> None:
+        """Shut down the worker processes, if any were started."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    @property
+    def cache_key(self) -> str:
+        """Model identifier for the embedding cache. Includes non-default backends."""
+        if self.backend is EncoderBackend.TORCH:
+            return self.model_name
+        return f"{self.model_name}#{self.backend}"
 
     @property
     def dimensions(self) -> int | None:
@@ -49,14 +118,24 @@ class Encoder:
 
     def encode(self, text: str) -> Vector | Matrix:
         """Encode text string as a vector."""
-        return cast(Vector, self._model.encode(text))  # type: ignore
+        if self.cache is None:
+            return self._model_encode(text)
+        return self.cache.get_or_compute(self.cache_key, [text], self._model_encode)[0]
 
     def encode_multi(self, texts: Sequence[str]) -> Matrix:
         """Encode a sequence of texts as a matrix."""
-        return cast(Matrix, self._model.encode(texts))  # type: ignore
+        if self.cache is None:
+            return self._model_encode(texts)
+        return self.cache.get_or_compute(self.cache_key, texts, self._model_encode)
 
     def batch_encode(
-        self, texts: Sequence[str], batch_size: int = 128, *, progress: bool = False
+        self,
+        texts: Sequence[str],
+        batch_size: int = 128,
+        *,
+        progress: bool = False,
+        length_sorted: bool = False,
+        workers: int | None = None,
     ) -> Matrix:
         """Split `texts` into batches of `batch_size` and encode each separately.
 
@@ -64,17 +143,259 @@ class Encoder:
             texts: Strings to encode.
             batch_size: Number of items per batch.
             progress: If True, use `tqdm` to show a progress bar for the process.
+            length_sorted: If True, group texts of similar token length in the same
+                batch. This reduces padding when `texts` mixes short and long items
+                (e.g. titles and abstracts). The output is still in the input order.
+            workers: Number of CPU worker processes used to encode the batches. If
+                None, uses the value given to the constructor. If more than 1, the
+                batches are sharded across a process pool where each worker holds its
+                own copy of the model. See `EncoderPool`.
 
         Returns:
             The encoded vectors stacked as a single matrix.
         """
+        workers = self.workers if workers is None else workers
+
+        def encode(items: Sequence[str]) -> Matrix:
+            if length_sorted:
+                return _length_sorted_encode(
+                    items,
+                    self.token_lengths(items),
+                    lambda batch: self._batch_encode(
+                        batch, batch_size, progress=progress, workers=workers
+                    ),
+                )
+            return self._batch_encode(
+                items, batch_size, progress=progress, workers=workers
+            )
+
+        if self.cache is None:
+            return encode(texts)
+
+        matrix = self.cache.get_or_compute(self.cache_key, texts, encode)
+        logger.debug(self.cache.stats)
+        return matrix
+
+    def token_lengths(self, texts: Sequence[str]) -> list[int]:
+        """Number of tokens in each text according to the model tokeniser.
+
+        Lengths are capped to the model's maximum sequence length, as longer texts are
+        truncated when encoded.
+        """
+        if not texts:
+            return []
+
+        max_length: int = self._model.max_seq_length
+        tokenised = self._model.tokenizer(
+            list(texts), add_special_tokens=True, truncation=False
+        )
+        return [min(len(ids), max_length) for ids in tokenised["input_ids"]]
+
+    def _batch_encode(
+        self, texts: Sequence[str], batch_size: int, *, progress: bool, workers: int
+    ) -> Matrix:
+        """Encode `texts` with the model in batches of `batch_size`. Skips the cache.
+
+        If `workers` > 1 and there's more than one batch, the batches are encoded by the
+        process pool.
+        """
+        if not texts:
+            return np.empty((0, self.dimensions or 0), dtype=np.float32)
+
         batches = itertools.batched(texts, n=batch_size)
+        batch_num = math.ceil(len(texts) / batch_size)
+
+        if workers > 1 and batch_num > 1:
+            results = self._get_pool(workers).map(batches)
+        else:
+            results = (self._model_encode(batch) for batch in batches)
 
         if progress:
-            batch_num = math.ceil(len(texts) / batch_size)
-            batches = tqdm(batches, total=batch_num, desc="Batch text encoding")
+            results = tqdm(results, total=batch_num, desc="Batch text encoding")
+
+        return np.vstack(list(results))
+
+    def _get_pool(self, workers: int) -> EncoderPool:
+        """Get the process pool with `workers` processes, starting it if needed."""
+        if self._pool is not None and self._pool.workers != workers:
+            self.close()
+        if self._pool is None:
+            self._pool = EncoderPool(self.model_name, workers, self.backend)
+        return self._pool
+
+    def _model_encode(self, texts: str | Sequence[str]) -> Matrix:
+        """Encode text or texts directly with the model. Skips the cache."""
+        return cast(Matrix, self._model.encode(texts))  # type: ignore
+
+
+class EncoderPool:
+    """Pool of CPU worker processes, each holding its own copy of the model.
+
+    Used by `Encoder.batch_encode` to shard batches across processes on machines without
+    a GPU, where a single process leaves most cores idle. The available CPU threads are
+    split evenly between workers so they don't oversubscribe the machine.
+
+    Workers are started with `spawn` so they don't inherit the parent's torch state.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int,
+        backend: EncoderBackend = EncoderBackend.TORCH,
+    ) -> None:
+        if workers < 2:
+            raise ValueError(f"EncoderPool needs at least 2 workers, got {workers}")
+
+        self.model_name = model_name
+        self.workers = workers
+
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        logger.debug(
+            "Starting encoder pool with %d workers and %d threads each.",
+            workers,
+            threads,
+        )
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_pool_worker_init,
+            initargs=(model_name, threads, backend),
+        )
+
+    def map(self, batches: Iterable[Sequence[str]]) -> Iterable[Matrix]:
+        """Encode each batch in a worker. Results are yielded in input order."""
+        return self._executor.map(_pool_worker_encode, batches)
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self._executor.shutdown()
+
+
+_worker_model: SentenceTransformer | None = None
+"""Model loaded by `_pool_worker_init` in each `EncoderPool` worker process."""
+
+
+def _pool_worker_init(model_name: str, threads: int, backend: EncoderBackend) -> None:
+    """Load the model in the worker process and limit its number of CPU threads."""
+    global _worker_model  # noqa: PLW0603
+
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    torch.set_num_threads(threads)
+
+    _worker_model = _load_model(model_name, "cpu", backend)
+
+
+def _load_model(
+    model_name: str, device: str | None, backend: EncoderBackend
+) -> SentenceTransformer:
+    """Load SentenceTransformer model with the given inference backend.
+
+    For `EncoderBackend.ONNX_INT8`, the model is exported and quantised on first use,
+    then stored in `onnx_export_dir` and reused in later runs.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    match backend:
+        case EncoderBackend.TORCH:
+            return SentenceTransformer(model_name, device=device)
+        case EncoderBackend.ONNX:
+            return SentenceTransformer(model_name, device=device, backend="onnx")
+        case EncoderBackend.ONNX_INT8:
+            export_dir = onnx_export_dir(model_name)
+            if not (export_dir / _QUANTISED_ONNX_FILE).exists():
+                _export_quantised_onnx(model_name, export_dir)
+
+            return SentenceTransformer(
+                str(export_dir),
+                device=device,
+                backend="onnx",
+                model_kwargs={"file_name": _QUANTISED_ONNX_FILE},
+            )
+
+
+def onnx_export_dir(model_name: str) -> Path:
+    """Directory where the quantised ONNX version of `model_name` is stored.
+
+    Uses the `ONNX_EXPORT_DIR` environment variable as the base, or `~/.cache/paper/onnx`.
+    """
+    if base := os.getenv(ONNX_EXPORT_DIR_ENV_VAR):
+        base_dir = Path(base)
+    else:
+        base_dir = Path.home() / ".cache" / "paper" / "onnx"
+    return base_dir / model_name.strip("/").replace("/", "--")
+
+
+def _export_quantised_onnx(model_name: str, export_dir: Path) -> None:
+    """Export `model_name` to ONNX with int8 dynamic quantisation in `export_dir`.
+
+    The quantisation configuration is chosen for the current CPU architecture.
+    """
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+    logger.info("Exporting quantised ONNX model for '%s' to %s", model_name, export_dir)
+
+    model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+    model.save(str(export_dir))
+
+    config = (
+        "arm64" if platform.machine().casefold() in ("arm64", "aarch64") else "avx2"
+    )
+    export_dynamic_quantized_onnx_model(
+        model, config, str(export_dir), file_suffix="qint8"
+    )
+
+
+def embedding_parity(
+    reference: Encoder, candidate: Encoder, texts: Sequence[str], batch_size: int = 128
+) -> npt.NDArray[np.float32]:
+    """Cosine similarity between the embeddings of `texts` from two encoders.
+
+    Used to check that an alternative backend (e.g. quantised ONNX) produces vectors
+    compatible with the reference PyTorch model. Compatible backends should have every
+    value at least `PARITY_MIN_COSINE`.
+
+    Returns:
+        Vector with the cosine similarity for each text.
+    """
+    expected = reference.batch_encode(texts, batch_size)
+    actual = candidate.batch_encode(texts, batch_size)
+    if expected.shape != actual.shape:
+        raise ValueError(
+            f"Incompatible embedding shapes: {expected.shape} and {actual.shape}"
+        )
+
+    dot = np.sum(expected * actual, axis=1)
+    norms = np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    return (dot / (norms + 1e-8)).astype(np.float32)
+
+
+def _pool_worker_encode(texts: Sequence[str]) -> Matrix:
+    """Encode a batch of texts with the worker's model."""
+    assert _worker_model is not None, "Worker model must be loaded by the initialiser"
+    return cast(Matrix, _worker_model.encode(list(texts)))  # type: ignore
+
+
+def _length_sorted_encode(
+    texts: Sequence[str],
+    lengths: Sequence[int],
+    encode: Callable[[Sequence[str]], Matrix],
+) -> Matrix:
+    """Encode `texts` sorted by `lengths`, then restore the original row order.
+
+    Batching the sorted sequence puts texts of similar length in the same batch, so
+    each batch is padded to a length close to its items' real length.
+    """
+    if not texts:
+        return encode(texts)
 
-        return np.vstack([self.encode_multi(batch) for batch in batches])
+    order = np.argsort(np.asarray(lengths), kind="stable")
+    encoded = encode([texts[int(i)] for i in order])
+
+    result = np.empty_like(encoded)
+    result[order] = encoded
+    return result
 
 
 def similarities(vector: Vector, matrix: Matrix) -> npt.NDArray[np.float32]:
@@ -120,27 +441,271 @@ def top_k_indices(vector: Vector, k: int) -> list[int]:
     return [int(x) for x in np.argsort(vector)[::-1][:k]]
 
 
+def normalize(matrix: Matrix) -> Matrix:
+    """L2-normalise the rows of `matrix`. Also works with a single vector.
+
+    Store node embeddings normalised so that cosine similarity is a plain dot product.
+    See `top_k_cosine`.
+    """
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    # Avoid division by zero for all-zero rows, which stay zero.
+    return (matrix / np.maximum(norms, 1e-8)).astype(np.float32)
+
+
+def top_k_cosine(
+    queries: Vector | Matrix, matrix: Matrix, k: int
+) -> tuple[npt.NDArray[np.float32], npt.NDArray[np.intp]]:
+    """Find the top `k` rows of `matrix` by cosine similarity with each query.
+
+    `matrix` must be L2-normalised (see `normalize`), so only the queries are normalised
+    here. The similarities are a single matrix product, and the top `k` are selected with
+    `argpartition`, so the cost of selection scales with `k` rather than `N log N`.
+
+    Scores are clipped to [0, 1], like `similarities`.
+
+    Args:
+        queries: Query vector with shape `(dim,)` or a batch of queries `(Q, dim)`.
+        matrix: Normalised matrix with shape `(N, dim)`.
+        k: Number of results per query. If larger than N, returns N.
+
+    Returns:
+        Tuple of `(scores, indices)`, sorted by score descending. Shape `(k,)` for a single
+        query or `(Q, k)` for a batch.
+
+    Raises:
+        ValueError: if queries or matrix have the wrong shape.
+    """
+    if queries.ndim not in (1, 2):
+        raise ValueError("queries must be 1D or 2D")
+    if matrix.ndim != 2:
+        raise ValueError("matrix must be 2D")
+    if queries.shape[-1] != matrix.shape[1]:
+        raise ValueError("queries and matrix dimensions must be compatible")
+
+    single = queries.ndim == 1
+    batch = np.atleast_2d(normalize(queries))
+
+    sims = np.clip(batch @ matrix.T, 0, 1).astype(np.float32)
+    k = min(k, matrix.shape[0])
+
+    indices: npt.NDArray[np.intp]
+    if k <= 0:
+        indices = np.empty((batch.shape[0], 0), dtype=np.intp)
+    elif k < matrix.shape[0]:
+        indices = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.tile(
+            np.arange(matrix.shape[0], dtype=np.intp), (batch.shape[0], 1)
+        )
+
+    scores = np.take_along_axis(sims, indices, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    indices = np.take_along_axis(indices, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+
+    if single:
+        return scores[0], indices[0]
+    return scores, indices
+
+
+class StorageDtype(StrEnum):
+    """Data type used to store embedding matrices on disk."""
+
+    FLOAT32 = "float32"
+    """Full precision, same as the encoder output."""
+    FLOAT16 = "float16"
+    """Half precision. Halves the file size. Converted back to float32 on load."""
+    INT8 = "int8"
+    """8-bit integers with a float32 scale per row. Quarters the file size. Converted
+    back to float32 on load."""
+
+
+def quantize_int8(matrix: Matrix) -> tuple[npt.NDArray[np.int8], Vector]:
+    """Quantise each row of `matrix` to int8 symmetrically with its own scale.
+
+    Each row is divided by `max(abs(row)) / 127` and rounded, so the largest component
+    maps to ±127. All-zero rows get a scale of 1.
+
+    Returns:
+        Tuple of the int8 matrix and the float32 scale for each row.
+    """
+    matrix = np.atleast_2d(matrix).astype(np.float32, copy=False)
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1
+    quantised = np.rint(matrix / scales[:, None]).clip(-127, 127).astype(np.int8)
+    return quantised, scales.astype(np.float32)
+
+
+def dequantize_int8(quantised: npt.NDArray[np.int8], scales: Vector) -> Matrix:
+    """Convert an int8 matrix from `quantize_int8` back to float32."""
+    return quantised.astype(np.float32) * scales[:, None]
+
+
+def top_k_overlap(
+    reference: npt.NDArray[np.integer], candidate: npt.NDArray[np.integer]
+) -> float:
+    """Mean fraction of the reference top-k indices that are also in the candidate's.
+
+    Both arrays have shape (queries, k), with the indices retrieved for each query, e.g.
+    from `top_k_cosine`. Order within the top-k doesn't matter.
+    """
+    if reference.size == 0:
+        return 1.0
+
+    overlaps = [
+        len(set(ref_row.tolist()) & set(cand_row.tolist())) / len(ref_row)
+        for ref_row, cand_row in zip(reference, candidate)
+    ]
+    return float(np.mean(overlaps))
+
+
+def _to_storage(
+    matrix: Matrix, dtype: StorageDtype | None
+) -> tuple[npt.NDArray[Any], Vector | None]:
+    """Convert `matrix` to the storage `dtype`, plus row scales if it's int8.
+
+    If `dtype` is None, the matrix is kept as-is.
+    """
+    if dtype is None:
+        return np.ascontiguousarray(matrix), None
+    if dtype is StorageDtype.INT8:
+        return quantize_int8(matrix)
+    return np.ascontiguousarray(matrix, dtype=np.dtype(dtype)), None
+
+
+def _is_mapped_from(matrix: np.memmap[Any, Any], path: Path) -> bool:
+    """Whether `matrix` is a float32 memory map of the `.npy` file `path`."""
+    return (
+        matrix.filename is not None
+        and matrix.dtype == np.float32
+        and path.exists()
+        and Path(matrix.filename).samefile(path)
+    )
+
+
 class MatrixData(Immutable):
-    """Data object used to serialise a numpy matrix as JSON."""
+    """Data object used to serialise a numpy matrix as JSON.
+
+    The matrix data is either embedded in the JSON as base64 (`data`), or stored in a
+    binary `.npy` sidecar file (`file`) that can be memory-mapped on load. Use
+    `from_matrix` for the former and `from_matrix_npy` for the latter.
+
+    Matrices can be stored with reduced precision (see `StorageDtype`). They're always
+    converted back to float32 when loaded.
+    """
 
     shape: list[int]
     """Shape of the matrix as expected by numpy."""
     dtype: str
     """Underlying numpy data type of the matrix."""
-    data: str
-    """Matrix data encoded as base 64 bytes in UTF-8."""
+    data: str | None = None
+    """Matrix data encoded as base 64 bytes in UTF-8. None if the data is in `file`."""
+    file: str | None = None
+    """Name of the `.npy` file with the matrix data, relative to the directory of the
+    file containing this object. None if the data is inline in `data`."""
+    scales: MatrixData | None = None
+    """Per-row scales of int8 matrices. Stored the same way as the matrix itself."""
+
+    @classmethod
+    def from_matrix(cls, matrix: Matrix, dtype: StorageDtype | None = None) -> Self:
+        """Serialise an embedding matrix to a base64-encoded byte string with metadata.
+
+        If `dtype` is None, the matrix is stored with its own data type.
+        """
+        stored, scales = _to_storage(matrix, dtype)
+        return cls(
+            shape=list(stored.shape),
+            dtype=str(stored.dtype),
+            data=base64.b64encode(stored.tobytes()).decode("utf-8"),
+            scales=cls.from_matrix(scales) if scales is not None else None,
+        )
 
     @classmethod
-    def from_matrix(cls, matrix: Matrix) -> Self:
-        """Serialise an embedding matrix to a base64-encoded byte string with metadata."""
+    def from_matrix_npy(
+        cls, matrix: Matrix, path: Path, dtype: StorageDtype = StorageDtype.FLOAT32
+    ) -> Self:
+        """Save an embedding matrix to the `.npy` file `path` and refer to it by name.
+
+        The sidecar must be kept in the same directory as the file where this object is
+        saved. For int8, the row scales are saved in another sidecar next to it.
+
+        If `matrix` is already a float32 memory map of `path` (e.g. it was encoded
+        straight into the sidecar), it's flushed instead of written again. Otherwise,
+        the file is written to a temporary path and renamed, so it's safe to replace the
+        file `matrix` is mapped from.
+        """
+        if (
+            dtype is StorageDtype.FLOAT32
+            and isinstance(matrix, np.memmap)
+            and _is_mapped_from(matrix, path)
+        ):
+            matrix.flush()
+            return cls(
+                shape=list(matrix.shape), dtype=str(matrix.dtype), file=path.name
+            )
+
+        stored, scales = _to_storage(matrix, dtype)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, stored, allow_pickle=False)
+        tmp_path.replace(path)
+
         return cls(
-            shape=list(matrix.shape),
-            dtype=str(matrix.dtype),
-            data=base64.b64encode(matrix.tobytes()).decode("utf-8"),
+            shape=list(stored.shape),
+            dtype=str(stored.dtype),
+            file=path.name,
+            scales=cls.from_matrix_npy(scales, path.with_suffix(".scales.npy"))
+            if scales is not None
+            else None,
         )
 
-    def to_matrix(self) -> Matrix:
-        """Convert the serialised data back to a matrix."""
+    @property
+    def is_mapped(self) -> bool:
+        """Whether `to_matrix` returns a memory map instead of a copy in memory.
+
+        That's the case for float32 sidecars. Other types must be converted on load.
+        """
+        return self.file is not None and self.dtype == StorageDtype.FLOAT32
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the stored matrix data in bytes, including the int8 scales."""
+        size = int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+        if self.scales is not None:
+            size += self.scales.nbytes
+        return size
+
+    def to_matrix(self, base_dir: Path | None = None) -> Matrix:
+        """Convert the serialised data back to a float32 matrix.
+
+        Float32 sidecar matrices are memory-mapped read-only from `base_dir / file`.
+        Other data types are converted to float32, which loads them into memory.
+
+        Raises:
+            ValueError: if the data is in a sidecar file but `base_dir` is not given, or
+                if the object has neither inline data nor a file.
+        """
+        stored = self._load_stored(base_dir)
+
+        if self.scales is not None:
+            return dequantize_int8(stored, self.scales.to_matrix(base_dir))
+        if stored.dtype != np.float32:
+            return stored.astype(np.float32)
+        return stored
+
+    def _load_stored(self, base_dir: Path | None) -> npt.NDArray[Any]:
+        """Load matrix with the stored data type, memory-mapped if it's a sidecar."""
+        if self.file is not None:
+            if base_dir is None:
+                raise ValueError(
+                    f"Matrix data is in '{self.file}', but no base directory was given."
+                )
+            return np.load(base_dir / self.file, mmap_mode="r", allow_pickle=False)
+
+        if self.data is None:
+            raise ValueError("Matrix data has neither inline data nor a file.")
+
         bytes_data = base64.b64decode(self.data.encode("utf-8"))
         matrix = np.frombuffer(bytes_data, dtype=np.dtype(self.dtype))
         return matrix.reshape(self.shape)
@@ -0,0 +1,264 @@
+"""Persistent content-addressed store for text embeddings.
+
+Embeddings are keyed by the encoder model name and the SHA-256 of the text, so the same
+text encoded by the same model is only computed once across runs. The store is a single
+SQLite file, which is safe to share between sequential runs of different commands.
+
+`embedding.Encoder` uses this transparently when given a cache (or when the
+`EMBEDDING_CACHE` environment variable points to a file): only texts missing from the
+cache are sent to the model.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Self
+
+import numpy as np
+import numpy.typing as npt
+
+logger = logging.getLogger(__name__)
+
+type _Matrix = npt.NDArray[np.float32]
+
+CACHE_ENV_VAR = "EMBEDDING_CACHE"
+"""Environment variable with the path to the default embedding cache file."""
+DEFAULT_MAX_ENTRIES = 1_000_000
+"""Default maximum number of embeddings kept in the cache before eviction."""
+
+_SQLITE_MAX_PARAMS = 900
+"""Maximum number of keys per `IN` query. SQLite's default limit is 999."""
+
+
+@dataclass(kw_only=True)
+class CacheStats:
+    """Hit and miss counters for an embedding cache."""
+
+    hits: int = 0
+    """Number of texts whose embeddings were found in the cache."""
+    misses: int = 0
+    """Number of texts whose embeddings had to be computed."""
+    evictions: int = 0
+    """Number of entries removed to keep the cache under its size limit."""
+
+    @property
+    def total(self) -> int:
+        """Total number of lookups."""
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that were hits. 0 if there were no lookups."""
+        return self.hits / self.total if self.total else 0
+
+    def __str__(self) -> str:
+        """Display counters and hit rate."""
+        return (
+            f"Embedding cache: {self.hits} hits, {self.misses} misses"
+            f" ({self.hit_rate:.1%} hit rate), {self.evictions} evictions"
+        )
+
+
+class EmbeddingCache:
+    """On-disk embedding store keyed by (model name, text hash).
+
+    Entries are evicted least-recently-used first once the number of stored embeddings
+    goes over `max_entries`. The number is counted when the cache is opened and kept up
+    to date by `put_many`, so writes don't scan the table.
+    """
+
+    def __init__(self, path: Path, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        """Open (or create) the cache stored in `path`.
+
+        Args:
+            path: SQLite file where the embeddings are stored. Parent directories are
+                created if needed.
+            max_entries: Maximum number of embeddings to keep. When exceeded, the least
+                recently used entries are deleted.
+        """
+        if max_entries <= 0:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                dtype TEXT NOT NULL,
+                data BLOB NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (model, key)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)"
+        )
+        self._conn.commit()
+
+        # Number of stored embeddings, for eviction.
+        (self._count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM embeddings"
+        ).fetchone()
+
+    @classmethod
+    def from_env(cls) -> Self | None:
+        """Open the cache from the path in `EMBEDDING_CACHE`, if it's set."""
+        if path := os.getenv(CACHE_ENV_VAR):
+            return cls(Path(path))
+        return None
+
+    def get_or_compute(
+        self,
+        model: str,
+        texts: Sequence[str],
+        compute: Callable[[Sequence[str]], _Matrix],
+    ) -> _Matrix:
+        """Get embeddings for `texts`, computing and storing only the cache misses.
+
+        Args:
+            model: Name of the model that generates the embeddings. Part of the key.
+            texts: Texts to embed.
+            compute: Function that embeds a sequence of texts as a matrix, one row per
+                text. Only called with texts missing from the cache, each once.
+
+        Returns:
+            Matrix of embeddings with one row per item in `texts`, in the same order.
+        """
+        if not texts:
+            return compute(texts)
+
+        keys = [_hash_text(text) for text in texts]
+        found = self.get_many(model, keys)
+
+        missing_keys = list(dict.fromkeys(k for k in keys if k not in found))
+        self.stats.hits += len(texts) - len(missing_keys)
+        self.stats.misses += len(missing_keys)
+
+        if missing_keys:
+            key_to_text = dict(zip(keys, texts))
+            computed = compute([key_to_text[key] for key in missing_keys])
+            self.put_many(model, zip(missing_keys, computed))
+            found.update(zip(missing_keys, computed))
+
+        return np.vstack([found[key] for key in keys])
+
+    def get_many(self, model: str, keys: Sequence[str]) -> dict[str, _Matrix]:
+        """Retrieve stored embeddings by key. Missing keys are absent from the output.
+
+        Retrieved entries have their access time updated for eviction purposes.
+        """
+        result: dict[str, _Matrix] = {}
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            for start in range(0, len(unique_keys), _SQLITE_MAX_PARAMS):
+                chunk = unique_keys[start : start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    "SELECT key, dtype, data FROM embeddings"  # noqa: S608
+                    f" WHERE model = ? AND key IN ({placeholders})",
+                    [model, *chunk],
+                )
+                for key, dtype, data in rows:
+                    result[key] = np.frombuffer(data, dtype=np.dtype(dtype))
+
+            if result:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET accessed = ? WHERE model = ? AND key = ?",
+                    [(now, model, key) for key in result],
+                )
+                self._conn.commit()
+
+        return result
+
+    def put_many(self, model: str, entries: Iterable[tuple[str, _Matrix]]) -> None:
+        """Store embeddings by key, then evict old entries if over the size limit."""
+        now = time.time()
+        # Keyed by the embedding key, so repeated keys are only stored and counted once.
+        rows = {
+            key: (model, key, str(vector.dtype), vector.tobytes(), now)
+            for key, vector in entries
+        }
+
+        with self._lock:
+            replaced = self._count_stored(model, list(rows))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, dtype, data, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows.values(),
+            )
+            self._count += len(rows) - replaced
+            self._evict()
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        """Number of embeddings stored across all models."""
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
+
+    def clear(self) -> None:
+        """Remove all stored embeddings."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._count = 0
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        """Delete least recently used entries over `max_entries`. Expects the lock held."""
+        excess = self._count - self.max_entries
+        if excess <= 0:
+            return
+
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (model, key) IN"
+            " (SELECT model, key FROM embeddings ORDER BY accessed LIMIT ?)",
+            (excess,),
+        )
+        self._count -= excess
+        self.stats.evictions += excess
+        logger.debug("Evicted %d entries from embedding cache.", excess)
+
+    def _count_stored(self, model: str, keys: Sequence[str]) -> int:
+        """Number of `keys` already stored for `model`. Expects the lock held."""
+        count = 0
+        for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+            chunk = keys[start : start + _SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            (found,) = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings"  # noqa: S608
+                f" WHERE model = ? AND key IN ({placeholders})",
+                [model, *chunk],
+            ).fetchone()
+            count += found
+        return count
+
+
+def _hash_text(text: str) -> str:
+    """Content key for a text: SHA-256 of its UTF-8 bytes."""
+    return hashlib.sha256(text.encode()).hexdigest()
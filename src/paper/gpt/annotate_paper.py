@@ -22,6 +22,7 @@ from rich.console import Console
 from rich.table import Table
 from tqdm import tqdm
 
+from paper.gpt.batch import BatchRequest
 from paper.gpt.model import (
     PaperAnnotated,
     PaperTerms,
@@ -173,6 +174,14 @@ def run(
     batch_size: Annotated[
         int, typer.Option(help="Size of the batches being annotated.")
     ] = 100,
+    batch_api_dir: Annotated[
+        Path | None,
+        typer.Option(
+            help="Send all requests with the OpenAI Batch API instead of the live API,"
+            " keeping the batch files in this directory. Cheaper and not rate-limited,"
+            " but can take hours. Run again with the same directory to resume."
+        ),
+    ] = None,
 ) -> None:
     """Extract key terms for problems and methods from S2 Papers."""
     asyncio.run(
@@ -191,6 +200,7 @@ def run(
             log,
             paper_type,
             batch_size,
+            batch_api_dir,
         )
     )
 
@@ -210,6 +220,7 @@ async def annotate_papers(
     show_log: DetailOptions,
     paper_type: PaperType,
     batch_size: int,
+    batch_api_dir: Path | None = None,
 ) -> None:
     """Extract problem and method terms from each paper.
 
@@ -242,6 +253,8 @@ async def annotate_papers(
             dependent on the prompt.
         paper_type: Type of the paper input data.
         batch_size: Number of items per annotation batch.
+        batch_api_dir: If given, run all requests with the Batch API and keep its files
+            here. See `LLMClient.run_batch`.
     """
     params = get_params()
     logger.info(render_params(params))
@@ -289,19 +302,31 @@ async def annotate_papers(
     )
 
     with Timer() as timer:
-        output = await _annotate_papers(
-            client,
-            papers_remaining.remaining,
-            user_prompt_terms,
-            user_prompt_abstract,
-            abstract_demonstrations,
-            output_intermediate_file,
-            batch_size,
-        )
+        if batch_api_dir is not None:
+            output = await _annotate_papers_batch_api(
+                client,
+                papers_remaining.remaining,
+                user_prompt_terms,
+                user_prompt_abstract,
+                abstract_demonstrations,
+                output_intermediate_file,
+                batch_api_dir,
+            )
+        else:
+            output = await _annotate_papers(
+                client,
+                papers_remaining.remaining,
+                user_prompt_terms,
+                user_prompt_abstract,
+                abstract_demonstrations,
+                output_intermediate_file,
+                batch_size,
+            )
     output_valid = [ann for ann in output.result if ann.item.is_valid()]
 
     logger.info(f"Time elapsed: {timer.human}")
     logger.info(f"Total cost: ${output.cost:.10f}")
+    client.log_cache_stats()
 
     logger.info("All results: %d", len(output.result))
     logger.info("Valid results: %d", len(output_valid))
@@ -381,43 +406,127 @@ async def _annotate_papers(
     return GPTResult(result=ann_outputs, cost=total_cost)
 
 
-async def _annotate_paper_single(
+async def _annotate_papers_batch_api(
     client: LLMClient,
+    papers: Sequence[PaperToAnnotate],
+    user_prompt_term: PromptTemplate,
+    user_prompt_abstract: PromptTemplate,
+    abstract_demonstrations: str,
+    output_intermediate_path: Path,
+    batch_api_dir: Path,
+) -> GPTResult[list[PromptResult[PaperAnnotated]]]:
+    """Annotate all papers with Batch API jobs. Same output as `_annotate_papers`.
+
+    The term and abstract requests have different output types, so they run as two
+    batches in subdirectories of `batch_api_dir`. Custom IDs are the paper indices.
+    """
+    prompts = [
+        _format_prompts(
+            paper, user_prompt_term, user_prompt_abstract, abstract_demonstrations
+        )
+        for paper in papers
+    ]
+    term_requests = [
+        BatchRequest(
+            custom_id=str(idx), system_prompt=TERM_SYSTEM_PROMPT, user_prompt=term
+        )
+        for idx, (term, _) in enumerate(prompts)
+    ]
+    abstract_requests = [
+        BatchRequest(
+            custom_id=str(idx), system_prompt=ABS_SYSTEM_PROMPT, user_prompt=abstract
+        )
+        for idx, (_, abstract) in enumerate(prompts)
+    ]
+
+    term_results, abstract_results = await asyncio.gather(
+        client.run_batch(PaperTerms, term_requests, batch_api_dir / "terms"),
+        client.run_batch(
+            GPTAbstractClassify, abstract_requests, batch_api_dir / "abstract"
+        ),
+    )
+
+    ann_outputs: list[PromptResult[PaperAnnotated]] = []
+    total_cost = 0
+
+    for idx, (paper, (_, abstract_prompt_text)) in enumerate(
+        zip(papers, prompts, strict=True)
+    ):
+        result_term = term_results[str(idx)]
+        result_abstract = abstract_results[str(idx)]
+        total_cost += result_term.cost + result_abstract.cost
+
+        result = _paper_result(
+            paper, abstract_prompt_text, result_term.result, result_abstract.result
+        )
+        ann_outputs.append(result)
+        append_intermediate_result(output_intermediate_path, result)
+
+    return GPTResult(result=ann_outputs, cost=total_cost)
+
+
+def _format_prompts(
     paper: PaperToAnnotate,
     user_prompt_term: PromptTemplate,
     user_prompt_abstract: PromptTemplate,
     abstract_demonstrations: str,
-) -> GPTResult[PromptResult[PaperAnnotated[PaperTerms]]]:
-    """Annotate a single paper with its key terms."""
+) -> tuple[str, str]:
+    """Build the user prompts for the term extraction and abstract classification."""
     term_prompt_text = user_prompt_term.template.format(
         title=paper.title, abstract=paper.abstract
     )
     abstract_prompt_text = user_prompt_abstract.template.format(
         demonstrations=abstract_demonstrations, abstract=paper.abstract
     )
+    return term_prompt_text, abstract_prompt_text
 
-    result_term = await client.run(PaperTerms, TERM_SYSTEM_PROMPT, term_prompt_text)
-    result_abstract = await client.run(
-        GPTAbstractClassify, ABS_SYSTEM_PROMPT, abstract_prompt_text
-    )
 
-    terms = result_term.result or PaperTerms.empty()
-    abstract = result_abstract.result or GPTAbstractClassify.empty()
+def _paper_result(
+    paper: PaperToAnnotate,
+    abstract_prompt_text: str,
+    terms: PaperTerms | None,
+    abstract: GPTAbstractClassify | None,
+) -> PromptResult[PaperAnnotated[PaperTerms]]:
+    """Combine the term and abstract outputs. Missing outputs are empty."""
+    terms = terms or PaperTerms.empty()
+    abstract = abstract or GPTAbstractClassify.empty()
 
     if not terms.is_valid():
         logger.warning(f"Paper '{paper.title}': invalid PaperTerms")
     if not abstract.is_valid():
         logger.warning(f"Paper '{paper.title}': invalid GPTAbstractClassify")
 
+    return PromptResult(
+        item=PaperAnnotated(
+            terms=terms,
+            paper=paper,
+            background=abstract.background,
+            target=abstract.target,
+        ),
+        prompt=Prompt(user=abstract_prompt_text, system=TERM_SYSTEM_PROMPT),
+    )
+
+
+async def _annotate_paper_single(
+    client: LLMClient,
+    paper: PaperToAnnotate,
+    user_prompt_term: PromptTemplate,
+    user_prompt_abstract: PromptTemplate,
+    abstract_demonstrations: str,
+) -> GPTResult[PromptResult[PaperAnnotated[PaperTerms]]]:
+    """Annotate a single paper with its key terms."""
+    term_prompt_text, abstract_prompt_text = _format_prompts(
+        paper, user_prompt_term, user_prompt_abstract, abstract_demonstrations
+    )
+
+    result_term = await client.run(PaperTerms, TERM_SYSTEM_PROMPT, term_prompt_text)
+    result_abstract = await client.run(
+        GPTAbstractClassify, ABS_SYSTEM_PROMPT, abstract_prompt_text
+    )
+
     return GPTResult(
-        result=PromptResult(
-            item=PaperAnnotated(
-                terms=terms,
-                paper=paper,
-                background=abstract.background,
-                target=abstract.target,
-            ),
-            prompt=Prompt(user=abstract_prompt_text, system=TERM_SYSTEM_PROMPT),
+        result=_paper_result(
+            paper, abstract_prompt_text, result_term.result, result_abstract.result
         ),
         cost=result_term.cost,
     )
@@ -0,0 +1,317 @@
+"""Run many independent chat requests through the OpenAI Batch API.
+
+Offline stages send thousands of requests that don't depend on each other. The Batch API
+takes them all in a single JSONL file, runs them within a completion window, and charges
+half the price, without counting against the live rate limits.
+
+A `BatchJob` writes the requests file, uploads it, creates the batch, polls until it's
+finished and downloads the results. Its progress is saved in a work directory after each
+step, so running it again with the same directory and requests resumes the existing
+batch instead of submitting a new one. See `LLMClient.run_batch`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from openai.lib._parsing import type_to_response_format_param
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel, ValidationError
+
+from paper.types import Immutable
+from paper.util.serde import load_data_single, save_data
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from openai.types import Batch
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+"""Endpoint that runs each request in the batch."""
+BATCH_DISCOUNT = 0.5
+"""Batch API price as a fraction of the live API price."""
+DEFAULT_POLL_INTERVAL = 60
+"""Default number of seconds between batch status checks."""
+
+_FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+"""Batch statuses after which no more requests will run."""
+_RECENT_BATCHES = 100
+"""Number of most recent batches searched for one created by an interrupted job."""
+
+
+@dataclass(frozen=True, kw_only=True)
+class BatchRequest:
+    """Chat request in a batch, identified by a custom ID unique within the batch."""
+
+    custom_id: str
+    system_prompt: str
+    user_prompt: str
+    max_tokens: int | None = None
+
+
+@dataclass(frozen=True, kw_only=True)
+class BatchResponse:
+    """Response to a batch request: message content and its cost."""
+
+    content: str | None
+    """Message text, or None if the request failed."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class BatchState(Immutable):
+    """Progress of a batch job, saved in its work directory to resume it."""
+
+    input_hash: str
+    """SHA-256 of the requests file. A different hash means different requests."""
+    input_file_id: str | None = None
+    """ID of the uploaded requests file, once uploaded."""
+    batch_id: str | None = None
+    """ID of the batch, once created."""
+    status: str | None = None
+    """Last known batch status."""
+    output_file_id: str | None = None
+    """ID of the file with the successful responses, once finished."""
+    error_file_id: str | None = None
+    """ID of the file with the failed requests, once finished."""
+
+
+class BatchJob:
+    """Submits requests to the Batch API and waits for their responses."""
+
+    STATE_FILE = "batch.json"
+    INPUT_FILE = "input.jsonl"
+    OUTPUT_FILE = "output.jsonl"
+    ERROR_FILE = "errors.jsonl"
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        work_dir: Path,
+        *,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> None:
+        """Create job that keeps its files and progress in `work_dir`.
+
+        Args:
+            client: OpenAI client used to upload files and manage the batch.
+            work_dir: Directory for the requests and responses files and the job state.
+                Created if it doesn't exist.
+            poll_interval: Seconds between batch status checks.
+        """
+        self.client = client
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+
+    async def run(self, lines: Sequence[Mapping[str, Any]]) -> dict[str, BatchResponse]:
+        """Run the batch of request `lines` and get the responses by custom ID.
+
+        If the work directory has a job for the same requests, resumes it from where it
+        stopped. If it has a job for different requests, starts over.
+
+        Args:
+            lines: Requests in the Batch API input format. See `request_line`.
+
+        Returns:
+            Response for each custom ID. Requests that failed or didn't run before the
+            batch finished have None content.
+
+        Raises:
+            openai.APIError: if the API calls fail.
+        """
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        content = "".join(json.dumps(line) + "\n" for line in lines)
+        state = self._load_state(hashlib.sha256(content.encode()).hexdigest())
+
+        input_file_id = state.input_file_id
+        if input_file_id is None:
+            input_path = self.work_dir / self.INPUT_FILE
+            input_path.write_text(content)
+            uploaded = await self.client.files.create(
+                file=(self.INPUT_FILE, input_path.read_bytes()), purpose="batch"
+            )
+            input_file_id = uploaded.id
+            state = self._save_state(state, input_file_id=input_file_id)
+            logger.info("Uploaded batch input with %d requests.", len(lines))
+
+        batch_id = state.batch_id
+        if batch_id is None:
+            # The job might have been interrupted after creating the batch, but before
+            # saving its ID. Look for it before creating a new one.
+            batch = await self._find_batch(input_file_id)
+            if batch is None:
+                batch = await self.client.batches.create(
+                    input_file_id=input_file_id,
+                    endpoint=BATCH_ENDPOINT,
+                    completion_window="24h",
+                )
+                logger.info("Created batch %s.", batch.id)
+            else:
+                logger.info("Found existing batch %s.", batch.id)
+            batch_id = batch.id
+            state = self._update(state, batch)
+        else:
+            logger.info("Resuming batch %s (%s).", batch_id, state.status)
+
+        while state.status not in _FINISHED_STATUSES:
+            await asyncio.sleep(self.poll_interval)
+            batch = await self.client.batches.retrieve(batch_id)
+            state = self._update(state, batch)
+            if counts := batch.request_counts:
+                logger.info(
+                    "Batch %s: %s. %d/%d done, %d failed.",
+                    batch.id,
+                    batch.status,
+                    counts.completed,
+                    counts.total,
+                    counts.failed,
+                )
+
+        if state.status != "completed":
+            logger.warning(
+                "Batch %s finished with status %s.", state.batch_id, state.status
+            )
+
+        responses = {line["custom_id"]: BatchResponse(content=None) for line in lines}
+        output = await self._download(state.output_file_id, self.OUTPUT_FILE)
+        responses.update(_parse_output(output))
+        await self._download(state.error_file_id, self.ERROR_FILE)
+
+        failed = sum(r.content is None for r in responses.values())
+        if failed:
+            logger.warning("%d of %d batch requests failed.", failed, len(responses))
+        return responses
+
+    async def _find_batch(self, input_file_id: str) -> Batch | None:
+        """Find a recent batch created from the uploaded requests file, if any."""
+        checked = 0
+        async for batch in self.client.batches.list(limit=_RECENT_BATCHES):
+            if batch.input_file_id == input_file_id:
+                return batch
+            checked += 1
+            if checked >= _RECENT_BATCHES:
+                break
+        return None
+
+    def _load_state(self, input_hash: str) -> BatchState:
+        """Load the saved state if it's for the same requests, or start a new one."""
+        path = self.work_dir / self.STATE_FILE
+        if path.exists():
+            state = load_data_single(path, BatchState)
+            if state.input_hash == input_hash:
+                return state
+            logger.warning(
+                "Batch in %s has different requests. Starting a new one.", self.work_dir
+            )
+            (self.work_dir / self.OUTPUT_FILE).unlink(missing_ok=True)
+            (self.work_dir / self.ERROR_FILE).unlink(missing_ok=True)
+
+        return self._save_state(BatchState(input_hash=input_hash))
+
+    def _save_state(self, state: BatchState, **updates: Any) -> BatchState:
+        state = state.model_copy(update=updates)
+        save_data(self.work_dir / self.STATE_FILE, state)
+        return state
+
+    def _update(self, state: BatchState, batch: Batch) -> BatchState:
+        return self._save_state(
+            state,
+            batch_id=batch.id,
+            status=batch.status,
+            output_file_id=batch.output_file_id,
+            error_file_id=batch.error_file_id,
+        )
+
+    async def _download(self, file_id: str | None, name: str) -> str:
+        """Get file contents, downloading it to the work directory if needed."""
+        if file_id is None:
+            return ""
+
+        path = self.work_dir / name
+        if not path.exists():
+            response = await self.client.files.content(file_id)
+            tmp_path = path.with_name(f"{name}.tmp")
+            tmp_path.write_bytes(response.content)
+            tmp_path.replace(path)
+
+        return path.read_text()
+
+
+def request_line[T: BaseModel](
+    request: BatchRequest,
+    *,
+    model: str,
+    class_: type[T] | None,
+    seed: int,
+    temperature: float,
+) -> dict[str, Any]:
+    """Create line in the Batch API input format for a chat request.
+
+    Args:
+        request: Request with the prompts.
+        model: Model that runs the request.
+        class_: Structured Outputs type. If None, the response is plain text.
+        seed: Seed to give the model.
+        temperature: Temperature to give the model.
+
+    Returns:
+        JSON-serialisable request line.
+    """
+    body: dict[str, Any] = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": request.system_prompt},
+            {"role": "user", "content": request.user_prompt},
+        ],
+        "seed": seed,
+        "temperature": temperature,
+    }
+    if class_ is not None:
+        body["response_format"] = type_to_response_format_param(class_)
+    if request.max_tokens is not None:
+        body["max_tokens"] = request.max_tokens
+
+    return {
+        "custom_id": request.custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": body,
+    }
+
+
+def _parse_output(output: str) -> dict[str, BatchResponse]:
+    """Parse the Batch API output file into responses by custom ID."""
+    responses: dict[str, BatchResponse] = {}
+
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+
+        item: dict[str, Any] = json.loads(line)
+        response: dict[str, Any] = item.get("response") or {}
+        if response.get("status_code") != 200:
+            logger.debug("Batch request %s failed: %s", item["custom_id"], item)
+            continue
+
+        try:
+            completion = ChatCompletion.model_validate(response["body"])
+        except ValidationError:
+            logger.warning("Invalid response for batch request %s", item["custom_id"])
+            continue
+
+        usage = completion.usage
+        responses[item["custom_id"]] = BatchResponse(
+            content=completion.choices[0].message.content,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+
+    return responses
@@ -26,6 +26,7 @@ from tqdm import tqdm
 
 from paper import evaluation_metrics, peerread
 from paper import semantic_scholar as s2
+from paper.gpt.batch import BatchRequest
 from paper.gpt.model import Prompt, PromptResult
 from paper.gpt.prompts import PromptTemplate, load_prompts, print_prompts
 from paper.gpt.run_gpt import (
@@ -113,6 +114,14 @@ def run(
     batch_size: Annotated[
         int, typer.Option(help="Size of the batches being classified.")
     ] = 100,
+    batch_api_dir: Annotated[
+        Path | None,
+        typer.Option(
+            help="Send all requests with the OpenAI Batch API instead of the live API,"
+            " keeping the batch files in this directory. Cheaper and not rate-limited,"
+            " but can take hours. Run again with the same directory to resume."
+        ),
+    ] = None,
 ) -> None:
     """Classify reference citation contexts by polarity."""
     asyncio.run(
@@ -127,6 +136,7 @@ def run(
             continue_,
             seed,
             batch_size,
+            batch_api_dir,
         )
     )
 
@@ -142,6 +152,7 @@ async def classify_contexts(
     continue_: bool,
     seed: int,
     batch_size: int,
+    batch_api_dir: Path | None = None,
 ) -> None:
     """Classify reference citation contexts by polarity."""
     params = get_params()
@@ -181,17 +192,28 @@ async def classify_contexts(
         )
 
     with Timer() as timer:
-        results = await _classify_contexts(
-            client,
-            user_prompt,
-            papers_remaining.remaining,
-            limit_references,
-            output_intermediate_file,
-            batch_size,
-        )
+        if batch_api_dir is not None:
+            results = await _classify_contexts_batch_api(
+                client,
+                user_prompt,
+                papers_remaining.remaining,
+                limit_references,
+                output_intermediate_file,
+                batch_api_dir,
+            )
+        else:
+            results = await _classify_contexts(
+                client,
+                user_prompt,
+                papers_remaining.remaining,
+                limit_references,
+                output_intermediate_file,
+                batch_size,
+            )
 
     logger.info(f"Time elapsed: {timer.human}")
     logger.info(f"Total cost: ${results.cost:.10f}")
+    client.log_cache_stats()
 
     results_all = seqcat(papers_remaining.done, results.result)
     stats, metrics = show_classified_stats(result.item for result in results_all)
@@ -358,13 +380,7 @@ async def _classify_paper(
         classified_contexts: list[ContextClassified] = []
 
         for context in reference.contexts:
-            user_prompt_text = user_prompt.template.format(
-                main_title=paper.title,
-                main_abstract=paper.abstract,
-                reference_title=reference.title,
-                reference_abstract=reference.abstract,
-                context=context.sentence,
-            )
+            user_prompt_text = _format_prompt(user_prompt, paper, reference, context)
             if not user_prompt_save:
                 user_prompt_save = user_prompt_text
 
@@ -386,6 +402,31 @@ async def _classify_paper(
             S2ReferenceClassified.from_(reference, contexts=classified_contexts)
         )
 
+    result = _paper_result(paper, references, classified_references, user_prompt_save)
+    return GPTResult(result=result, cost=total_cost)
+
+
+def _format_prompt(
+    user_prompt: PromptTemplate,
+    paper: s2.PaperWithS2Refs,
+    reference: s2.S2Reference,
+    context: peerread.CitationContext,
+) -> str:
+    return user_prompt.template.format(
+        main_title=paper.title,
+        main_abstract=paper.abstract,
+        reference_title=reference.title,
+        reference_abstract=reference.abstract,
+        context=context.sentence,
+    )
+
+
+def _paper_result(
+    paper: s2.PaperWithS2Refs,
+    references: Sequence[s2.S2Reference],
+    classified_references: Sequence[S2ReferenceClassified],
+    user_prompt_save: str | None,
+) -> PromptResult[PaperWithContextClassfied]:
     # Some references might have fewer contexts after classification, but all
     # references should be in the output.
     if len(classified_references) != len(references):
@@ -396,11 +437,10 @@ async def _classify_paper(
             len(classified_references),
         )
 
-    result = PromptResult(
+    return PromptResult(
         prompt=Prompt(system=CONTEXT_SYSTEM_PROMPT, user=user_prompt_save or ""),
         item=PaperWithContextClassfied.from_(paper, classified_references),
     )
-    return GPTResult(result=result, cost=total_cost)
 
 
 async def _classify_contexts(
@@ -445,6 +485,70 @@ async def _classify_contexts(
     return GPTResult(result=paper_outputs, cost=total_cost)
 
 
+async def _classify_contexts_batch_api(
+    client: LLMClient,
+    user_prompt: PromptTemplate,
+    papers: Sequence[s2.PaperWithS2Refs],
+    limit_references: int | None,
+    output_intermediate_path: Path,
+    batch_api_dir: Path,
+) -> GPTResult[list[PromptResult[PaperWithContextClassfied]]]:
+    """Classify the contexts of all papers in a single Batch API job.
+
+    Same output as `_classify_contexts`. Each context is a request whose custom ID is
+    made of the paper, reference and context indices. The intermediate results are
+    saved once the batch is finished.
+    """
+    requests = [
+        BatchRequest(
+            custom_id=f"{paper_idx}-{ref_idx}-{ctx_idx}",
+            system_prompt=CONTEXT_SYSTEM_PROMPT,
+            user_prompt=_format_prompt(user_prompt, paper, reference, context),
+        )
+        for paper_idx, paper in enumerate(papers)
+        for ref_idx, reference in enumerate(paper.references[:limit_references])
+        for ctx_idx, context in enumerate(reference.contexts)
+    ]
+    results = await client.run_batch(GPTContext, requests, batch_api_dir)
+
+    paper_outputs: list[PromptResult[PaperWithContextClassfied]] = []
+    total_cost = sum(result.cost for result in results.values())
+
+    for paper_idx, paper in enumerate(papers):
+        references = paper.references[:limit_references]
+        classified_references: list[S2ReferenceClassified] = []
+
+        for ref_idx, reference in enumerate(references):
+            classified_contexts = [
+                ContextClassified(
+                    text=context.sentence,
+                    gold=context.polarity,
+                    prediction=gpt_context.polarity,
+                )
+                for ctx_idx, context in enumerate(reference.contexts)
+                if (gpt_context := results[f"{paper_idx}-{ref_idx}-{ctx_idx}"].result)
+            ]
+            classified_references.append(
+                S2ReferenceClassified.from_(reference, contexts=classified_contexts)
+            )
+
+        user_prompt_save = next(
+            (
+                _format_prompt(user_prompt, paper, reference, reference.contexts[0])
+                for reference in references
+                if reference.contexts
+            ),
+            None,
+        )
+        result = _paper_result(
+            paper, references, classified_references, user_prompt_save
+        )
+        paper_outputs.append(result)
+        append_intermediate_result(output_intermediate_path, result)
+
+    return GPTResult(result=paper_outputs, cost=total_cost)
+
+
 def show_classified_stats(
     data: Iterable[PaperWithContextClassfied],
 ) -> tuple[str, evaluation_metrics.Metrics | None]:
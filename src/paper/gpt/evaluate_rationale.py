@@ -393,6 +393,7 @@ async def evaluate_rationales(
 
     logger.info(f"Time elapsed: {timer.human}")
     logger.info(f"Total cost: ${results.cost:.10f}")
+    client.log_cache_stats()
 
     results_all = seqcat(papers_remaining.done, results.result)
     results_items = PromptResult.unwrap(results_all)
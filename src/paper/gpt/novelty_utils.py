@@ -6,6 +6,7 @@ import asyncio
 import logging
 import os
 import random
+from enum import StrEnum
 from typing import TYPE_CHECKING, Annotated
 
 from pydantic import Field
@@ -21,6 +22,21 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+class BestOfNMode(StrEnum):
+    """How to sample the N ratings for the novelty probability."""
+
+    CALLS = "calls"
+    """One request per rating. Pays for the input N times."""
+    N = "n"
+    """One request that returns N ratings (`LLMClient.run_n`)."""
+    LOGPROBS = "logprobs"
+    """One request for the probabilities of the rating token.
+
+    Uses `LLMClient.choice_probabilities`. The novelty probability is the expected
+    rating under them, instead of the average of N sampled ratings.
+    """
+
+
 class NoveltyResult(Immutable):
     """Result of evaluating novelty given paper information and external evidence."""
 
@@ -47,6 +63,7 @@ async def get_novelty_probability(
 
     Environment variables:
         BESTOFN: How many ratings we should sample.
+        BESTOFN_MODE: How to sample them. See `BestOfNMode`. Defaults to "calls".
 
     Returns:
         Probability as a float between 0 and 1. A value of 0.8 means 80% probability
@@ -57,10 +74,18 @@ async def get_novelty_probability(
     except ValueError:
         n = 5
 
+    try:
+        mode = BestOfNMode(os.getenv("BESTOFN_MODE", BestOfNMode.CALLS))
+    except ValueError:
+        logger.warning("Invalid BESTOFN_MODE. Using %s.", BestOfNMode.CALLS)
+        mode = BestOfNMode.CALLS
+
     if n == 0:
         prob = output.map(lambda out: 0.0 if out.label == 0 else 1.0)
     else:
-        prob = await output.abind(lambda out: get_novelty_best_of_n(client, out, n))
+        prob = await output.abind(
+            lambda out: get_novelty_best_of_n(client, out, n, mode=mode)
+        )
 
     # "not novel" will have at most 40% prob, and "novel" will have at least 60%
     return prob.map(lambda p: min(p, 0.4) if output.result.label == 0 else max(p, 0.6))
@@ -99,43 +124,92 @@ This initial assessment suggests the paper leans toward being {label_text}.
 Based on your independent assessment, what rating from 1 to 4 best reflects
 this paper's novelty?"""
 
+BEST_OF_LOGPROBS_SUFFIX = "\n\nAnswer with only the rating number."
+"""Added to the user prompt so the first token of the answer is the rating."""
+_RATINGS = ["1", "2", "3", "4"]
+
 _RNG = random.Random(0)
 
 
 async def get_novelty_best_of_n(
-    client: LLMClient, output: GPTStructuredRaw, n: int
+    client: LLMClient,
+    output: GPTStructuredRaw,
+    n: int,
+    *,
+    mode: BestOfNMode = BestOfNMode.CALLS,
 ) -> GPTResult[float]:
     """Get novelty probability from re-prompting the LLM for best of N results.
 
     We use another round of calls to the LLM with a custom prompt to ask it to review
     the evidence highlighted by the evaluation result, and generate a novelty rating
-    from 1-5. The ratings are then averaged to produce a probability.
+    from 1-4. The ratings are then averaged to produce a probability.
 
     Args:
         client: LLM client to use to generate best of N results.
         output: Evaluation output. Used as input for best of N results.
-        n: Number of results to prompt for.
+        n: Number of results to prompt for. Unused in LOGPROBS mode.
+        mode: Whether to make N requests, one request for N ratings, or one request
+            for the rating probabilities. See `BestOfNMode`.
 
     Returns:
         Probability as a float between 0 and 1, calculated as the average of all
-        ratings divided by 5. For example, ratings [2, 3, 3, 4, 3] would yield
-        (2+3+3+4+3)/(5*5) = 15/25 = 0.6.
+        ratings divided by 4. For example, ratings [2, 3, 3, 4, 3] would yield
+        (2+3+3+4+3)/(5*4) = 15/20 = 0.75. If no rating is valid, 0 for 'not novel'
+        and 1 for 'novel'.
     """
-    tasks = [
-        client.run(
-            NoveltyResult,
-            BEST_OF_SYSTEM_PROMPT,
-            BEST_OF_USER_TEMPLATE.format(
-                rationale=output.rationale,
-                label_text="not novel" if output.label == 0 else "novel",
-            ),
-            temperature=1,
-            seed=_RNG.randint(1, 100),
-        )
-        for _ in range(n)
-    ]
-    task_results = await asyncio.gather(*tasks)
-    valid_results = gpt_sequence(r for r in task_results if gpt_is_valid(r))
-    return valid_results.map(
-        lambda results: sum(clamp(r.rating, 1, 4) for r in results) / (4 * len(results))
+    user_prompt = BEST_OF_USER_TEMPLATE.format(
+        rationale=output.rationale,
+        label_text="not novel" if output.label == 0 else "novel",
     )
+
+    match mode:
+        case BestOfNMode.CALLS:
+            tasks = [
+                client.run(
+                    NoveltyResult,
+                    BEST_OF_SYSTEM_PROMPT,
+                    user_prompt,
+                    temperature=1,
+                    seed=_RNG.randint(1, 100),
+                )
+                for _ in range(n)
+            ]
+            task_results = await asyncio.gather(*tasks)
+            ratings = gpt_sequence(r for r in task_results if gpt_is_valid(r)).map(
+                lambda results: [r.rating for r in results]
+            )
+        case BestOfNMode.N:
+            ratings = (
+                await client.run_n(
+                    NoveltyResult,
+                    BEST_OF_SYSTEM_PROMPT,
+                    user_prompt,
+                    n,
+                    temperature=1,
+                    seed=_RNG.randint(1, 100),
+                )
+            ).map(lambda results: [r.rating for r in results])
+        case BestOfNMode.LOGPROBS:
+            probs = await client.choice_probabilities(
+                BEST_OF_SYSTEM_PROMPT,
+                user_prompt + BEST_OF_LOGPROBS_SUFFIX,
+                _RATINGS,
+                temperature=1,
+            )
+            return probs.map(
+                lambda p: _label_probability(output)
+                if p is None
+                else sum(int(rating) * prob for rating, prob in p.items()) / 4
+            )
+
+    return ratings.map(
+        lambda rs: sum(clamp(r, 1, 4) for r in rs) / (4 * len(rs))
+        if rs
+        else _label_probability(output)
+    )
+
+
+def _label_probability(output: GPTStructuredRaw) -> float:
+    """Probability from the label alone, when there are no valid ratings."""
+    logger.warning("No valid novelty ratings. Using the label.")
+    return 0.0 if output.label == 0 else 1.0
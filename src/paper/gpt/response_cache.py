@@ -0,0 +1,274 @@
+"""Persistent store for LLM responses, so identical requests are only paid for once.
+
+Responses are keyed by the SHA-256 of the request: model, prompts, response schema,
+sampling parameters and client settings that affect the output. The store is a single
+SQLite file, which is safe to share between sequential runs of different commands.
+
+`run_gpt.LLMClient` uses this transparently when given a cache, or when the `LLM_CACHE`
+environment variable points to a file. Other settings from the environment:
+
+- `LLM_CACHE_READ_ONLY`: if 1, responses are read from the cache, but new ones aren't
+  stored. Useful to replay a previous run without changing the cache.
+- `LLM_CACHE_MAX_MB`: maximum size of the stored responses in megabytes. Defaults to
+  `DEFAULT_MAX_BYTES`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Self
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENV_VAR = "LLM_CACHE"
+"""Environment variable with the path to the default response cache file."""
+READ_ONLY_ENV_VAR = "LLM_CACHE_READ_ONLY"
+"""Environment variable that makes the default cache read-only when set to 1."""
+MAX_MB_ENV_VAR = "LLM_CACHE_MAX_MB"
+"""Environment variable with the maximum size of the default cache in megabytes."""
+DEFAULT_MAX_ENTRIES = 1_000_000
+"""Default maximum number of responses kept in the cache before eviction."""
+DEFAULT_MAX_BYTES = 2 * 1024**3
+"""Default maximum total size of the stored responses before eviction."""
+
+
+@dataclass(kw_only=True)
+class ResponseCacheStats:
+    """Hit and miss counters for a response cache."""
+
+    hits: int = 0
+    """Number of requests answered from the cache."""
+    misses: int = 0
+    """Number of requests sent to the API."""
+    writes: int = 0
+    """Number of responses stored."""
+    evictions: int = 0
+    """Number of entries removed to keep the cache under its size limits."""
+
+    @property
+    def total(self) -> int:
+        """Total number of lookups."""
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that were hits. 0 if there were no lookups."""
+        return self.hits / self.total if self.total else 0
+
+    def __str__(self) -> str:
+        """Display counters and hit rate."""
+        return (
+            f"LLM cache: {self.hits} hits, {self.misses} misses"
+            f" ({self.hit_rate:.1%} hit rate), {self.writes} writes,"
+            f" {self.evictions} evictions"
+        )
+
+
+@dataclass(frozen=True, kw_only=True)
+class CachedResponse:
+    """Response stored in the cache."""
+
+    content: str
+    """Response text. For structured outputs, the JSON of the parsed object."""
+    cost: float
+    """Cost of the original request."""
+
+
+class ResponseCache:
+    """On-disk LLM response store keyed by request hash.
+
+    Entries are evicted least-recently-used first once the number of stored responses
+    goes over `max_entries` or their total size goes over `max_bytes`. Both are counted
+    when the cache is opened and kept up to date by `put`, so writes don't scan the
+    table.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        read_only: bool = False,
+    ) -> None:
+        """Open (or create) the cache stored in `path`.
+
+        Args:
+            path: SQLite file where the responses are stored. Parent directories are
+                created if needed.
+            max_entries: Maximum number of responses to keep. When exceeded, the least
+                recently used entries are deleted.
+            max_bytes: Maximum total size of the stored responses. When exceeded, the
+                least recently used entries are deleted.
+            read_only: If True, `get` doesn't update access times and `put` does
+                nothing. The file must already exist.
+
+        Raises:
+            ValueError: if `max_entries` or `max_bytes` isn't positive.
+            FileNotFoundError: if `read_only` is True and `path` doesn't exist.
+        """
+        if max_entries <= 0:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+        if max_bytes <= 0:
+            raise ValueError(f"max_bytes must be positive, got {max_bytes}")
+
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.stats = ResponseCacheStats()
+        self._lock = threading.Lock()
+
+        if read_only:
+            if not path.exists():
+                raise FileNotFoundError(f"LLM cache file not found: {path}")
+            self._conn = sqlite3.connect(
+                f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False
+            )
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                cost REAL NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+        )
+        self._conn.commit()
+
+        # Number and total size of the stored responses, for eviction.
+        self._count, self._total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+    @classmethod
+    def from_env(cls) -> Self | None:
+        """Open the cache from the path in `LLM_CACHE`, if it's set.
+
+        Also uses `LLM_CACHE_READ_ONLY` and `LLM_CACHE_MAX_MB`. See the module
+        documentation.
+        """
+        path = os.getenv(CACHE_ENV_VAR)
+        if not path:
+            return None
+
+        max_bytes = DEFAULT_MAX_BYTES
+        if max_mb := os.getenv(MAX_MB_ENV_VAR):
+            max_bytes = int(float(max_mb) * 1024**2)
+
+        return cls(
+            Path(path),
+            max_bytes=max_bytes,
+            read_only=os.getenv(READ_ONLY_ENV_VAR, "0") == "1",
+        )
+
+    @staticmethod
+    def key(request: Mapping[str, Any]) -> str:
+        """Content key for a request: SHA-256 of its canonical JSON.
+
+        `request` must be JSON-serialisable. The key doesn't depend on the order of its
+        fields.
+        """
+        canonical = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Retrieve the response stored under `key`. Counts the lookup as hit or miss.
+
+        Unless the cache is read-only, the entry's access time is updated for eviction.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, cost FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            self.stats.hits += 1
+            if not self.read_only:
+                self._conn.execute(
+                    "UPDATE responses SET accessed = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+                self._conn.commit()
+
+        content, cost = row
+        return CachedResponse(content=content, cost=cost)
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        """Store `response` under `key`, then evict entries if over the size limits.
+
+        Does nothing if the cache is read-only.
+        """
+        if self.read_only:
+            return
+
+        size = len(response.content.encode())
+        with self._lock:
+            if old := self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone():
+                self._count -= 1
+                self._total_bytes -= old[0]
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, cost, size, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, response.content, response.cost, size, time.time()),
+            )
+            self._count += 1
+            self._total_bytes += size
+            self.stats.writes += 1
+            self._evict()
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        """Number of stored responses."""
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return count
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        """Delete least recently used entries over the limits. Expects the lock held."""
+        if self._count <= self.max_entries and self._total_bytes <= self.max_bytes:
+            return
+
+        evicted: list[tuple[str]] = []
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed")
+        for key, size in rows:
+            if self._count <= self.max_entries and self._total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self._count -= 1
+            self._total_bytes -= size
+
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.stats.evictions += len(evicted)
+        logger.debug("Evicted %d entries from LLM cache.", len(evicted))
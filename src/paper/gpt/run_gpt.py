@@ -3,13 +3,17 @@
 from __future__ import annotations
 
 import asyncio
+import dataclasses
+import json
 import logging
+import math
 import os
 from abc import ABC, abstractmethod
 from collections.abc import Awaitable, Callable, Iterable, Mapping, Sequence
 from dataclasses import dataclass
 from pathlib import Path
 from typing import (
+    TYPE_CHECKING,
     Any,
     ClassVar,
     Literal,
@@ -25,16 +29,27 @@ import openai
 import tiktoken
 from google import genai  # type: ignore
 from google.genai import errors, types  # type: ignore
-from openai import NOT_GIVEN, AsyncAzureOpenAI, AsyncOpenAI
+from openai import NOT_GIVEN, AsyncAzureOpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
 from openai.types.chat import ChatCompletion
-from pydantic import BaseModel
-
+from pydantic import BaseModel, ValidationError
+
+from paper.gpt.batch import (
+    BATCH_DISCOUNT,
+    DEFAULT_POLL_INTERVAL,
+    BatchJob,
+    BatchRequest,
+    request_line,
+)
 from paper.gpt.model import PromptResult
+from paper.gpt.response_cache import CachedResponse, ResponseCache
 from paper.types import Identifiable
 from paper.util import ensure_envvar, log_memory_usage, mustenv
 from paper.util.rate_limiter import ChatRateLimiter
 from paper.util.serde import Compress, load_data_jsonl, save_data_jsonl
 
+if TYPE_CHECKING:
+    import httpx
+
 logger = logging.getLogger(__name__)
 
 MODEL_SYNONYMS: Mapping[str, str] = {
@@ -78,6 +93,8 @@ MODELS_ALLOWED_AZURE = {"gpt-4o", "gpt-4o-mini"}
 """All allowed model names from the Azure API."""
 AZURE_TIER = 10
 """Separate tier for Azure API."""
+TOP_LOGPROBS = 20
+"""Number of top token candidates requested for `LLMClient.choice_probabilities`."""
 
 
 def _calc_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
@@ -388,6 +405,7 @@ class LLMClient(ABC):
         timeout: float = 60,
         max_input_tokens: int | None = 90_000,
         log_exception: bool | None = None,
+        cache: ResponseCache | None = None,
     ) -> None:
         """Initialize common LLM client attributes.
 
@@ -399,6 +417,8 @@ class LLMClient(ABC):
             timeout: Timeout in seconds for the API calls.
             max_input_tokens: Maximum number of tokens allowed in the input.
             log_exception: If True, log full traceback for non-API exceptions.
+            cache: Response cache to use. If None, uses `ResponseCache.from_env`, which
+                is only enabled if the `LLM_CACHE` environment variable is set.
         """
         self.api_key = api_key
         self.model = MODEL_SYNONYMS.get(model, model)
@@ -406,6 +426,7 @@ class LLMClient(ABC):
         self.temperature = temperature
         self.timeout = timeout
         self.max_input_tokens = max_input_tokens
+        self.cache = cache if cache is not None else ResponseCache.from_env()
 
         if log_exception is not None:
             self.should_log_exception = log_exception
@@ -520,7 +541,6 @@ class LLMClient(ABC):
         """Create new client from environment variables."""
         ...
 
-    @abstractmethod
     async def run[T: BaseModel](
         self,
         class_: type[T],
@@ -530,9 +550,42 @@ class LLMClient(ABC):
         temperature: float | None = None,
         seed: int | None = None,
     ) -> GPTResult[T | None]:
-        """Run the query and return a parsed object of `class_`."""
+        """Run the query and return a parsed object of `class_`.
+
+        If the client has a response cache, identical earlier requests are answered from
+        it with cost 0. See `_run` for the implementation of the API call.
+        """
+        if self.cache is None:
+            return await self._run(
+                class_, system_prompt, user_prompt, max_tokens, temperature, seed
+            )
+
+        key = self._cache_key(
+            system_prompt,
+            user_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            seed=seed,
+            schema=class_.model_json_schema(),
+        )
+        if cached := await asyncio.to_thread(self.cache.get, key):
+            try:
+                return GPTResult(
+                    result=class_.model_validate_json(cached.content), cost=0
+                )
+            except ValidationError:
+                logger.warning("Invalid cached response for %s. Ignoring.", class_)
+
+        result = await self._run(
+            class_, system_prompt, user_prompt, max_tokens, temperature, seed
+        )
+        if result.result is not None:
+            response = CachedResponse(
+                content=result.result.model_dump_json(), cost=result.cost
+            )
+            await asyncio.to_thread(self.cache.put, key, response)
+        return result
 
-    @abstractmethod
     async def plain(
         self,
         system_prompt: str,
@@ -542,7 +595,344 @@ class LLMClient(ABC):
         temperature: float | None = None,
         seed: int | None = None,
     ) -> GPTResult[str | None]:
-        """Run the GPT query and return plain text output."""
+        """Run the query and return plain text output.
+
+        If the client has a response cache, identical earlier requests are answered from
+        it with cost 0. See `_plain` for the implementation of the API call.
+        """
+        if self.cache is None:
+            return await self._plain(
+                system_prompt, user_prompt, max_tokens, search_level, temperature, seed
+            )
+
+        key = self._cache_key(
+            system_prompt,
+            user_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            seed=seed,
+            search_level=search_level,
+        )
+        if cached := await asyncio.to_thread(self.cache.get, key):
+            return GPTResult(result=cached.content, cost=0)
+
+        result = await self._plain(
+            system_prompt, user_prompt, max_tokens, search_level, temperature, seed
+        )
+        if result.result is not None:
+            response = CachedResponse(content=result.result, cost=result.cost)
+            await asyncio.to_thread(self.cache.put, key, response)
+        return result
+
+    async def run_n[T: BaseModel](
+        self,
+        class_: type[T],
+        system_prompt: str,
+        user_prompt: str,
+        n: int,
+        *,
+        temperature: float | None = None,
+        seed: int | None = None,
+    ) -> GPTResult[list[T]]:
+        """Sample `n` outputs of `class_` for the same prompts.
+
+        Clients whose API can return many choices for one request (see `_run_n`) pay
+        for the input once. Otherwise, this makes `n` requests.
+
+        If the client has a response cache, the outputs of identical earlier requests
+        are answered from it with cost 0.
+
+        Returns:
+            The valid outputs, which can be fewer than `n` if some of them failed.
+        """
+        key = self._cache_key(
+            system_prompt,
+            user_prompt,
+            temperature=temperature,
+            seed=seed,
+            schema=class_.model_json_schema(),
+            n=n,
+        )
+        if self.cache is not None and (
+            cached := await asyncio.to_thread(self.cache.get, key)
+        ):
+            try:
+                return GPTResult(
+                    result=[
+                        class_.model_validate(item)
+                        for item in json.loads(cached.content)
+                    ],
+                    cost=0,
+                )
+            except ValidationError:
+                logger.warning("Invalid cached response for %s. Ignoring.", class_)
+
+        result = await self._run_n(
+            class_, system_prompt, user_prompt, n, temperature, seed
+        )
+        if self.cache is not None and result.result:
+            content = json.dumps([
+                item.model_dump(mode="json") for item in result.result
+            ])
+            response = CachedResponse(content=content, cost=result.cost)
+            await asyncio.to_thread(self.cache.put, key, response)
+        return result
+
+    async def choice_probabilities(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        choices: Sequence[str],
+        *,
+        temperature: float | None = None,
+    ) -> GPTResult[dict[str, float] | None]:
+        """Get the probability of each choice being the first token of the answer.
+
+        Makes a single request and reads the log probabilities of the top candidates
+        for the first output token. The prompt should ask for an answer that starts
+        with one of `choices`, e.g. a rating digit.
+
+        If the client has a response cache, identical earlier requests are answered from
+        it with cost 0.
+
+        Args:
+            system_prompt: Text for the system prompt.
+            user_prompt: Text for the user prompt.
+            choices: Possible answers. Each should be a single token, e.g. "1" or "2".
+            temperature: Temperature override for this specific request.
+
+        Returns:
+            Probability of each choice, normalised to add up to 1 over the choices.
+            Choices that aren't among the top candidates have probability 0. None if
+            the request failed or none of the choices were candidates.
+
+        Raises:
+            NotImplementedError: if the client doesn't support log probabilities.
+        """
+        key = self._cache_key(
+            system_prompt,
+            user_prompt,
+            temperature=temperature,
+            seed=None,
+            choices=list(choices),
+            logprobs=True,
+        )
+        if self.cache is not None and (
+            cached := await asyncio.to_thread(self.cache.get, key)
+        ):
+            return GPTResult(result=json.loads(cached.content), cost=0)
+
+        result = await self._choice_probabilities(
+            system_prompt, user_prompt, choices, temperature
+        )
+        if self.cache is not None and result.result is not None:
+            response = CachedResponse(
+                content=json.dumps(result.result), cost=result.cost
+            )
+            await asyncio.to_thread(self.cache.put, key, response)
+        return result
+
+    async def _run_n[T: BaseModel](
+        self,
+        class_: type[T],
+        system_prompt: str,
+        user_prompt: str,
+        n: int,
+        temperature: float | None,
+        seed: int | None,
+    ) -> GPTResult[list[T]]:
+        """Sample `n` outputs without the cache. See `run_n`.
+
+        By default, makes `n` requests with consecutive seeds. Override this if the API
+        can return many choices in a single request.
+        """
+        seed = seed if seed is not None else self.seed
+        results = await asyncio.gather(
+            *(
+                self._run(
+                    class_,
+                    system_prompt,
+                    user_prompt,
+                    temperature=temperature,
+                    seed=seed + i,
+                )
+                for i in range(n)
+            )
+        )
+        # Invalid outputs are dropped, but they were still paid for.
+        return gpt_sequence(results).map(lambda rs: [r for r in rs if r is not None])
+
+    async def _choice_probabilities(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        choices: Sequence[str],
+        temperature: float | None,
+    ) -> GPTResult[dict[str, float] | None]:
+        """Get choice probabilities without the cache. See `choice_probabilities`."""
+        raise NotImplementedError(
+            f"{type(self).__name__} doesn't support log probabilities."
+        )
+
+    async def run_batch[T: BaseModel](
+        self,
+        class_: type[T],
+        requests: Sequence[BatchRequest],
+        work_dir: Path,
+        *,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> dict[str, GPTResult[T | None]]:
+        """Run many independent requests with the provider's batch API.
+
+        The batch is cheaper and doesn't count against the rate limits, but can take
+        hours to finish. Its progress is saved in `work_dir`, so calling this again with
+        the same requests and directory resumes it. See `paper.gpt.batch`.
+
+        If the client has a response cache, requests found there aren't submitted, and
+        the batch responses are added to it.
+
+        Args:
+            class_: The class to parse the Structured Outputs. See `run`.
+            requests: Requests to run. Their custom IDs must be unique.
+            work_dir: Directory to keep the batch files and progress.
+            poll_interval: Seconds between batch status checks.
+
+        Returns:
+            Result for each request by custom ID. Failed requests have None results.
+
+        Raises:
+            NotImplementedError: if the client doesn't support batches.
+        """
+        results: dict[str, GPTResult[T | None]] = {}
+        cache = self.cache
+        if cache is None:
+            pending = list(requests)
+            batch_results = await self._run_batch(
+                class_, pending, work_dir, poll_interval
+            )
+            return results | batch_results
+
+        schema = class_.model_json_schema()
+        keys = {
+            request.custom_id: self._cache_key(
+                request.system_prompt,
+                request.user_prompt,
+                max_tokens=request.max_tokens,
+                temperature=None,
+                seed=None,
+                schema=schema,
+            )
+            for request in requests
+        }
+
+        # All lookups in a single thread call, so the event loop isn't blocked by them.
+        def get_all() -> dict[str, CachedResponse | None]:
+            return {custom_id: cache.get(key) for custom_id, key in keys.items()}
+
+        pending: list[BatchRequest] = []
+        cached_responses = await asyncio.to_thread(get_all)
+        for request in requests:
+            try:
+                if cached := cached_responses[request.custom_id]:
+                    results[request.custom_id] = GPTResult(
+                        result=class_.model_validate_json(cached.content), cost=0
+                    )
+                    continue
+            except ValidationError:
+                logger.warning("Invalid cached response for %s. Ignoring.", class_)
+            pending.append(request)
+
+        if not pending:
+            return results
+
+        logger.info("Running %d requests in a batch.", len(pending))
+        batch_results = await self._run_batch(class_, pending, work_dir, poll_interval)
+
+        new_responses = [
+            (
+                keys[custom_id],
+                CachedResponse(
+                    content=result.result.model_dump_json(), cost=result.cost
+                ),
+            )
+            for custom_id, result in batch_results.items()
+            if result.result is not None
+        ]
+
+        def put_all() -> None:
+            for key, response in new_responses:
+                cache.put(key, response)
+
+        await asyncio.to_thread(put_all)
+        return results | batch_results
+
+    async def _run_batch[T: BaseModel](
+        self,
+        class_: type[T],
+        requests: Sequence[BatchRequest],
+        work_dir: Path,
+        poll_interval: float,
+    ) -> dict[str, GPTResult[T | None]]:
+        """Submit requests to the batch API. Doesn't use the cache. See `run_batch`."""
+        raise NotImplementedError(f"{type(self).__name__} doesn't support batches.")
+
+    def log_cache_stats(self) -> None:
+        """Log the response cache counters, if the client has a cache."""
+        if self.cache is not None:
+            logger.info(self.cache.stats)
+
+    def _cache_key(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        *,
+        temperature: float | None,
+        seed: int | None,
+        **params: Any,
+    ) -> str:
+        """Response cache key for a request with the client's current settings.
+
+        The prompts are used before truncation, since truncation only depends on them
+        and `max_input_tokens`.
+        """
+        return ResponseCache.key({
+            "model": self.model,
+            "system_prompt": system_prompt,
+            "user_prompt": user_prompt,
+            "temperature": temperature if temperature is not None else self.temperature,
+            "seed": seed if seed is not None else self.seed,
+            "max_input_tokens": self.max_input_tokens,
+            **self._cache_params(),
+            **params,
+        })
+
+    def _cache_params(self) -> dict[str, Any]:
+        """Client-specific settings that change the responses, for the cache key."""
+        return {}
+
+    @abstractmethod
+    async def _run[T: BaseModel](
+        self,
+        class_: type[T],
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: int | None = None,
+        temperature: float | None = None,
+        seed: int | None = None,
+    ) -> GPTResult[T | None]:
+        """Call the API and return a parsed object of `class_`. Doesn't use the cache."""
+
+    @abstractmethod
+    async def _plain(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: int | None = None,
+        search_level: Literal["low", "medium", "high"] | None = None,
+        temperature: float | None = None,
+        seed: int | None = None,
+    ) -> GPTResult[str | None]:
+        """Call the API and return plain text output. Doesn't use the cache."""
 
 
 class OpenAIClient(LLMClient):
@@ -561,6 +951,7 @@ class OpenAIClient(LLMClient):
         timeout: float = 60,
         max_input_tokens: int | None = 90_000,
         log_exception: bool | None = None,
+        cache: ResponseCache | None = None,
     ) -> None:
         """Create client for OpenAI-compatible APIs.
 
@@ -581,6 +972,10 @@ class OpenAIClient(LLMClient):
             log_exception: If True, log full traceback for non-API exceptions. If False,
                 log the exception description as a warning. If None, get value from
                 the `LOG_EXCEPTION` environment variable (1 or 0), defaulting to 0.
+            cache: Response cache to use. See `LLMClient`.
+
+        The rate limiter starts with the limits for the API tier, then adapts to the
+        rate limit headers in the chat responses. See `ChatRateLimiter.observe`.
         """
         # Initialize common attributes first
         super().__init__(
@@ -591,6 +986,7 @@ class OpenAIClient(LLMClient):
             timeout=timeout,
             max_input_tokens=max_input_tokens,
             log_exception=log_exception,
+            cache=cache,
         )
 
         self.base_url = base_url
@@ -618,9 +1014,12 @@ class OpenAIClient(LLMClient):
                 azure_endpoint=base_url,
                 api_version="2024-12-01-preview",
                 api_key=api_key,
+                http_client=self._http_client(),
             )
         else:
-            self.client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+            self.client = AsyncOpenAI(
+                api_key=api_key, base_url=base_url, http_client=self._http_client()
+            )
 
         # Determine API tier and create rate limiter
         if is_azure:
@@ -685,7 +1084,7 @@ class OpenAIClient(LLMClient):
         )
 
     @override
-    async def run[T: BaseModel](
+    async def _run[T: BaseModel](
         self,
         class_: type[T],
         system_prompt: str,
@@ -751,7 +1150,7 @@ class OpenAIClient(LLMClient):
         return GPTResult(result=choice.message.parsed, cost=cost)
 
     @override
-    async def plain(
+    async def _plain(
         self,
         system_prompt: str,
         user_prompt: str,
@@ -826,6 +1225,150 @@ class OpenAIClient(LLMClient):
 
         return GPTResult(result=content, cost=cost)
 
+    @override
+    def _cache_params(self) -> dict[str, Any]:
+        return {"base_url": self.base_url}
+
+    @override
+    async def _run_n[T: BaseModel](
+        self,
+        class_: type[T],
+        system_prompt: str,
+        user_prompt: str,
+        n: int,
+        temperature: float | None,
+        seed: int | None,
+    ) -> GPTResult[list[T]]:
+        """Sample `n` outputs in a single request with the `n` parameter."""
+        try:
+            system_prompt, user_prompt = await self._prepare_prompts(
+                system_prompt, user_prompt
+            )
+            completion = await self._call_gpt(
+                model=self.model,
+                messages=prompts_to_messages(system_prompt, user_prompt),
+                response_format=class_,
+                seed=seed if seed is not None else self.seed,
+                temperature=temperature
+                if temperature is not None
+                else self.temperature,
+                n=n,
+            )
+        except Exception:
+            logger.exception("Error when calling OpenAI. Gave up on retrying")
+            completion = None
+
+        if completion is None:
+            return GPTResult(result=[], cost=0)
+
+        if usage := completion.usage:
+            cost = _calc_cost(self.model, usage.prompt_tokens, usage.completion_tokens)
+        else:
+            cost = 0
+
+        results = [
+            parsed for choice in completion.choices if (parsed := choice.message.parsed)
+        ]
+        return GPTResult(result=results, cost=cost)
+
+    @override
+    async def _choice_probabilities(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        choices: Sequence[str],
+        temperature: float | None,
+    ) -> GPTResult[dict[str, float] | None]:
+        """Get choice probabilities from `top_logprobs` of a one-token completion."""
+        try:
+            system_prompt, user_prompt = await self._prepare_prompts(
+                system_prompt, user_prompt
+            )
+            completion = await self._call_gpt_plain(
+                model=self.model,
+                messages=prompts_to_messages(system_prompt, user_prompt),
+                seed=self.seed,
+                temperature=temperature
+                if temperature is not None
+                else self.temperature,
+                max_tokens=1,
+                logprobs=True,
+                top_logprobs=TOP_LOGPROBS,
+            )
+        except Exception:
+            logger.exception("Error when calling OpenAI. Gave up on retrying")
+            return GPTResult(result=None, cost=0)
+
+        if completion is None:
+            return GPTResult(result=None, cost=0)
+
+        if usage := completion.usage:
+            cost = _calc_cost(self.model, usage.prompt_tokens, usage.completion_tokens)
+        else:
+            cost = 0
+
+        logprobs = completion.choices[0].logprobs
+        if logprobs is None or not logprobs.content:
+            logger.warning("Response has no log probabilities.")
+            return GPTResult(result=None, cost=cost)
+
+        candidates = [(c.token, c.logprob) for c in logprobs.content[0].top_logprobs]
+        return GPTResult(result=_choice_distribution(candidates, choices), cost=cost)
+
+    def _http_client(self) -> DefaultAsyncHttpxClient:
+        """HTTP client that shows the chat responses to the rate limiter."""
+        return DefaultAsyncHttpxClient(
+            event_hooks={"response": [self._observe_rate_limits]}
+        )
+
+    async def _observe_rate_limits(self, response: httpx.Response) -> None:
+        # Includes the responses to the SDK's own retries, e.g. after a 429.
+        if response.url.path.endswith("/chat/completions"):
+            self.rate_limiter.observe(response.status_code, response.headers)
+
+    @override
+    async def _run_batch[T: BaseModel](
+        self,
+        class_: type[T],
+        requests: Sequence[BatchRequest],
+        work_dir: Path,
+        poll_interval: float,
+    ) -> dict[str, GPTResult[T | None]]:
+        """Run requests with the OpenAI Batch API. Costs have the batch discount."""
+
+        async def prepare(request: BatchRequest) -> dict[str, Any]:
+            system_prompt, user_prompt = await self._prepare_prompts(
+                request.system_prompt, request.user_prompt
+            )
+            return request_line(
+                dataclasses.replace(
+                    request, system_prompt=system_prompt, user_prompt=user_prompt
+                ),
+                model=self.model,
+                class_=class_,
+                seed=self.seed,
+                temperature=self.temperature,
+            )
+
+        lines = await asyncio.gather(*(prepare(request) for request in requests))
+        job = BatchJob(self.client, work_dir, poll_interval=poll_interval)
+        responses = await job.run(lines)
+
+        results: dict[str, GPTResult[T | None]] = {}
+        for custom_id, response in responses.items():
+            cost = BATCH_DISCOUNT * _calc_cost(
+                self.model, response.prompt_tokens, response.completion_tokens
+            )
+            parsed = None
+            if response.content is not None:
+                try:
+                    parsed = class_.model_validate_json(response.content)
+                except ValidationError:
+                    logger.warning("Invalid response for batch request %s", custom_id)
+            results[custom_id] = GPTResult(result=parsed, cost=cost)
+
+        return results
+
     @backoff.on_exception(
         backoff.expo,
         (openai.APIError, asyncio.TimeoutError),
@@ -910,6 +1453,7 @@ class GeminiClient(LLMClient):
         log_exception: bool | None = None,
         thinking_budget: int | None = None,
         include_thoughts: bool | None = None,
+        cache: ResponseCache | None = None,
     ) -> None:
         """Create client for the Google Gemini API.
 
@@ -931,6 +1475,7 @@ class GeminiClient(LLMClient):
                 must be between 0 and 24576.
             include_thoughts: Whether to include thoughts in the response. If unset,
                 uses the model default.
+            cache: Response cache to use. See `LLMClient`.
 
         `thinking_budget` and `include_thoughts` are NOT ignored if the model does not
         support thinking. Attempting to set them with non-thinking model will result in
@@ -948,6 +1493,7 @@ class GeminiClient(LLMClient):
             timeout=timeout,
             max_input_tokens=max_input_tokens,
             log_exception=log_exception,
+            cache=cache,
         )
 
         if self.model not in MODELS_ALLOWED:
@@ -1035,7 +1581,7 @@ class GeminiClient(LLMClient):
         )
 
     @override
-    async def run[T: BaseModel](
+    async def _run[T: BaseModel](
         self,
         class_: type[T],
         system_prompt: str,
@@ -1106,7 +1652,7 @@ class GeminiClient(LLMClient):
         return GPTResult(result=parsed, cost=cost)
 
     @override
-    async def plain(
+    async def _plain(
         self,
         system_prompt: str,
         user_prompt: str,
@@ -1179,6 +1725,128 @@ class GeminiClient(LLMClient):
 
         return GPTResult(result=content, cost=cost)
 
+    @override
+    async def _run_n[T: BaseModel](
+        self,
+        class_: type[T],
+        system_prompt: str,
+        user_prompt: str,
+        n: int,
+        temperature: float | None,
+        seed: int | None,
+    ) -> GPTResult[list[T]]:
+        """Sample `n` outputs in a single request with `candidate_count`."""
+        system_prompt, user_prompt = await self._prepare_prompts(
+            system_prompt, user_prompt
+        )
+        try:
+            completion = await self._call_api(
+                model=self.model,
+                contents=user_prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=class_,
+                    system_instruction=system_prompt,
+                    temperature=temperature
+                    if temperature is not None
+                    else self.temperature,
+                    seed=seed if seed is not None else self.seed,
+                    candidate_count=n,
+                    thinking_config=self._thinking_config(),
+                ),
+            )
+        except Exception:
+            logger.exception("Error when calling the API. Gave up on retrying")
+            completion = None
+
+        if completion is None:
+            return GPTResult(result=[], cost=0)
+
+        if usage := completion.usage_metadata:
+            cost = _calc_cost(
+                self.model,
+                usage.prompt_token_count or 0,
+                usage.candidates_token_count or 0,
+            )
+        else:
+            cost = 0
+
+        results: list[T] = []
+        for candidate in completion.candidates or []:
+            if not (content := candidate.content) or not content.parts:
+                continue
+            text = "".join(p.text for p in content.parts if p.text and not p.thought)
+            try:
+                results.append(class_.model_validate_json(text))
+            except ValidationError:
+                logger.debug("Invalid structured output candidate.")
+
+        return GPTResult(result=results, cost=cost)
+
+    @override
+    async def _choice_probabilities(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        choices: Sequence[str],
+        temperature: float | None,
+    ) -> GPTResult[dict[str, float] | None]:
+        """Get choice probabilities from the top candidates of the first token."""
+        system_prompt, user_prompt = await self._prepare_prompts(
+            system_prompt, user_prompt
+        )
+        try:
+            completion = await self._call_api(
+                model=self.model,
+                contents=user_prompt,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_prompt,
+                    seed=self.seed,
+                    temperature=temperature
+                    if temperature is not None
+                    else self.temperature,
+                    response_logprobs=True,
+                    logprobs=TOP_LOGPROBS,
+                    thinking_config=self._thinking_config(),
+                ),
+            )
+        except Exception:
+            logger.exception("Error when calling the API. Gave up on retrying")
+            return GPTResult(result=None, cost=0)
+
+        if completion is None:
+            return GPTResult(result=None, cost=0)
+
+        if usage := completion.usage_metadata:
+            cost = _calc_cost(
+                self.model,
+                usage.prompt_token_count or 0,
+                usage.candidates_token_count or 0,
+            )
+        else:
+            cost = 0
+
+        if (
+            not (candidates := completion.candidates)
+            or not (logprobs := candidates[0].logprobs_result)
+            or not logprobs.top_candidates
+        ):
+            logger.warning("Response has no log probabilities.")
+            return GPTResult(result=None, cost=cost)
+
+        top = [
+            (c.token or "", c.log_probability or -math.inf)
+            for c in logprobs.top_candidates[0].candidates or []
+        ]
+        return GPTResult(result=_choice_distribution(top, choices), cost=cost)
+
+    @override
+    def _cache_params(self) -> dict[str, Any]:
+        return {
+            "thinking_budget": self.thinking_budget,
+            "include_thoughts": self.include_thoughts,
+        }
+
     def _thinking_config(self) -> types.ThinkingConfig | None:
         """Create config if both `thinking_budget` and `include_thoughts` are set."""
         if self.thinking_budget is not None or self.include_thoughts is not None:
@@ -1227,6 +1895,26 @@ class GeminiClient(LLMClient):
             return None
 
 
+def _choice_distribution(
+    candidates: Iterable[tuple[str, float]], choices: Sequence[str]
+) -> dict[str, float] | None:
+    """Probability of each choice from (token, log probability) candidates.
+
+    Tokens are compared with the choices without surrounding whitespace. Probabilities
+    are normalised over the choices. Returns None if no candidate is a choice.
+    """
+    probs = dict.fromkeys(choices, 0.0)
+    for token, logprob in candidates:
+        if (token := token.strip()) in probs:
+            probs[token] += math.exp(logprob)
+
+    total = sum(probs.values())
+    if total == 0:
+        logger.warning("None of the choices are among the top tokens.")
+        return None
+    return {choice: prob / total for choice, prob in probs.items()}
+
+
 def _gemini_content(completion: types.GenerateContentResponse) -> str:
     """Get full content text from Gemini completion."""
     if (
@@ -0,0 +1,264 @@
+"""Client for the graph query server in `graph_server`.
+
+Loading a PETER or SciMON graph and its encoder takes a long time, which commands that
+query the graph pay on every run. When the server is running and its URL is in the
+`GRAPH_SERVER_URL` environment variable, `load_peter` and `connect_scimon` return
+clients that send the queries to the server instead.
+
+The clients have the same batched query methods as the graphs, so commands can use
+either transparently.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Literal, Self
+
+import httpx
+from pydantic import TypeAdapter
+
+from paper import gpt
+from paper import related_papers as rp
+from paper.baselines.scimon import graph as scimon
+from paper.peter import graph as peter
+from paper.types import Immutable
+
+logger = logging.getLogger(__name__)
+
+SERVER_ENV_VAR = "GRAPH_SERVER_URL"
+"""Environment variable with the URL of the running graph server."""
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+_PETER_RESULTS = TypeAdapter(list[rp.QueryResult])
+_SCIMON_RESULTS = TypeAdapter(list[scimon.QueryResult])
+
+
+class ServerInfo(Immutable):
+    """Graphs loaded by the server."""
+
+    peter_dir: str | None
+    """Resolved path of the PETER graph directory, if loaded."""
+    peter_version: int | None = None
+    """Version of the loaded PETER graph from its metadata file. See
+    `peter.Graph.version`."""
+    scimon_dir: str | None
+    """Resolved path of the SciMON graph directory, if loaded."""
+
+
+class PeterPaper(Immutable):
+    """Fields of a paper used to query the PETER graph. See `peter.QueryPaper`."""
+
+    id: str
+    background: str
+    target: str
+
+
+class PeterQueryRequest(Immutable):
+    """Request for `peter.Graph.query_many`."""
+
+    papers: Sequence[PeterPaper]
+    semantic_k: int
+    citation_k: int
+
+
+class PeterThresholdRequest(Immutable):
+    """Request for `peter.Graph.query_threshold_many`."""
+
+    papers: Sequence[PeterPaper]
+    semantic_threshold: float
+    citation_threshold: float
+    retrieved_k: int
+
+
+class ScimonQueryRequest(Immutable):
+    """Request for `scimon.Graph.query_many`."""
+
+    anns: Sequence[gpt.PeerReadAnnotated]
+    use_kg: bool
+    k: int
+
+
+class GraphClient:
+    """Synchronous HTTP client for the graph server."""
+
+    def __init__(self, url: str, *, http: httpx.Client | None = None) -> None:
+        """Create client for the server at `url`.
+
+        Args:
+            url: Base URL of the server, e.g. `http://127.0.0.1:8765`.
+            http: HTTP client to use. If None, creates one without a timeout, since
+                large batches can take a while.
+        """
+        self.url = url
+        self._http = http or httpx.Client(base_url=url, timeout=None)
+
+    @classmethod
+    def from_env(cls) -> Self | None:
+        """Create client for the server in `GRAPH_SERVER_URL`, if it's set."""
+        if url := os.getenv(SERVER_ENV_VAR):
+            return cls(url)
+        return None
+
+    def info(self) -> ServerInfo:
+        """Get the graphs loaded by the server.
+
+        Raises:
+            httpx.HTTPError: if the server can't be reached or returns an error.
+        """
+        response = self._http.get("/health")
+        response.raise_for_status()
+        return ServerInfo.model_validate_json(response.content)
+
+    def close(self) -> None:
+        """Close the underlying HTTP connection."""
+        self._http.close()
+
+    def post(self, path: str, request: Immutable) -> bytes:
+        """Send `request` as JSON to `path` and return the response body.
+
+        Raises:
+            httpx.HTTPError: if the server can't be reached or returns an error.
+        """
+        response = self._http.post(
+            path,
+            content=request.model_dump_json(),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+        return response.content
+
+
+class PeterClient:
+    """Queries the PETER graph in the server. Same query methods as `peter.Graph`."""
+
+    def __init__(self, client: GraphClient) -> None:
+        self._client = client
+
+    def query_many(
+        self,
+        papers: Sequence[peter.QueryPaper],
+        *,
+        semantic_k: int = peter.Graph.SEMANTIC_TOP_K,
+        citation_k: int = peter.Graph.CITATION_TOP_K,
+    ) -> list[rp.QueryResult]:
+        """Find related papers for many papers at once. See `peter.Graph.query_many`."""
+        request = PeterQueryRequest(
+            papers=_peter_papers(papers), semantic_k=semantic_k, citation_k=citation_k
+        )
+        return _PETER_RESULTS.validate_json(self._client.post("/peter/query", request))
+
+    def query_threshold_many(
+        self,
+        papers: Sequence[peter.QueryPaper],
+        semantic_threshold: float,
+        citation_threshold: float,
+        retrieved_k: int,
+    ) -> list[rp.QueryResult]:
+        """Find related papers above thresholds. See `peter.Graph.query_threshold_many`."""
+        request = PeterThresholdRequest(
+            papers=_peter_papers(papers),
+            semantic_threshold=semantic_threshold,
+            citation_threshold=citation_threshold,
+            retrieved_k=retrieved_k,
+        )
+        return _PETER_RESULTS.validate_json(
+            self._client.post("/peter/query-threshold", request)
+        )
+
+
+class ScimonClient:
+    """Queries the SciMON graph in the server."""
+
+    def __init__(self, client: GraphClient) -> None:
+        self._client = client
+
+    def query_many(
+        self,
+        anns: Sequence[gpt.PeerReadAnnotated],
+        use_kg: bool = False,
+        k: int = scimon.Graph.CITATION_DEFAULT_K,
+    ) -> list[scimon.QueryResult]:
+        """Retrieve terms for many papers. See `scimon.Graph.query_many`."""
+        request = ScimonQueryRequest(anns=anns, use_kg=use_kg, k=k)
+        return _SCIMON_RESULTS.validate_json(
+            self._client.post("/scimon/query", request)
+        )
+
+
+def connect(graph_dir: Path, kind: Literal["peter", "scimon"]) -> GraphClient | None:
+    """Get client for the server in `GRAPH_SERVER_URL` if it serves `graph_dir`.
+
+    Args:
+        graph_dir: Graph directory the command wants to query.
+        kind: Which graph `graph_dir` is: "peter" or "scimon".
+
+    Returns:
+        The client if the server is reachable and has `graph_dir` loaded as `kind`.
+        For PETER graphs, the server's graph must also have the same version as the
+        one in `graph_dir`, so graphs changed by `paper peter update` after the server
+        started aren't used. None otherwise, in which case the caller should load the
+        graph itself.
+    """
+    client = GraphClient.from_env()
+    if client is None:
+        return None
+
+    try:
+        info = client.info()
+    except httpx.HTTPError as e:
+        logger.warning("Graph server at %s is unavailable: %s", client.url, e)
+        client.close()
+        return None
+
+    served = info.peter_dir if kind == "peter" else info.scimon_dir
+    if served != str(graph_dir.resolve()):
+        logger.warning(
+            "Graph server at %s serves %s graph '%s', not '%s'.",
+            client.url,
+            kind,
+            served,
+            graph_dir,
+        )
+        client.close()
+        return None
+
+    if kind == "peter" and info.peter_version != (
+        version := peter.Graph.version(graph_dir)
+    ):
+        logger.warning(
+            "Graph server at %s serves version %s of PETER graph '%s', but the"
+            " directory has version %d. Restart the server to use the updated graph.",
+            client.url,
+            info.peter_version,
+            graph_dir,
+            version,
+        )
+        client.close()
+        return None
+
+    logger.info("Using %s graph from server at %s.", kind, client.url)
+    return client
+
+
+def load_peter(graph_dir: Path) -> peter.Graph | PeterClient:
+    """Get PETER graph from the server if it's running, or load it from `graph_dir`."""
+    if client := connect(graph_dir, "peter"):
+        return PeterClient(client)
+    return peter.Graph.load(graph_dir)
+
+
+def connect_scimon(graph_dir: Path) -> ScimonClient | None:
+    """Get client for the SciMON graph in the server, if it serves `graph_dir`."""
+    if client := connect(graph_dir, "scimon"):
+        return ScimonClient(client)
+    return None
+
+
+def _peter_papers(papers: Sequence[peter.QueryPaper]) -> list[PeterPaper]:
+    return [
+        PeterPaper(id=p.id, background=p.background, target=p.target) for p in papers
+    ]
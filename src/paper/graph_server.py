@@ -0,0 +1,168 @@
+"""Local server that keeps PETER and SciMON graphs loaded to answer queries.
+
+Loading a graph and its encoder model takes tens of seconds, which every command that
+queries the graph pays before doing any work. This server loads the graphs once and
+serves batched queries over HTTP on localhost.
+
+Start it with `paper graph-server --peter DIR --scimon DIR`, then set the
+`GRAPH_SERVER_URL` environment variable to its URL (e.g. `http://127.0.0.1:8765`).
+Commands that support it (e.g. `paper peter peerread`, `paper baselines scimon query`)
+use the server when it has the same graph directory loaded, at the same version for
+PETER graphs, and load the graph themselves otherwise. See `graph_client`.
+"""
+
+import logging
+import threading
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated, Self
+
+import typer
+
+from paper import related_papers as rp
+from paper.baselines.scimon.graph import Graph as ScimonGraph
+from paper.baselines.scimon.graph import QueryResult as ScimonQueryResult
+from paper.graph_client import (
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+    PeterQueryRequest,
+    PeterThresholdRequest,
+    ScimonQueryRequest,
+    ServerInfo,
+)
+from paper.peter.graph import Graph as PeterGraph
+from paper.util import Timer
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, kw_only=True)
+class LoadedGraphs:
+    """Graphs served by the server and the directories they were loaded from."""
+
+    peter: PeterGraph | None = None
+    peter_dir: Path | None = None
+    peter_version: int | None = None
+    scimon: ScimonGraph | None = None
+    scimon_dir: Path | None = None
+
+    @classmethod
+    def load(cls, peter_dir: Path | None, scimon_dir: Path | None) -> Self:
+        """Load the graphs from the given directories. None directories are skipped."""
+        peter_graph = None
+        peter_version = None
+        if peter_dir is not None:
+            # Read before loading, so a concurrent update makes the version look stale.
+            peter_version = PeterGraph.version(peter_dir)
+            with Timer("Load PETER graph") as timer:
+                peter_graph = PeterGraph.load(peter_dir)
+            logger.info(timer)
+
+        scimon_graph = None
+        if scimon_dir is not None:
+            with Timer("Load SciMON graph") as timer:
+                scimon_graph = ScimonGraph.load(scimon_dir)
+            logger.info(timer)
+
+        return cls(
+            peter=peter_graph,
+            peter_dir=peter_dir.resolve() if peter_dir else None,
+            peter_version=peter_version,
+            scimon=scimon_graph,
+            scimon_dir=scimon_dir.resolve() if scimon_dir else None,
+        )
+
+    def info(self) -> ServerInfo:
+        """Describe the loaded graphs."""
+        return ServerInfo(
+            peter_dir=str(self.peter_dir) if self.peter_dir else None,
+            peter_version=self.peter_version,
+            scimon_dir=str(self.scimon_dir) if self.scimon_dir else None,
+        )
+
+
+def create_app(graphs: LoadedGraphs) -> "FastAPI":
+    """Create the server application for already loaded `graphs`.
+
+    Queries run one at a time, since they share the encoder model. Each request can
+    contain many papers, which are queried as a batch.
+    """
+    # Imported here so commands that only use the client don't pay for it.
+    from fastapi import FastAPI, HTTPException
+
+    app = FastAPI(title="Graph query server")
+    lock = threading.Lock()
+
+    def require[T](graph: T | None, name: str) -> T:
+        if graph is None:
+            raise HTTPException(status_code=404, detail=f"No {name} graph loaded.")
+        return graph
+
+    def health() -> ServerInfo:
+        """Describe the graphs loaded by the server."""
+        return graphs.info()
+
+    def peter_query(request: PeterQueryRequest) -> Sequence[rp.QueryResult]:
+        """Query the PETER graph with `peter.Graph.query_many`."""
+        graph = require(graphs.peter, "PETER")
+        with lock:
+            return graph.query_many(
+                request.papers,
+                semantic_k=request.semantic_k,
+                citation_k=request.citation_k,
+            )
+
+    def peter_query_threshold(
+        request: PeterThresholdRequest,
+    ) -> Sequence[rp.QueryResult]:
+        """Query the PETER graph with `peter.Graph.query_threshold_many`."""
+        graph = require(graphs.peter, "PETER")
+        with lock:
+            return graph.query_threshold_many(
+                request.papers,
+                semantic_threshold=request.semantic_threshold,
+                citation_threshold=request.citation_threshold,
+                retrieved_k=request.retrieved_k,
+            )
+
+    def scimon_query(request: ScimonQueryRequest) -> Sequence[ScimonQueryResult]:
+        """Query the SciMON graph with `scimon.Graph.query_many`."""
+        graph = require(graphs.scimon, "SciMON")
+        with lock:
+            return graph.query_many(request.anns, use_kg=request.use_kg, k=request.k)
+
+    app.add_api_route("/health", health, methods=["GET"])
+    app.add_api_route("/peter/query", peter_query, methods=["POST"])
+    app.add_api_route("/peter/query-threshold", peter_query_threshold, methods=["POST"])
+    app.add_api_route("/scimon/query", scimon_query, methods=["POST"])
+    return app
+
+
+def main(
+    peter_dir: Annotated[
+        Path | None,
+        typer.Option("--peter", help="Directory with the PETER graph to serve."),
+    ] = None,
+    scimon_dir: Annotated[
+        Path | None,
+        typer.Option("--scimon", help="Directory with the SciMON graph to serve."),
+    ] = None,
+    host: Annotated[str, typer.Option(help="Address to listen on.")] = DEFAULT_HOST,
+    port: Annotated[int, typer.Option(help="Port to listen on.")] = DEFAULT_PORT,
+) -> None:
+    """Serve graph queries from graphs loaded once.
+
+    Set GRAPH_SERVER_URL=http://HOST:PORT so other commands use the server.
+    """
+    import uvicorn
+
+    if peter_dir is None and scimon_dir is None:
+        raise typer.BadParameter("Give at least one of --peter and --scimon.")
+
+    graphs = LoadedGraphs.load(peter_dir, scimon_dir)
+    logger.info("Serving on http://%s:%d", host, port)
+    uvicorn.run(create_app(graphs), host=host, port=port)
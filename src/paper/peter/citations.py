@@ -11,6 +11,7 @@ from collections import defaultdict
 from collections.abc import Iterable, Mapping, Sequence
 from typing import TYPE_CHECKING, Self
 
+import numpy as np
 from tqdm import tqdm
 
 from paper import embedding as emb
@@ -48,28 +49,51 @@ class Graph(Immutable):
         Cleans up the titles with `s2.clean_title`, then compares the PeerRead `title`
         with the S2 `title_peerread`.
 
+        The unique titles from all papers and references are encoded together in a
+        single batched pass, so titles cited by many papers are only encoded once.
+
         Args:
             encoder: Text to vector encoder to use on the nodes.
             papers: Papers to be processed into graph nodes.
             progress: If True, show a progress bar while generating node embeddings.
         """
+        papers = list(papers)
+        if not papers:
+            return cls(id_polarity_to_cited={}, title_to_id={})
+
         title_to_id: dict[str, str] = {}
         id_polarity_to_cited: dict[str, dict[ContextPolarity, list[Citation]]] = (
             defaultdict(dict)
         )
 
-        logger.debug("Processing papers.")
-        if progress:
-            papers = tqdm(papers)
+        logger.debug("Encoding titles.")
+        cleaned = [
+            (
+                _clean_title(paper.title),
+                [_clean_title(r.title_peer) for r in paper.references],
+            )
+            for paper in papers
+        ]
+        unique_titles = list(
+            dict.fromkeys(
+                title
+                for paper_title, ref_titles in cleaned
+                for title in (paper_title, *ref_titles)
+            )
+        )
+        title_index = {title: i for i, title in enumerate(unique_titles)}
+        embeddings = emb.normalize(
+            encoder.batch_encode(unique_titles, progress=progress)
+        )
 
-        for peer_paper in papers:
+        logger.debug("Processing papers.")
+        for peer_paper, (paper_title, ref_titles) in zip(
+            tqdm(papers, disable=not progress), cleaned
+        ):
             title_to_id[peer_paper.title] = peer_paper.id
-            peer_embedding = encoder.encode(_clean_title(peer_paper.title))
-
-            s2_embeddings = encoder.encode_multi([
-                _clean_title(r.title_peer) for r in peer_paper.references
-            ])
-            s2_similarities = emb.similarities(peer_embedding, s2_embeddings)
+            peer_embedding = embeddings[title_index[paper_title]]
+            s2_embeddings = embeddings[[title_index[t] for t in ref_titles]]
+            s2_similarities = np.clip(s2_embeddings @ peer_embedding, 0, 1)
 
             for polarity in ContextPolarity:
                 id_polarity_to_cited[peer_paper.id][polarity] = [
@@ -113,6 +137,20 @@ class Graph(Immutable):
 
         return cls(id_polarity_to_cited=id_polarity_to_cited, title_to_id=title_to_id)
 
+    def merge(self, other: Graph) -> Graph:
+        """Combine with the papers from `other`, which take precedence on conflicts.
+
+        Each PeerRead paper's cited list only depends on the paper itself, so merging
+        the graphs of two sets of papers is the same as building one from both.
+        """
+        return Graph(
+            title_to_id={**self.title_to_id, **other.title_to_id},
+            id_polarity_to_cited={
+                **self.id_polarity_to_cited,
+                **other.id_polarity_to_cited,
+            },
+        )
+
     def query_title(self, title: str, k: int) -> QueryResult:
         """Get top `k` cited papers by title similarity from a PeerRead paper `title`.
 
@@ -126,13 +164,13 @@ class Graph(Immutable):
         Returns `k` papers from each polarity.
         """
         if k == 0:
-            return QueryResult(positive=[], negative=[])
+            return QueryResult.model_construct(positive=[], negative=[])
 
         positive, negative = (
             self.id_polarity_to_cited[paper_id][polarity][:k]
             for polarity in (ContextPolarity.POSITIVE, ContextPolarity.NEGATIVE)
         )
-        return QueryResult(positive=positive, negative=negative)
+        return QueryResult.model_construct(positive=positive, negative=negative)
 
     def query_threshold(self, paper_id: str, threshold: float) -> QueryResult:
         """Get top `k` cited papers by title similarity from a PeerRead paper `id`.
@@ -143,7 +181,7 @@ class Graph(Immutable):
             self.id_polarity_to_cited[paper_id][polarity]
             for polarity in (ContextPolarity.POSITIVE, ContextPolarity.NEGATIVE)
         )
-        return QueryResult(
+        return QueryResult.model_construct(
             positive=[p for p in positive if p.score >= threshold],
             negative=[n for n in negative if n.score >= threshold],
         )
@@ -7,10 +7,9 @@ from pathlib import Path
 from typing import Annotated
 
 import typer
-from tqdm import tqdm
 
 from paper import embedding as emb
-from paper import gpt
+from paper import gpt, graph_client
 from paper import related_papers as rp
 from paper import semantic_scholar as s2
 from paper.peter import citations, graph, semantic
@@ -128,6 +127,18 @@ def build(
     model_name: Annotated[
         str, typer.Option("--model", help="SentenceTransformer model to use.")
     ] = emb.DEFAULT_SENTENCE_MODEL,
+    encode_workers: Annotated[
+        int,
+        typer.Option(
+            "--encode-workers",
+            help="Number of CPU processes used to encode text. Use >1 without a GPU.",
+            min=1,
+        ),
+    ] = 1,
+    matrix_dtype: Annotated[
+        emb.StorageDtype,
+        typer.Option(help="Data type of the stored embedding matrices."),
+    ] = emb.StorageDtype.FLOAT32,
 ) -> None:
     """Create PETER graph with semantic and citation graphs."""
     logger.info(display_params())
@@ -142,10 +153,66 @@ def build(
     )
 
     logger.debug("Loading encoder.")
-    encoder = emb.Encoder(model_name)
+    encoder = emb.Encoder(model_name, workers=encode_workers)
 
     logger.debug("Building graph.")
-    graph.Graph.build(encoder, papers_ann, papers_context, output_dir)
+    graph.Graph.build(
+        encoder, papers_ann, papers_context, output_dir, matrix_dtype=matrix_dtype
+    )
+    encoder.close()
+
+
+@app.command(help="Add new papers to an existing full graph.", no_args_is_help=True)
+def update(
+    graph_dir: Annotated[
+        Path,
+        typer.Option("--graph", help="Directory with the graph created by `build`."),
+    ],
+    ann_file: Annotated[
+        Path,
+        typer.Option(
+            "--ann",
+            help="File with new S2 papers with extracted backgrounds and targets.",
+        ),
+    ],
+    context_file: Annotated[
+        Path,
+        typer.Option(
+            "--context",
+            help="File with new PeerRead papers with classified contexts.",
+        ),
+    ],
+    encode_workers: Annotated[
+        int,
+        typer.Option(
+            "--encode-workers",
+            help="Number of CPU processes used to encode text. Use >1 without a GPU.",
+            min=1,
+        ),
+    ] = 1,
+) -> None:
+    """Update PETER graph in place, encoding only the new nodes.
+
+    The encoder model is the one the graph was built with.
+    """
+    logger.info(display_params())
+
+    logger.debug("Loading annotated papers.")
+    papers_ann = gpt.PromptResult.unwrap(
+        load_data(ann_file, gpt.PromptResult[gpt.PaperAnnotated])
+    )
+    logger.debug("Loading context papers.")
+    papers_context = gpt.PromptResult.unwrap(
+        load_data(context_file, gpt.PromptResult[gpt.PaperWithContextClassfied])
+    )
+
+    logger.debug("Loading encoder.")
+    encoder = emb.Encoder(graph.Graph.encoder_model(graph_dir), workers=encode_workers)
+
+    logger.debug("Updating graph.")
+    version = graph.Graph.update(encoder, graph_dir, papers_ann, papers_context)
+    encoder.close()
+    logger.info("Graph updated to version %d.", version)
 
 
 @app.command(no_args_is_help=True)
@@ -193,25 +260,24 @@ def query(
         ]
 
     logger.debug("Loading graph.")
-    main_graph = graph.Graph.load(graph_dir)
+    main_graph = graph_client.load_peter(graph_dir)
 
-    for paper in papers:
-        logger.debug("Querying graph.")
-
-        with Timer("Graph query") as timer:
-            result = main_graph.query_all(paper.id, paper.background, paper.target)
-        logger.debug(timer)
+    logger.debug("Querying graph.")
+    with Timer("Graph query") as timer:
+        query_results = main_graph.query_many(papers)
+    logger.debug(timer)
 
+    for paper, result in zip(papers, query_results):
         print(paper.title)
         print()
-        for label, papers in [
+        for label, related in [
             (">> semantic_positive", result.semantic_positive),
             (">> semantic_negative", result.semantic_negative),
             (">> citations_positive", result.citations_positive),
             (">> citations_negative", result.citations_negative),
         ]:
-            print(f"{label} ({len(papers)})")
-            for p in papers:
+            print(f"{label} ({len(related)})")
+            for p in related:
                 print(f"- {p.title}")
             print()
 
@@ -261,20 +327,18 @@ def peerread(
     )[:num_papers]
 
     logger.debug("Loading graph.")
-    main_graph = graph.Graph.load(graph_dir)
+    main_graph = graph_client.load_peter(graph_dir)
 
-    results = [
-        rp.PaperResult(
-            paper=paper,
-            results=main_graph.query_all(
-                paper.id,
-                paper.background,
-                paper.target,
-                semantic_k=num_semantic,
-                citation_k=num_citations,
-            ),
+    logger.debug("Querying graph.")
+    with Timer("Graph query") as timer:
+        query_results = main_graph.query_many(
+            papers, semantic_k=num_semantic, citation_k=num_citations
         )
-        for paper in tqdm(papers, desc="Querying PeerRead papers.")
+    logger.info(timer)
+
+    results = [
+        rp.PaperResult(paper=paper, results=result)
+        for paper, result in zip(papers, query_results)
     ]
     save_data(output_file, results)
 
@@ -330,20 +394,20 @@ def peerread_threshold(
     )[:num_papers]
 
     logger.debug("Loading graph.")
-    main_graph = graph.Graph.load(graph_dir)
+    main_graph = graph_client.load_peter(graph_dir)
+
+    logger.debug("Querying graph.")
+    with Timer("Graph query") as timer:
+        query_results = main_graph.query_threshold_many(
+            papers,
+            semantic_threshold=semantic,
+            citation_threshold=citation,
+            retrieved_k=retrieved_k,
+        )
+    logger.info(timer)
 
     results = [
-        rp.PaperResult(
-            paper=paper,
-            results=main_graph.query_threshold(
-                paper.id,
-                paper.background,
-                paper.target,
-                semantic_threshold=semantic,
-                citation_threshold=citation,
-                retrieved_k=retrieved_k,
-            ),
-        )
-        for paper in tqdm(papers, desc="Querying PeerRead papers.")
+        rp.PaperResult(paper=paper, results=result)
+        for paper, result in zip(papers, query_results)
     ]
     save_data(output_file, results)
@@ -4,9 +4,9 @@ from __future__ import annotations
 
 import gc
 import logging
-from collections.abc import Iterable
+from collections.abc import Iterable, Sequence
 from pathlib import Path
-from typing import ClassVar, Self
+from typing import ClassVar, NotRequired, Protocol, Self, TypedDict
 
 import orjson
 
@@ -27,6 +27,25 @@ from paper.util.serde import (
 logger = logging.getLogger(__name__)
 
 
+class QueryPaper(Protocol):
+    """Paper used to query the graph, e.g. `gpt.PeerReadAnnotated`."""
+
+    @property
+    def id(self) -> str:
+        """Paper ID used to query the citation graph."""
+        ...
+
+    @property
+    def background(self) -> str:
+        """Background used to query the semantic graph."""
+        ...
+
+    @property
+    def target(self) -> str:
+        """Target used to query the semantic graph."""
+        ...
+
+
 class Graph:
     """Graph to retrieve positive and negative related papers.
 
@@ -94,6 +113,50 @@ class Graph:
         papers_citation = self._citation.query(paper_id, k=citation_k)
         return _result_from_related(papers_semantic, papers_citation)
 
+    def query_many(
+        self,
+        papers: Sequence[QueryPaper],
+        *,
+        semantic_k: int = SEMANTIC_TOP_K,
+        citation_k: int = CITATION_TOP_K,
+    ) -> list[QueryResult]:
+        """Find related papers for many papers at once. See `query_all`.
+
+        The semantic queries for all papers are batched (see
+        `semantic.Graph.query_many`). Results are in the same order as `papers`.
+        """
+        papers_semantic = self._semantic.query_many(
+            [p.background for p in papers], [p.target for p in papers], k=semantic_k
+        )
+        return [
+            _result_from_related(semantic, self._citation.query(paper.id, k=citation_k))
+            for paper, semantic in zip(papers, papers_semantic, strict=True)
+        ]
+
+    def query_threshold_many(
+        self,
+        papers: Sequence[QueryPaper],
+        semantic_threshold: float,
+        citation_threshold: float,
+        retrieved_k: int,
+    ) -> list[QueryResult]:
+        """Find related papers above thresholds for many papers at once.
+
+        Batched version of `query_threshold`. See `query_many`.
+        """
+        papers_semantic = self._semantic.query_threshold_many(
+            [p.background for p in papers],
+            [p.target for p in papers],
+            semantic_threshold,
+            retrieved_k,
+        )
+        return [
+            _result_from_related(
+                semantic, self._citation.query_threshold(paper.id, citation_threshold)
+            )
+            for paper, semantic in zip(papers, papers_semantic, strict=True)
+        ]
+
     @classmethod
     def build(
         cls,
@@ -101,14 +164,22 @@ class Graph:
         papers_ann: Iterable[gpt.PaperAnnotated],
         papers_context: Iterable[citations.PaperWithContextClassfied],
         output_dir: Path,
+        *,
+        matrix_dtype: emb.StorageDtype = emb.StorageDtype.FLOAT32,
     ) -> None:
         """Build PETER graph from annotated papers and classified contexts.
 
+        The semantic embedding matrices are encoded in chunks straight into `.npy`
+        sidecars next to the semantic graph file, so peak memory while encoding depends
+        on the chunk size rather than the number of papers. They're memory-mapped on
+        load.
+
         Args:
             encoder: Text to vector encoder to use on the nodes.
             papers_ann: Papers to be processed into semantic graph nodes.
             papers_context: Papers to be processed into citation graph nodes.
             output_dir: Directory where to save the graph.
+            matrix_dtype: Data type of the stored embedding matrices.
         """
         output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -119,10 +190,10 @@ class Graph:
         logger.debug("Creating semantic graph.")
         with Timer("Semantic") as timer_semantic:
             semantic_graph = semantic.Graph.from_papers(
-                encoder, papers_ann, progress=True
+                encoder, papers_ann, progress=True, matrix_dir=output_dir
             )
             logger.debug("Saving semantic graph")
-            save_data(semantic_file, semantic_graph.to_data())
+            save_data(semantic_file, semantic_graph.to_data(output_dir, matrix_dtype))
         logger.debug(timer_semantic)
 
         # Clear the semantic graph to free memory
@@ -141,14 +212,95 @@ class Graph:
         logger.debug(timer_citations)
 
         logger.debug("Saving graph metadata")
-        write_file_bytes(
-            metadata_file, orjson.dumps({"encoder_model": encoder.model_name})
-        )
+        _save_metadata(metadata_file, encoder.model_name, version=1)
+
+    @classmethod
+    def update(
+        cls,
+        encoder: emb.Encoder,
+        graph_dir: Path,
+        papers_ann: Iterable[gpt.PaperAnnotated],
+        papers_context: Iterable[citations.PaperWithContextClassfied],
+    ) -> int:
+        """Add new papers to the PETER graph saved in `graph_dir`, in place.
+
+        Only the new semantic nodes and the new papers' citation titles are encoded.
+        New semantic nodes are appended to the existing ones, and the new citation
+        entries replace existing ones for the same paper. The embedding matrices keep
+        the storage format they were saved with.
+
+        Args:
+            encoder: Text to vector encoder. Must be the model used to build the graph.
+            graph_dir: Directory with the graph created by `build`.
+            papers_ann: New papers to add to the semantic graph.
+            papers_context: New papers to add to the citation graph.
+
+        Returns:
+            The new graph version from the metadata file.
+
+        Raises:
+            ValueError: If `encoder` is a different model from the one in the graph.
+            FileNotFoundError: If any of the graph files is missing.
+        """
+        citation_file = graph_dir / cls.CITATION_FILENAME
+        semantic_file = graph_dir / cls.SEMANTIC_FILENAME
+        metadata_file = graph_dir / cls.METADATA_FILENAME
+
+        metadata = _load_metadata(metadata_file)
+        if metadata["encoder_model"] != encoder.model_name:
+            raise ValueError(
+                f"Incompatible encoder model. Expected '{metadata['encoder_model']}',"
+                f" got '{encoder.model_name}'."
+            )
+        version = metadata.get("version", 1) + 1
+
+        logger.debug("Updating semantic graph.")
+        with Timer("Semantic") as timer_semantic:
+            semantic_data = load_data_single(semantic_file, semantic.GraphData)
+            stored = semantic_data.backgrounds.embeddings
+            matrix_dir = graph_dir if stored.file is not None else None
+            matrix_dtype = emb.StorageDtype(stored.dtype)
+
+            semantic_graph = semantic_data.to_graph(encoder, graph_dir).with_papers(
+                papers_ann, progress=True
+            )
+            logger.debug("Saving semantic graph")
+            save_data(semantic_file, semantic_graph.to_data(matrix_dir, matrix_dtype))
+        logger.debug(timer_semantic)
+
+        del semantic_data, semantic_graph
+        gc.collect()
+
+        logger.debug("Updating citations graph.")
+        with Timer("Citations") as timer_citations:
+            citation_graph = load_data_single(citation_file, citations.Graph).merge(
+                citations.Graph.from_papers(encoder, papers_context, progress=True)
+            )
+            logger.debug("Saving citation graph")
+            save_data(citation_file, citation_graph)
+        logger.debug(timer_citations)
+
+        logger.debug("Saving graph metadata")
+        _save_metadata(metadata_file, encoder.model_name, version=version)
+        return version
+
+    @classmethod
+    def encoder_model(cls, graph_dir: Path) -> str:
+        """Name of the encoder model used to build the graph in `graph_dir`."""
+        return _load_metadata(graph_dir / cls.METADATA_FILENAME)["encoder_model"]
+
+    @classmethod
+    def version(cls, graph_dir: Path) -> int:
+        """Version of the graph in `graph_dir`. Increases with each `update`."""
+        return _load_metadata(graph_dir / cls.METADATA_FILENAME).get("version", 1)
 
     @classmethod
     def load(cls, graph_dir: Path) -> Self:
         """Load a Graph from a directory.
 
+        Supports both graphs with embedding matrices in `.npy` sidecars, which are
+        memory-mapped, and older graphs with the matrices inline in the JSON.
+
         Raises:
             pydantic.ValidationError: If the graph data is malformed.
             FileNotFoundError: If any of the required files is missing.
@@ -167,13 +319,12 @@ class Graph:
                 f"Missing graph files in {graph_dir}: {missing_files}"
             )
 
-        metadata: dict[str, str] = orjson.loads(read_file_bytes(metadata_file))
-        encoder_model = metadata["encoder_model"]
+        encoder_model = _load_metadata(metadata_file)["encoder_model"]
 
         citation_graph = load_data_single(citation_file, citations.Graph)
 
         semantic_data = load_data_single(semantic_file, semantic.GraphData)
-        semantic_graph = semantic_data.to_graph(emb.Encoder(encoder_model))
+        semantic_graph = semantic_data.to_graph(emb.Encoder(encoder_model), graph_dir)
 
         return cls(
             citation=citation_graph,
@@ -182,10 +333,31 @@ class Graph:
         )
 
 
+class _Metadata(TypedDict):
+    """Contents of the graph metadata file."""
+
+    encoder_model: str
+    """Name of the encoder model used to build the graph."""
+    version: NotRequired[int]
+    """Starts at 1 when the graph is built and increases with each update. Missing in
+    graphs created before updates existed, which count as version 1."""
+
+
+def _load_metadata(metadata_file: Path) -> _Metadata:
+    """Read the graph metadata file."""
+    return orjson.loads(read_file_bytes(metadata_file))
+
+
+def _save_metadata(metadata_file: Path, encoder_model: str, *, version: int) -> None:
+    """Write the graph metadata file, replacing the existing one."""
+    metadata: _Metadata = {"encoder_model": encoder_model, "version": version}
+    write_file_bytes(metadata_file, orjson.dumps(metadata))
+
+
 def _result_from_related(
     papers_semantic: semantic.QueryResult, papers_citation: citations.QueryResult
 ) -> QueryResult:
-    result = QueryResult(
+    result = QueryResult.model_construct(
         semantic_positive=[
             PaperRelated.from_(
                 p,
@@ -6,10 +6,16 @@ Output: `QueryResult` with `targets` and `backgrounds`-related `PaperResult`.
 
 from __future__ import annotations
 
+import itertools
 import logging
+import math
 from collections.abc import Iterable, Mapping, Sequence
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Self
+from pathlib import Path
+from typing import TYPE_CHECKING, ClassVar, NamedTuple, Self
+
+import numpy as np
+from tqdm import tqdm
 
 from paper import embedding as emb
 from paper import semantic_scholar as s2
@@ -17,10 +23,17 @@ from paper.types import Immutable
 from paper.util.serde import Record
 
 if TYPE_CHECKING:
+    import numpy.typing as npt
+
     from paper import gpt
 
 logger = logging.getLogger(__name__)
 
+_QUERY_CHUNK_SIZE = 256
+"""Number of queries whose similarities with the nodes are computed at once."""
+_ENCODE_CHUNK_SIZE = 8192
+"""Number of nodes encoded at a time when building the graph."""
+
 
 @dataclass(frozen=True, kw_only=True)
 class _Components:
@@ -29,7 +42,7 @@ class _Components:
     nodes: Sequence[str]
     """Sentence nodes."""
     embeddings: emb.Matrix
-    """Pre-computed embeddings for nodes. Same order as `nodes`."""
+    """Pre-computed L2-normalised embeddings for nodes. Same order as `nodes`."""
     node_to_paper: Mapping[str, _PaperRelated]
     """Mapping from node to its original paper."""
 
@@ -40,16 +53,104 @@ class _Components:
         node_to_paper: Mapping[str, _PaperRelated],
         *,
         progress: bool = False,
+        matrix_file: Path | None = None,
+        chunk_size: int = _ENCODE_CHUNK_SIZE,
     ) -> Self:
-        """Create component from mapping of node to paper with node embeddings."""
+        """Create component from mapping of node to paper with node embeddings.
+
+        Nodes are encoded in chunks of `chunk_size`, and each normalised chunk is written
+        straight into the embedding matrix, so the only full-size matrix is the output.
+
+        Args:
+            encoder: Text to vector encoder to use on the nodes.
+            node_to_paper: Mapping of node sentence to the paper it comes from.
+            progress: If True, show a progress bar over the encoded chunks.
+            matrix_file: If given, the embedding matrix is a float32 `.npy` memory map
+                created in this file instead of an array in memory. See
+                `emb.MatrixData.from_matrix_npy` for how it's reused when saving.
+            chunk_size: Number of nodes encoded at a time.
+        """
         nodes = sorted(node_to_paper)
-        embeddings = encoder.batch_encode(nodes, progress=progress)
+        chunks = itertools.batched(nodes, chunk_size)
+        if progress:
+            chunks = tqdm(
+                chunks, total=math.ceil(len(nodes) / chunk_size), desc="Encoding nodes"
+            )
+
+        embeddings: emb.Matrix | None = None
+        start = 0
+        for chunk in chunks:
+            chunk_embeddings = emb.normalize(
+                encoder.batch_encode(chunk, length_sorted=True)
+            )
+            if embeddings is None:
+                embeddings = _allocate_matrix(
+                    (len(nodes), chunk_embeddings.shape[1]), matrix_file
+                )
+            embeddings[start : start + len(chunk)] = chunk_embeddings
+            start += len(chunk)
+
+        if embeddings is None:
+            embeddings = _allocate_matrix((0, encoder.dimensions or 0), matrix_file)
+
         return cls(embeddings=embeddings, nodes=nodes, node_to_paper=node_to_paper)
 
-    def to_data(self) -> _ComponentsData:
-        """Convert components to serialisable format."""
+    def with_nodes(
+        self,
+        encoder: emb.Encoder,
+        node_to_paper: Mapping[str, _PaperRelated],
+        *,
+        progress: bool = False,
+    ) -> _Components:
+        """Create components with new nodes appended, encoding only the new ones.
+
+        Nodes that already exist keep their embedding and position, but their paper is
+        replaced by the one from `node_to_paper`. New nodes are sorted among themselves
+        and added after the existing ones.
+        """
+        new_node_to_paper = {
+            node: paper
+            for node, paper in node_to_paper.items()
+            if node not in self.node_to_paper
+        }
+        logger.debug(
+            "New nodes: %d. Existing: %d.", len(new_node_to_paper), len(self.nodes)
+        )
+        if not new_node_to_paper:
+            return _Components(
+                embeddings=self.embeddings,
+                nodes=self.nodes,
+                node_to_paper={**self.node_to_paper, **node_to_paper},
+            )
+
+        added = _Components.from_node_paper(
+            encoder, new_node_to_paper, progress=progress
+        )
+        return _Components(
+            embeddings=np.concatenate([self.embeddings, added.embeddings]),
+            nodes=[*self.nodes, *added.nodes],
+            node_to_paper={**self.node_to_paper, **node_to_paper},
+        )
+
+    def to_data(
+        self,
+        matrix_file: Path | None = None,
+        dtype: emb.StorageDtype = emb.StorageDtype.FLOAT32,
+    ) -> _ComponentsData:
+        """Convert components to serialisable format.
+
+        If `matrix_file` is given, the embeddings are saved there as a `.npy` sidecar
+        with `dtype`. Otherwise, they're embedded in the data as base64.
+        """
+        if matrix_file is None:
+            embeddings = emb.MatrixData.from_matrix(self.embeddings)
+        else:
+            embeddings = emb.MatrixData.from_matrix_npy(
+                self.embeddings, matrix_file, dtype
+            )
+
         return _ComponentsData(
-            embeddings=emb.MatrixData.from_matrix(self.embeddings),
+            embeddings=embeddings,
             node_to_paper=self.node_to_paper,
             nodes=self.nodes,
         )
@@ -65,10 +166,20 @@ class _ComponentsData(Immutable):
     node_to_paper: Mapping[str, _PaperRelated]
     nodes: Sequence[str]
 
-    def to_components(self) -> _Components:
-        """Deserialise into a real `_Components` object."""
+    def to_components(self, base_dir: Path | None = None) -> _Components:
+        """Deserialise into a real `_Components` object.
+
+        Sidecar matrices are loaded from `base_dir`. Float32 sidecars are saved already
+        normalised, so they're used as-is to keep the memory map. Other matrices are
+        normalised: inline ones might come from older graphs with unnormalised
+        embeddings, and reduced precision ones lose unit norm when converted back.
+        """
+        embeddings = self.embeddings.to_matrix(base_dir)
+        if not self.embeddings.is_mapped:
+            embeddings = emb.normalize(embeddings)
+
         return _Components(
-            embeddings=self.embeddings.to_matrix(),
+            embeddings=embeddings,
             node_to_paper=self.node_to_paper,
             nodes=self.nodes,
         )
@@ -81,6 +192,11 @@ class Graph:
     - Background: context, problem and motivation.
     """
 
+    BACKGROUNDS_MATRIX_FILE: ClassVar[str] = "semantic_backgrounds.npy"
+    """Sidecar file for background embeddings. See `to_data`."""
+    TARGETS_MATRIX_FILE: ClassVar[str] = "semantic_targets.npy"
+    """Sidecar file for target embeddings. See `to_data`."""
+
     _encoder: emb.Encoder
     """Text encoder used to convert backgrounds and targets to vectors."""
     _targets: _Components
@@ -102,28 +218,64 @@ class Graph:
         papers: Iterable[gpt.PaperAnnotated],
         *,
         progress: bool = False,
+        matrix_dir: Path | None = None,
     ) -> Self:
         """Build semantic graph from paper backgrounds and targets.
 
+        `papers` is iterated only once, so it can be a generator. Each paper is
+        converted once and shared by its background and target nodes.
+
         Args:
             encoder: Text to vector encoder to use on the nodes.
             papers: Papers to be processed into graph nodes.
             progress: If True, show a progress bar while generating node embeddings.
+            matrix_dir: If given, the embeddings are encoded straight into memory-mapped
+                float32 `.npy` files in this directory, with the same names `to_data`
+                uses. Use the same directory in `to_data` to avoid writing them again.
         """
-        background_to_paper = {
-            paper.background: _PaperRelated.from_ann(paper) for paper in papers
-        }
-        target_to_paper = {
-            paper.target: _PaperRelated.from_ann(paper) for paper in papers
-        }
+        background_to_paper, target_to_paper = _nodes_to_paper(papers)
+
+        if matrix_dir is not None:
+            matrix_dir.mkdir(parents=True, exist_ok=True)
+            backgrounds_file = matrix_dir / cls.BACKGROUNDS_MATRIX_FILE
+            targets_file = matrix_dir / cls.TARGETS_MATRIX_FILE
+        else:
+            backgrounds_file = targets_file = None
 
         return cls(
             encoder=encoder,
             backgrounds=_Components.from_node_paper(
-                encoder, background_to_paper, progress=progress
+                encoder,
+                background_to_paper,
+                progress=progress,
+                matrix_file=backgrounds_file,
             ),
             targets=_Components.from_node_paper(
-                encoder, target_to_paper, progress=progress
+                encoder, target_to_paper, progress=progress, matrix_file=targets_file
+            ),
+        )
+
+    def with_papers(
+        self, papers: Iterable[gpt.PaperAnnotated], *, progress: bool = False
+    ) -> Graph:
+        """Create graph with new papers added, encoding only their new nodes.
+
+        Backgrounds and targets already in the graph aren't encoded again. If they now
+        come from a different paper, the node points to the new paper.
+
+        Args:
+            papers: Papers to be added as graph nodes. Iterated only once.
+            progress: If True, show a progress bar while generating node embeddings.
+        """
+        background_to_paper, target_to_paper = _nodes_to_paper(papers)
+
+        return Graph(
+            encoder=self._encoder,
+            backgrounds=self._backgrounds.with_nodes(
+                self._encoder, background_to_paper, progress=progress
+            ),
+            targets=self._targets.with_nodes(
+                self._encoder, target_to_paper, progress=progress
             ),
         )
 
@@ -140,29 +292,18 @@ class Graph:
         top K of the result. It's theoretically possible that this would yield less than
         K papers, but it's unlikely.
         """
-        if k == 0:
-            return QueryResult(backgrounds=[], targets=[])
+        return self._query_pair(background, target, k)
 
-        # Take top 2K because we'll remove some items next.
-        matches_background = self._query(background, self._backgrounds, k=2 * k)
-        matches_target = self._query(target, self._targets, k=2 * k)
-        logger.debug("Background matches: %d.", len(matches_background))
-        logger.debug("Target matches: %d.", len(matches_target))
-
-        # Remove papers that appear in both lists
-        ids_background = {p.paper_id for p in matches_background}
-        ids_target = {p.paper_id for p in matches_target}
-        ids_common = ids_background & ids_target
-        logger.debug("Common papers: %d.", len(ids_common))
-
-        filtered_background = [p for p in matches_background if p.id not in ids_common]
-        filtered_target = [p for p in matches_target if p.id not in ids_common]
-        logger.debug("Background filtered: %d.", len(filtered_background))
-        logger.debug("Target filtered: %d.", len(filtered_target))
-
-        return QueryResult(
-            backgrounds=filtered_background[:k], targets=filtered_target[:k]
-        )
+    def query_many(
+        self, backgrounds: Sequence[str], targets: Sequence[str], k: int
+    ) -> list[QueryResult]:
+        """Get top K related papers for many background and target pairs.
+
+        Same as calling `query` for each pair, but all backgrounds and all targets are
+        encoded in two batched calls, and their similarities are computed as matrix
+        products. Results are in the same order as the input.
+        """
+        return self._query_pairs(backgrounds, targets, k)
 
     def query_threshold(
         self, background: str, target: str, threshold: float, retrieved_k: int = 100
@@ -172,40 +313,120 @@ class Graph:
         First, we fetch `retrieved_k` items, then gets only the results above the
         threshold.
         """
-        results = self.query(background, target, retrieved_k)
-        return QueryResult(
-            backgrounds=[b for b in results.backgrounds if b.score >= threshold],
-            targets=[t for t in results.backgrounds if t.score >= threshold],
-        )
+        return self._query_pair(background, target, retrieved_k, threshold)
+
+    def query_threshold_many(
+        self,
+        backgrounds: Sequence[str],
+        targets: Sequence[str],
+        threshold: float,
+        retrieved_k: int = 100,
+    ) -> list[QueryResult]:
+        """Get semantic-related with score above `threshold` for many pairs.
+
+        Batched version of `query_threshold`. See `query_many`.
+        """
+        return self._query_pairs(backgrounds, targets, retrieved_k, threshold)
+
+    def _query_pair(
+        self, background: str, target: str, k: int, threshold: float | None = None
+    ) -> QueryResult:
+        """Query one background and target pair. See `query` and `query_threshold`."""
+        if k == 0:
+            return QueryResult.model_construct(backgrounds=[], targets=[])
+
+        # Take top 2K because we'll remove some items next.
+        matches_background = self._query(background, self._backgrounds, k=2 * k)
+        matches_target = self._query(target, self._targets, k=2 * k)
+        return _select(matches_background, matches_target, k, threshold)
+
+    def _query_pairs(
+        self,
+        backgrounds: Sequence[str],
+        targets: Sequence[str],
+        k: int,
+        threshold: float | None = None,
+    ) -> list[QueryResult]:
+        """Query many pairs in a batch. See `query_many` and `query_threshold_many`."""
+        if k == 0:
+            return [
+                QueryResult.model_construct(backgrounds=[], targets=[])
+                for _ in backgrounds
+            ]
 
-    def _query(
-        self, sentence: str, elements: _Components, *, k: int
-    ) -> list[SemanticResult]:
+        matches_background = self._query_many(backgrounds, self._backgrounds, k=2 * k)
+        matches_target = self._query_many(targets, self._targets, k=2 * k)
+        return [
+            _select(b, t, k, threshold)
+            for b, t in zip(matches_background, matches_target, strict=True)
+        ]
+
+    def _query(self, sentence: str, elements: _Components, *, k: int) -> list[_Hit]:
         """Get top K nodes in `elements` by similarity with `sentence`.
 
         Results are sorted by their scores, descending.
         """
         embedding = self._encoder.encode(sentence)
-        sim = emb.similarities(embedding, elements.embeddings)
+        scores, indices = emb.top_k_cosine(embedding, elements.embeddings, k)
+        return _hits(elements, scores, indices)
 
-        return [
-            SemanticResult.from_related(
-                related=elements.node_to_paper[elements.nodes[idx]], score=sim[idx]
+    def _query_many(
+        self, sentences: Sequence[str], elements: _Components, *, k: int
+    ) -> list[list[_Hit]]:
+        """Get top K nodes in `elements` for each of `sentences`.
+
+        Queries are scored in chunks of `_QUERY_CHUNK_SIZE` to bound the size of the
+        similarity matrix.
+        """
+        embeddings = self._encoder.batch_encode(sentences)
+
+        results: list[list[_Hit]] = []
+        for start in range(0, len(embeddings), _QUERY_CHUNK_SIZE):
+            chunk = embeddings[start : start + _QUERY_CHUNK_SIZE]
+            scores, indices = emb.top_k_cosine(chunk, elements.embeddings, k)
+            results.extend(
+                _hits(elements, scores_row, indices_row)
+                for scores_row, indices_row in zip(scores, indices)
+            )
+        return results
+
+    def to_data(
+        self,
+        matrix_dir: Path | None = None,
+        dtype: emb.StorageDtype = emb.StorageDtype.FLOAT32,
+    ) -> GraphData:
+        """Convert graph to serialisable format.
+
+        Args:
+            matrix_dir: If given, save the embedding matrices as `.npy` sidecars in this
+                directory (`BACKGROUNDS_MATRIX_FILE` and `TARGETS_MATRIX_FILE`). It must
+                be the same directory where the graph data is saved. If None, the
+                matrices are embedded in the data as base64.
+            dtype: Data type of the sidecar matrices.
+        """
+        if matrix_dir is None:
+            backgrounds = self._backgrounds.to_data()
+            targets = self._targets.to_data()
+        else:
+            backgrounds = self._backgrounds.to_data(
+                matrix_dir / self.BACKGROUNDS_MATRIX_FILE, dtype
+            )
+            targets = self._targets.to_data(
+                matrix_dir / self.TARGETS_MATRIX_FILE, dtype
             )
-            for idx in emb.top_k_indices(sim, k)
-        ]
 
-    def to_data(self) -> GraphData:
-        """Convert graph to serialisable format."""
         return GraphData(
-            backgrounds=self._backgrounds.to_data(),
-            targets=self._targets.to_data(),
+            backgrounds=backgrounds,
+            targets=targets,
             encoder_model=self._encoder.model_name,
         )
 
 
 class QueryResult(Immutable):
-    """Result from querying the semantic graph."""
+    """Result from querying the semantic graph.
+
+    The graph creates these with `model_construct`, as the results are already valid.
+    """
 
     targets: Sequence[SemanticResult]
     """Top K similar papers by target sentence similarity."""
@@ -286,8 +507,85 @@ class SemanticResult(_PaperRelated):
 
     @classmethod
     def from_related(cls, *, related: _PaperRelated, score: float) -> Self:
-        """Create result from base related paper and score."""
-        return cls.model_validate(related.model_dump() | {"score": score})
+        """Create result from base related paper and score.
+
+        `related` is already validated, so its fields are copied without validation.
+        """
+        return cls.model_construct(**related.__dict__, score=score)
+
+
+class _Hit(NamedTuple):
+    """Node retrieved by a query. Only the selected hits become `SemanticResult`."""
+
+    score: float
+    paper: _PaperRelated
+
+
+def _hits(
+    elements: _Components, scores: emb.Vector, indices: npt.NDArray[np.intp]
+) -> list[_Hit]:
+    """Convert top K scores and indices from `elements` to hits."""
+    return [
+        _Hit(float(score), elements.node_to_paper[elements.nodes[int(idx)]])
+        for score, idx in zip(scores, indices)
+    ]
+
+
+def _nodes_to_paper(
+    papers: Iterable[gpt.PaperAnnotated],
+) -> tuple[dict[str, _PaperRelated], dict[str, _PaperRelated]]:
+    """Map backgrounds and targets to their papers in a single pass over `papers`.
+
+    Each paper is converted once and shared by its background and target nodes.
+    """
+    background_to_paper: dict[str, _PaperRelated] = {}
+    target_to_paper: dict[str, _PaperRelated] = {}
+    for paper in papers:
+        related = _PaperRelated.from_ann(paper)
+        background_to_paper[paper.background] = related
+        target_to_paper[paper.target] = related
+    return background_to_paper, target_to_paper
+
+
+def _allocate_matrix(shape: tuple[int, int], matrix_file: Path | None) -> emb.Matrix:
+    """Create an uninitialised float32 matrix, memory-mapped to `matrix_file` if given."""
+    if matrix_file is None:
+        return np.empty(shape, dtype=np.float32)
+    return np.lib.format.open_memmap(
+        matrix_file, mode="w+", dtype=np.float32, shape=shape
+    )
+
+
+def _select(
+    matches_background: Sequence[_Hit],
+    matches_target: Sequence[_Hit],
+    k: int,
+    threshold: float | None = None,
+) -> QueryResult:
+    """Remove papers that appear in both lists, then keep the top K of each.
+
+    If `threshold` is given, only hits with at least that score are kept. Only the
+    selected hits are converted to `SemanticResult`.
+    """
+    logger.debug("Background matches: %d.", len(matches_background))
+    logger.debug("Target matches: %d.", len(matches_target))
+
+    ids_background = {h.paper.paper_id for h in matches_background}
+    ids_target = {h.paper.paper_id for h in matches_target}
+    ids_common = ids_background & ids_target
+    logger.debug("Common papers: %d.", len(ids_common))
+
+    def selected(matches: Sequence[_Hit]) -> list[SemanticResult]:
+        filtered = [h for h in matches if h.paper.paper_id not in ids_common][:k]
+        return [
+            SemanticResult.from_related(related=h.paper, score=h.score)
+            for h in filtered
+            if threshold is None or h.score >= threshold
+        ]
+
+    return QueryResult.model_construct(
+        backgrounds=selected(matches_background), targets=selected(matches_target)
+    )
 
 
 class GraphData(Immutable):
@@ -303,9 +601,15 @@ class GraphData(Immutable):
     encoder_model: str
     """Name of the encoder model used to generate the embeddings."""
 
-    def to_graph(self, encoder: emb.Encoder | None = None) -> Graph:
+    def to_graph(
+        self, encoder: emb.Encoder | None = None, base_dir: Path | None = None
+    ) -> Graph:
         """Initialise Semantic graph from serialised object.
 
+        Args:
+            encoder: Encoder for queries. If None, creates one from `encoder_model`.
+            base_dir: Directory with the `.npy` matrix sidecars, if the data uses them.
+
         Raises:
             ValueError: `encoder` model is different from the one that generated the
             graph.
@@ -319,7 +623,7 @@ class GraphData(Immutable):
             )
 
         return Graph(
-            backgrounds=self.backgrounds.to_components(),
-            targets=self.targets.to_components(),
+            backgrounds=self.backgrounds.to_components(base_dir),
+            targets=self.targets.to_components(base_dir),
             encoder=encoder,
         )
@@ -145,7 +145,7 @@ class QueryResult(Immutable):
             elif source == ps.SEMANTIC and polarity == cp.NEGATIVE:
                 new_semantic_negative.append(paper)
 
-        return QueryResult(
+        return QueryResult.model_construct(
             semantic_positive=new_semantic_positive,
             semantic_negative=new_semantic_negative,
             citations_positive=new_citations_positive,
@@ -266,6 +266,10 @@ class PaperRelated(Record):
         concrete PaperRelated instances with full metadata. Supports both citation-based
         and semantic similarity-based paper relationships.
 
+        The fields come from already validated objects, so the instance is created
+        without validation. This is used for every hit in graph queries, where
+        validation would cost as much as the search itself.
+
         Args:
             paper: Source paper data (Citation or SemanticResult).
             source: How this paper was found.
@@ -277,7 +281,7 @@ class PaperRelated(Record):
         Returns:
             New PaperRelated instance with all metadata.
         """
-        return cls(
+        return cls.model_construct(
             paper_id=paper.paper_id,
             title=paper.title,
             abstract=paper.abstract,
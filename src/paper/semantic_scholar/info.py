@@ -306,11 +306,11 @@ def get_top_k_titles(encoder: emb.Encoder, paper: pr.Paper, k: int) -> list[str]
 
     ref_titles = [r.title for r in paper.references]
 
-    references_emb = encoder.batch_encode(ref_titles)
+    references_emb = emb.normalize(encoder.batch_encode(ref_titles))
     title_emb = encoder.encode(paper.title)
-    sim = emb.similarities(title_emb, references_emb)
+    _, indices = emb.top_k_cosine(title_emb, references_emb, k)
 
-    return [ref_titles[idx] for idx in emb.top_k_indices(sim, k)]
+    return [ref_titles[idx] for idx in indices]
 
 
 app = typer.Typer(
@@ -0,0 +1,133 @@
+"""Compact on-disk store for the sentences indexed by a vector database.
+
+Sentences are stored as a single UTF-8 blob with an array of offsets, where sentence `i`
+is the bytes between `offsets[i]` and `offsets[i + 1]`. Both files are memory-mapped on
+load, so opening a store with millions of sentences doesn't create any Python strings:
+they are decoded one at a time when accessed.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+from typing import Self, overload
+
+import numpy as np
+import numpy.typing as npt
+
+_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+"""Bytes copied at a time from the stored data when saving."""
+
+
+class SentenceStore(Sequence[str]):
+    """Sequence of sentences backed by memory-mapped files, with in-memory appends.
+
+    Use `load` to open a saved store or the constructor for a new one. New sentences are
+    kept in memory until `save`.
+    """
+
+    OFFSETS_FILE = "sentences_offsets.npy"
+    """File with the int64 byte offsets of each sentence in `DATA_FILE`."""
+    DATA_FILE = "sentences.bin"
+    """File with the UTF-8 bytes of all sentences concatenated."""
+
+    def __init__(self, sentences: Iterable[str] = ()) -> None:
+        """Create an in-memory store with the given sentences."""
+        self._offsets: npt.NDArray[np.int64] = np.zeros(1, dtype=np.int64)
+        self._data: mmap.mmap | bytes = b""
+        self._appended = list(sentences)
+
+    @classmethod
+    def load(cls, directory: Path) -> Self:
+        """Open the store saved in `directory` by `save`, memory-mapping its files.
+
+        Raises:
+            FileNotFoundError: if the store files don't exist.
+        """
+        store = cls()
+        store._offsets = np.load(
+            directory / cls.OFFSETS_FILE, mmap_mode="r", allow_pickle=False
+        )
+
+        with open(directory / cls.DATA_FILE, "rb") as f:
+            # Empty files can't be memory-mapped.
+            if os.fstat(f.fileno()).st_size > 0:
+                store._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return store
+
+    @classmethod
+    def exists(cls, directory: Path) -> bool:
+        """Whether `directory` contains a saved store."""
+        return (directory / cls.OFFSETS_FILE).exists()
+
+    @property
+    def _num_stored(self) -> int:
+        """Number of sentences in the memory-mapped files."""
+        return len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        """Total number of sentences, stored and appended."""
+        return self._num_stored + len(self._appended)
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        """Get sentence by position, decoding it from the stored bytes if needed."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Sentence index out of range: {index}")
+
+        if index >= self._num_stored:
+            return self._appended[index - self._num_stored]
+
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._data[start:end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over all sentences in order."""
+        for i in range(len(self)):
+            yield self[i]
+
+    def extend(self, sentences: Iterable[str]) -> None:
+        """Append sentences. They're kept in memory until the store is saved."""
+        self._appended.extend(sentences)
+
+    def save(self, directory: Path) -> None:
+        """Write all sentences to the store files in `directory`.
+
+        The stored bytes are copied as-is and the appended sentences are encoded after
+        them. Files are written to temporary paths and then renamed, so it's safe to
+        save to the directory the store was loaded from.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        data_path = directory / self.DATA_FILE
+        offsets_path = directory / self.OFFSETS_FILE
+        data_tmp = data_path.with_name(f"{data_path.name}.tmp")
+        offsets_tmp = offsets_path.with_name(f"{offsets_path.name}.tmp")
+
+        offsets = np.empty(len(self) + 1, dtype=np.int64)
+        offsets[: len(self._offsets)] = self._offsets
+        position = int(self._offsets[-1])
+
+        with open(data_tmp, "wb") as f:
+            for start in range(0, position, _COPY_CHUNK_SIZE):
+                f.write(self._data[start : min(start + _COPY_CHUNK_SIZE, position)])
+            for i, sentence in enumerate(self._appended, start=self._num_stored + 1):
+                position += f.write(sentence.encode("utf-8"))
+                offsets[i] = position
+
+        with open(offsets_tmp, "wb") as f:
+            np.save(f, offsets, allow_pickle=False)
+
+        data_tmp.replace(data_path)
+        offsets_tmp.replace(offsets_path)
@@ -0,0 +1,554 @@
+"""Append-only vector database split into immutable shards.
+
+Each batch of added sentences becomes a new shard directory with its own faiss index and
+sentence store. A manifest file lists the live shards, and the sentences deleted from
+each shard (tombstones). Adding sentences only writes the new shard and the manifest, so
+growing the database doesn't rewrite existing data. Queries are run on every shard and
+their results merged by score.
+
+Small shards and tombstones accumulate over time. `ShardedVectorDatabase.compact` merges
+them into a single shard. It writes the merged shard before switching the manifest, and
+the replaced shards are only removed by the next compaction, so it can run while other
+processes are loading or querying the database.
+
+Only one process should write to a database at a time.
+"""
+# pyright: basic
+
+from __future__ import annotations
+
+import logging
+import shutil
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Self
+
+import faiss  # type: ignore
+import numpy as np
+import numpy.typing as npt
+
+from paper import embedding as emb
+from paper.sentence_store import SentenceStore
+from paper.types import Immutable
+from paper.util.serde import read_file_bytes, write_file_bytes
+from paper.vector_db import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_SIMILARITY_THRESHOLD,
+    DEFAULT_TOP_K,
+    IndexConfig,
+    SearchMatch,
+    SearchResult,
+    VectorDatabase,
+    create_index,
+    set_search_params,
+    train_index,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ShardInfo(Immutable):
+    """Shard entry in the database manifest."""
+
+    name: str
+    """Name of the shard directory, relative to the database directory."""
+    size: int
+    """Number of sentences in the shard, including deleted ones."""
+    deleted: Sequence[int] = ()
+    """Positions of the deleted sentences in the shard."""
+
+
+class Manifest(Immutable):
+    """List of shards and parameters shared by all of them."""
+
+    model_name: str
+    """Name of the encoder model used to generate the vectors."""
+    batch_size: int
+    """Size of the batch when encoding sentences."""
+    index: IndexConfig
+    """Parameters used to build and search each shard's index."""
+    shards: Sequence[ShardInfo] = ()
+    """Live shards, in the order they were added."""
+    next_shard: int = 0
+    """Number used to name the next shard created."""
+    retired: Sequence[str] = ()
+    """Shards replaced by the last compaction. They're kept until the next one, so
+    processes that read the manifest before the switch can still open them."""
+
+
+@dataclass
+class _Shard:
+    """Loaded shard: index, sentences and which of them are deleted."""
+
+    name: str
+    index: faiss.Index
+    sentences: SentenceStore
+    deleted: set[int]
+
+    @property
+    def live_size(self) -> int:
+        """Number of sentences that weren't deleted."""
+        return len(self.sentences) - len(self.deleted)
+
+    def info(self) -> ShardInfo:
+        """Manifest entry for this shard."""
+        return ShardInfo(
+            name=self.name, size=len(self.sentences), deleted=sorted(self.deleted)
+        )
+
+
+class ShardedVectorDatabase:
+    """Vector database with sentences split across immutable shards.
+
+    Supports the same queries as `VectorDatabase`. Use `create` or `load` to construct.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    """File with the list of shards and shared parameters."""
+    TEMPLATE_FILE = "template.faiss"
+    """Empty index trained on the first shard. New shards start as copies of it, so
+    IVF and int8 indexes are only trained once and all shards share the same
+    clusters."""
+
+    model_name: str
+    """Name of the encoder model used to generate vector embeddings for sentences."""
+    config: IndexConfig
+    """Parameters used to build and search the shard indexes."""
+    batch_size: int
+    """Size of the batch when encoding sentences."""
+
+    def __init__(
+        self,
+        db_dir: Path,
+        encoder: emb.Encoder | None,
+        manifest: Manifest,
+        shards: list[_Shard],
+        template: faiss.Index | None,
+        *,
+        encode_workers: int = 1,
+    ) -> None:
+        """Use `ShardedVectorDatabase.create` or `ShardedVectorDatabase.load`.
+
+        If `encoder` is None, it's created from the manifest's model when first needed.
+        """
+        self.db_dir = db_dir
+        self.model_name = manifest.model_name
+        self.config = manifest.index
+        self.batch_size = manifest.batch_size
+        self._encoder = encoder
+        self._encode_workers = encode_workers
+        self._next_shard = manifest.next_shard
+        self._retired = list(manifest.retired)
+        self._shards = shards
+        self._template = template
+
+    @classmethod
+    def create(
+        cls,
+        db_dir: Path,
+        encoder_model: str = emb.DEFAULT_SENTENCE_MODEL,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        *,
+        encode_workers: int = 1,
+        config: IndexConfig | None = None,
+    ) -> Self:
+        """Create a new empty database in `db_dir`.
+
+        Raises:
+            FileExistsError: if `db_dir` already has a database.
+        """
+        if cls.exists(db_dir):
+            raise FileExistsError(f"Sharded database already exists in {db_dir}")
+
+        manifest = Manifest(
+            model_name=encoder_model,
+            batch_size=batch_size,
+            index=config or IndexConfig(),
+        )
+        db = cls(
+            db_dir,
+            None,
+            manifest,
+            shards=[],
+            template=None,
+            encode_workers=encode_workers,
+        )
+        db._save_manifest()
+        return db
+
+    @classmethod
+    def load(
+        cls,
+        db_dir: Path,
+        batch_size: int | None = None,
+        *,
+        encode_workers: int = 1,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+    ) -> Self:
+        """Load the database in `db_dir` with all shards in its manifest.
+
+        Args:
+            db_dir: Directory containing the manifest and shards.
+            batch_size: Optional batch size to override the saved value.
+            encode_workers: Number of CPU processes used to encode sentences.
+            nprobe: IVF clusters visited per query. Overrides the saved value.
+            ef_search: HNSW candidate list size. Overrides the saved value.
+
+        Raises:
+            FileNotFoundError: If the manifest or shard files don't exist.
+        """
+        manifest = Manifest.model_validate_json(
+            read_file_bytes(db_dir / cls.MANIFEST_FILE)
+        )
+        if batch_size is not None:
+            manifest = manifest.model_copy(update={"batch_size": batch_size})
+
+        shards: list[_Shard] = []
+        for info in manifest.shards:
+            shard_dir = db_dir / info.name
+            index = faiss.read_index(str(shard_dir / VectorDatabase.INDEX_FILE))
+            set_search_params(index, manifest.index, nprobe=nprobe, ef_search=ef_search)
+            shards.append(
+                _Shard(
+                    name=info.name,
+                    index=index,
+                    sentences=SentenceStore.load(shard_dir),
+                    deleted=set(info.deleted),
+                )
+            )
+
+        template_path = db_dir / cls.TEMPLATE_FILE
+        template = (
+            faiss.read_index(str(template_path)) if template_path.exists() else None
+        )
+
+        return cls(
+            db_dir, None, manifest, shards, template, encode_workers=encode_workers
+        )
+
+    @classmethod
+    def exists(cls, db_dir: Path) -> bool:
+        """Whether `db_dir` contains a sharded database."""
+        return (db_dir / cls.MANIFEST_FILE).exists()
+
+    @property
+    def encoder(self) -> emb.Encoder:
+        """Encoder model used to generate vector embeddings for sentences.
+
+        Loaded on first use, so deleting sentences and compacting don't load the model.
+        """
+        if self._encoder is None:
+            self._encoder = emb.Encoder(self.model_name, workers=self._encode_workers)
+        return self._encoder
+
+    @property
+    def num_shards(self) -> int:
+        """Number of live shards."""
+        return len(self._shards)
+
+    def __len__(self) -> int:
+        """Number of sentences in the database, excluding deleted ones."""
+        return sum(shard.live_size for shard in self._shards)
+
+    def add_sentences(self, sentences: Iterable[str]) -> str | None:
+        """Encode sentences and save them as a new shard.
+
+        If the index type needs training and this is the first shard, the index is
+        trained on these sentences. Later shards reuse the trained index.
+
+        Raises:
+            ValueError: if an IVF index needs training and there are fewer sentences
+                than clusters.
+
+        Returns:
+            Name of the new shard, or None if there were no sentences.
+        """
+        sentences_ = list(sentences)
+        if not sentences_:
+            return None
+
+        vectors = self.encoder.batch_encode(
+            sentences_, batch_size=self.batch_size, progress=True
+        )
+        return self._write_shard(SentenceStore(sentences_), vectors)
+
+    def delete_sentences(self, sentences: Iterable[str]) -> int:
+        """Mark every copy of the given sentences as deleted.
+
+        The shards aren't changed: the deleted positions are saved in the manifest and
+        skipped by queries. Use `compact` to remove them from disk.
+
+        Returns:
+            Number of sentences deleted.
+        """
+        targets = set(sentences)
+        deleted = 0
+
+        for shard in self._shards:
+            for i, sentence in enumerate(shard.sentences):
+                if i not in shard.deleted and sentence in targets:
+                    shard.deleted.add(i)
+                    deleted += 1
+
+        if deleted:
+            self._save_manifest()
+        return deleted
+
+    def compact(self, min_size: int) -> int:
+        """Merge shards with fewer than `min_size` live sentences or with deletions.
+
+        The live vectors and sentences of those shards are copied to a new shard, and
+        the manifest is switched to it. The old shards are marked as retired and only
+        removed by the next call, so processes that read the manifest before the switch
+        can still load them. Shards retired by the previous call are removed first.
+
+        Returns:
+            Number of shards merged. 0 if fewer than two shards qualified and none had
+            deletions.
+        """
+        if self._retired:
+            for name in self._retired:
+                shutil.rmtree(self.db_dir / name, ignore_errors=True)
+            self._retired = []
+            self._save_manifest()
+
+        selected = [
+            shard
+            for shard in self._shards
+            if shard.live_size < min_size or shard.deleted
+        ]
+        if len(selected) < 2 and not any(shard.deleted for shard in selected):
+            return 0
+
+        vectors: list[emb.Matrix] = []
+        sentences = SentenceStore()
+        for shard in selected:
+            keep = np.setdiff1d(
+                np.arange(len(shard.sentences)), list(shard.deleted), assume_unique=True
+            )
+            vectors.append(_reconstruct(shard.index)[keep])
+            sentences.extend(shard.sentences[int(i)] for i in keep)
+
+        removed = {shard.name for shard in selected}
+        self._shards = [shard for shard in self._shards if shard.name not in removed]
+        self._retired = sorted(removed)
+
+        if len(sentences):
+            self._write_shard(sentences, np.vstack(vectors))
+        else:
+            self._save_manifest()
+
+        logger.info(
+            "Compacted %d shards into one with %d sentences.",
+            len(removed),
+            len(sentences),
+        )
+        return len(removed)
+
+    def search(
+        self,
+        query_sentences: Sequence[str],
+        k: int = DEFAULT_TOP_K,
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    ) -> list[SearchResult]:
+        """Search sentences in database. Returns top `k` with similarity over `threshold`.
+
+        Each shard is searched for its top `k` (plus the number of deleted sentences,
+        so enough live ones remain), and the results are merged by score.
+        """
+        scores, shard_ids, indices = self._top_k(
+            self._encode_queries(query_sentences), k
+        )
+
+        return [
+            SearchResult.model_construct(
+                query=query,
+                matches=[
+                    SearchMatch.model_construct(
+                        sentence=self._shards[shard].sentences[idx], score=float(score)
+                    )
+                    for score, shard, idx in zip(scores_row, shards_row, indices_row)
+                    if score >= threshold
+                ],
+            )
+            for query, scores_row, shards_row, indices_row in zip(
+                query_sentences, scores, shard_ids, indices
+            )
+        ]
+
+    def search_range(
+        self,
+        query_sentences: Sequence[str],
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        limit: int | None = None,
+    ) -> list[SearchResult]:
+        """Search all sentences with similarity of at least `threshold`.
+
+        See `VectorDatabase.search_range`. Each shard is range-searched and the results
+        are merged by score.
+        """
+        query_vectors = self._encode_queries(query_sentences)
+        radius = float(np.nextafter(np.float32(threshold), np.float32(-np.inf)))
+        matches: list[list[tuple[float, int, int]]] = [[] for _ in query_sentences]
+
+        for shard_id, shard in enumerate(self._shards):
+            lims, scores, indices = shard.index.range_search(  # type: ignore
+                query_vectors, radius
+            )
+            for i, query_matches in enumerate(matches):
+                start, end = int(lims[i]), int(lims[i + 1])
+                query_matches.extend(
+                    (float(score), shard_id, int(idx))
+                    for score, idx in zip(scores[start:end], indices[start:end])
+                    if idx not in shard.deleted
+                )
+
+        return [
+            SearchResult.model_construct(
+                query=query,
+                matches=[
+                    SearchMatch.model_construct(
+                        sentence=self._shards[shard].sentences[idx], score=score
+                    )
+                    for score, shard, idx in sorted(
+                        query_matches, key=lambda m: m[0], reverse=True
+                    )[:limit]
+                ],
+            )
+            for query, query_matches in zip(query_sentences, matches)
+        ]
+
+    def find_best(
+        self,
+        query_sentences: Sequence[str],
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    ) -> list[SearchMatch | None]:
+        """Find the best match for each query sentence, or None if below `threshold`."""
+        scores, shard_ids, indices = self._top_k(
+            self._encode_queries(query_sentences), 1
+        )
+
+        return [
+            SearchMatch.model_construct(
+                sentence=self._shards[shard].sentences[idx], score=float(score)
+            )
+            if idx >= 0 and score >= threshold
+            else None
+            for score, shard, idx in zip(scores[:, 0], shard_ids[:, 0], indices[:, 0])
+        ]
+
+    def _top_k(
+        self, query_vectors: emb.Matrix, k: int
+    ) -> tuple[emb.Matrix, npt.NDArray[np.intp], npt.NDArray[np.intp]]:
+        """Merge the top `k` live results from all shards.
+
+        Returns:
+            Tuple of scores, shard positions and positions in the shard, each with shape
+            (queries, k) and sorted by descending score. Missing results have index -1
+            and score -inf.
+        """
+        num_queries = len(query_vectors)
+        all_scores = [np.full((num_queries, k), -np.inf, dtype=np.float32)]
+        all_shards = [np.full((num_queries, k), -1, dtype=np.intp)]
+        all_indices = [np.full((num_queries, k), -1, dtype=np.intp)]
+
+        for shard_id, shard in enumerate(self._shards):
+            shard_k = min(k + len(shard.deleted), len(shard.sentences))
+            if shard_k == 0:
+                continue
+
+            scores, indices = shard.index.search(query_vectors, shard_k)  # type: ignore
+            invalid = indices < 0
+            if shard.deleted:
+                invalid |= np.isin(indices, list(shard.deleted))
+            scores[invalid] = -np.inf
+            indices[invalid] = -1
+
+            all_scores.append(scores)
+            all_shards.append(np.full_like(indices, shard_id, dtype=np.intp))
+            all_indices.append(indices.astype(np.intp))
+
+        scores = np.hstack(all_scores)
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        indices = np.take_along_axis(np.hstack(all_indices), order, axis=1)
+        shards = np.take_along_axis(np.hstack(all_shards), order, axis=1)
+        shards[indices < 0] = -1
+        return np.take_along_axis(scores, order, axis=1), shards, indices
+
+    def _encode_queries(self, query_sentences: Sequence[str]) -> emb.Matrix:
+        """Encode query sentences as a matrix for the indexes."""
+        return self.encoder.batch_encode(query_sentences, batch_size=self.batch_size)
+
+    def _write_shard(self, sentences: SentenceStore, vectors: emb.Matrix) -> str:
+        """Save a new shard with `sentences` and their `vectors`, then the manifest."""
+        index = self._new_index(vectors)
+        index.add(vectors)  # type: ignore
+
+        name = f"shard-{self._next_shard:05d}"
+        self._next_shard += 1
+        shard_dir = self.db_dir / name
+        shard_dir.mkdir(parents=True)
+        faiss.write_index(index, str(shard_dir / VectorDatabase.INDEX_FILE))
+        sentences.save(shard_dir)
+
+        self._shards.append(
+            _Shard(
+                name=name,
+                index=index,
+                sentences=SentenceStore.load(shard_dir),
+                deleted=set(),
+            )
+        )
+        self._save_manifest()
+
+        logger.info("Saved shard %s with %d sentences.", name, len(sentences))
+        return name
+
+    def _new_index(self, vectors: emb.Matrix) -> faiss.Index:
+        """Create an empty index from the template, training it first if needed."""
+        if self._template is None:
+            template = create_index(vectors.shape[1], self.config)
+            if not template.is_trained:
+                train_index(template, self.config, vectors)
+
+            self.db_dir.mkdir(parents=True, exist_ok=True)
+            faiss.write_index(template, str(self.db_dir / self.TEMPLATE_FILE))
+            self._template = template
+
+        index = faiss.clone_index(self._template)
+        set_search_params(index, self.config)
+        return index
+
+    def _save_manifest(self) -> None:
+        """Write the manifest with the current shards atomically."""
+        manifest = Manifest(
+            model_name=self.model_name,
+            batch_size=self.batch_size,
+            index=self.config,
+            shards=[shard.info() for shard in self._shards],
+            next_shard=self._next_shard,
+            retired=self._retired,
+        )
+        self.db_dir.mkdir(parents=True, exist_ok=True)
+        path = self.db_dir / self.MANIFEST_FILE
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        write_file_bytes(tmp_path, manifest.model_dump_json(indent=2).encode())
+        tmp_path.replace(path)
+
+
+def _reconstruct(index: faiss.Index) -> emb.Matrix:
+    """Get all vectors stored in `index`. Quantised indexes return approximations."""
+    if ivf := faiss.try_extract_index_ivf(index):
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def open_database(
+    db_dir: Path, batch_size: int | None = None, **kwargs: Any
+) -> VectorDatabase | ShardedVectorDatabase:
+    """Load the database in `db_dir`, sharded or not. See their `load` methods."""
+    if ShardedVectorDatabase.exists(db_dir):
+        return ShardedVectorDatabase.load(db_dir, batch_size, **kwargs)
+    return VectorDatabase.load(db_dir, batch_size, **kwargs)
@@ -255,9 +255,9 @@ def get_top_k_semantic(
     Returns:
         List of K most similar papers as PaperRelated objects with similarity scores.
     """
-    sem_emb = encoder.encode_multi(items)
-    sims = emb.similarities(main_emb, sem_emb)
-    top_k = [(papers[i], float(sims[i])) for i in emb.top_k_indices(sims, k)]
+    sem_emb = emb.normalize(encoder.encode_multi(items))
+    scores, indices = emb.top_k_cosine(main_emb, sem_emb, k)
+    top_k = [(papers[int(i)], float(score)) for score, i in zip(scores, indices)]
 
     related_papers: list[rp.PaperRelated] = []
     for paper, score in top_k:
@@ -315,9 +315,11 @@ def get_top_k_reference_by_polarity(
         logger.debug("No papers with polarity %s found.", polarity)
         return []
 
-    titles_emb = encoder.encode_multi([r.title for r in references_pol])
-    sims = emb.similarities(title_emb, titles_emb)
-    top_k = [(references_pol[i], float(sims[i])) for i in emb.top_k_indices(sims, k)]
+    titles_emb = emb.normalize(encoder.encode_multi([r.title for r in references_pol]))
+    scores, indices = emb.top_k_cosine(title_emb, titles_emb, k)
+    top_k = [
+        (references_pol[int(i)], float(score)) for score, i in zip(scores, indices)
+    ]
 
     return [
         rp.PaperRelated(
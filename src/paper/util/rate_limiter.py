@@ -1,12 +1,14 @@
-"""Rate limiter for the OpenAI API using a sliding window."""
+"""Rate limiters for API requests."""
 
 from __future__ import annotations
 
 import asyncio
+import logging
 import os
+import re
 import time
-import uuid
-from collections.abc import AsyncGenerator, Callable, Coroutine, Iterable
+from collections import deque
+from collections.abc import AsyncGenerator, Callable, Coroutine, Iterable, Mapping
 from contextlib import asynccontextmanager
 from typing import Any, TypedDict
 
@@ -15,8 +17,18 @@ from aiolimiter import AsyncLimiter
 from google.genai.types import GenerateContentResponse  # type: ignore
 from openai.types.chat import ChatCompletion
 
+logger = logging.getLogger(__name__)
+
 _TOKENIZER = tiktoken.get_encoding("o200k_base")
 
+HEADROOM = 0.1
+"""Fraction of the limits that must remain for a response to grow the concurrency."""
+DEFAULT_RETRY_AFTER = 1.0
+"""Seconds to pause after a 429 response that doesn't say when to retry."""
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
 
 class Message(TypedDict):
     """Message sent to the OpenAI API."""
@@ -38,7 +50,7 @@ def _message_num_tokens(value: object) -> int:
         return int(len(valstr.split()) * 1.5)
 
 
-def _count_tokens(
+def count_request_tokens(
     messages: Iterable[Message], max_tokens: int | None = None, n: int = 1, **_: Any
 ) -> int:
     """Calculate total tokens that will be consumed by a chat request.
@@ -68,8 +80,60 @@ def _count_tokens(
     return num_tokens
 
 
+class _Bucket:
+    """Token bucket that refills continuously up to its capacity.
+
+    The level can go negative when a request turns out to use more than it reserved.
+    The debt is paid by the refill before new requests are admitted.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float, now: float) -> None:
+        self.capacity = capacity
+        self.rate = refill_per_second
+        self.level = capacity
+        self._updated = now
+
+    def refill(self, now: float) -> None:
+        """Add what was refilled since the last update."""
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available, assuming `refill` was just called."""
+        return max(0, amount - self.level) / self.rate
+
+    def adapt(
+        self, limit: float | None, remaining: float | None, reset: float | None
+    ) -> None:
+        """Follow the provider's view of this limit from its rate limit headers.
+
+        Args:
+            limit: Limit for the window. Becomes the capacity.
+            remaining: What's left now. The level is never above it.
+            reset: Seconds until `remaining` is back to `limit`. Gives the refill rate.
+        """
+        if limit is not None and limit > 0:
+            self.capacity = limit
+            self.level = min(self.level, limit)
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+            if limit and reset and remaining < limit:
+                self.rate = (limit - remaining) / reset
+
+
 class ChatRateLimiter:
-    """Rate limiter for OpenAI API with both request and token limits."""
+    """Rate limiter for OpenAI API with both request and token limits.
+
+    Uses two token buckets, one for requests and one for tokens. Each holds up to the
+    limit for a window and refills continuously at limit/window per second. Requests
+    that don't fit wait in a FIFO queue, and a single timer wakes them when the
+    request at the front fits. Admitting, queueing and updating the usage are O(1).
+
+    The limits given to the constructor are a starting point. Call `observe` with the
+    responses from the API to adapt them to the `x-ratelimit-*` headers the provider
+    sends, and to limit the number of requests in flight: halved when the provider
+    responds with 429, and grown back by one for each response with headroom.
+    """
 
     def __init__(
         self, request_limit: int, token_limit: int, bucket_size_in_seconds: int = 60
@@ -79,7 +143,7 @@ class ChatRateLimiter:
         Args:
             request_limit: Maximum number of requests per bucket window
             token_limit: Maximum number of tokens per bucket window
-            bucket_size_in_seconds: Size of the bucket sliding window
+            bucket_size_in_seconds: Time for empty buckets to refill completely
 
         When `bucket_size_in_seconds` is 60s/1m (the default), the limits represent
         RPM and TPM, as is normally shown by OpenAI.
@@ -88,30 +152,197 @@ class ChatRateLimiter:
         self._token_limit = token_limit
         self._bucket_size = bucket_size_in_seconds
 
-        # Track requests with timestamps and token usage
-        # request_id -> (timestamp, tokens, is_actual)
-        self._requests: dict[int, tuple[float, int, bool]] = {}
-        self._lock = asyncio.Lock()
-
-    async def _get_current_usage(self) -> tuple[int, int]:
-        """Get current request and token usage in the sliding window."""
-
-        current_time = time.time()
-        cutoff_time = current_time - self._bucket_size
+        now = time.monotonic()
+        self._requests = _Bucket(
+            request_limit, request_limit / bucket_size_in_seconds, now
+        )
+        self._tokens = _Bucket(token_limit, token_limit / bucket_size_in_seconds, now)
+
+        # Waiting requests in arrival order: (future set to the tokens taken when
+        # admitted, tokens requested).
+        self._waiters: deque[tuple[asyncio.Future[int], int]] = deque()
+        self._timer: asyncio.TimerHandle | None = None
+
+        # Maximum requests in flight, adapted by `observe`.
+        self._in_flight = 0
+        self._concurrency = request_limit
+        # After a 429, no requests are admitted before this (monotonic) time.
+        self._paused_until = 0.0
+
+    @property
+    def concurrency(self) -> int:
+        """Maximum number of requests in flight allowed now."""
+        return self._concurrency
+
+    @property
+    def request_limit(self) -> float:
+        """Current request limit per window."""
+        return self._requests.capacity
+
+    @property
+    def token_limit(self) -> float:
+        """Current token limit per window."""
+        return self._tokens.capacity
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """Adapt the limits to an API response.
+
+        The `x-ratelimit-limit-*`, `x-ratelimit-remaining-*` and `x-ratelimit-reset-*`
+        headers, for both requests and tokens, replace the limits, current levels and
+        refill rates. Missing headers leave them as they are.
+
+        A 429 status halves the number of requests in flight and pauses new requests
+        for the time given by the `retry-after-ms` or `retry-after` headers. Other
+        responses with at least `HEADROOM` of the limits remaining allow one more
+        request in flight, up to the request limit.
 
-        # Remove expired entries
-        expired_ids = [
-            req_id
-            for req_id, (timestamp, _, _) in self._requests.items()
-            if timestamp < cutoff_time
-        ]
-        for req_id in expired_ids:
-            del self._requests[req_id]
+        Args:
+            status_code: HTTP status of the response.
+            headers: Response headers. Lookups must be case-insensitive, or the keys
+                lower case.
+        """
+        self._refill()
+        requests = _limit_headers(headers, "requests")
+        tokens = _limit_headers(headers, "tokens")
+        self._requests.adapt(*requests)
+        self._tokens.adapt(*tokens)
+
+        if status_code == 429:
+            self._concurrency = max(1, min(self._concurrency, self._in_flight) // 2)
+            retry_after = _retry_after(headers)
+            if retry_after is None:
+                retry_after = max(requests[2] or 0, tokens[2] or 0)
+            self._paused_until = max(
+                self._paused_until,
+                time.monotonic() + (retry_after or DEFAULT_RETRY_AFTER),
+            )
+            logger.warning(
+                "Rate limited. Pausing for %.2fs. Max concurrency: %d.",
+                retry_after or DEFAULT_RETRY_AFTER,
+                self._concurrency,
+            )
+        elif (
+            _has_headroom(*requests)
+            and _has_headroom(*tokens)
+            and self._concurrency < self._requests.capacity
+        ):
+            self._concurrency += 1
+
+        if self._waiters:
+            self._wake()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._requests.refill(now)
+        self._tokens.refill(now)
+
+    def _cap(self, tokens: int) -> int:
+        """Limit request to the current token capacity.
+
+        A request larger than the whole bucket could never fit. It's let through once
+        the bucket is full instead, which leaves it in debt for the excess. The
+        capacity can shrink after the request is queued (see `observe`), so this is
+        checked again on every wake.
+        """
+        return min(tokens, int(self._tokens.capacity))
+
+    def _fits(self, tokens: int) -> bool:
+        tokens = self._cap(tokens)
+        return (
+            self._in_flight < self._concurrency
+            and time.monotonic() >= self._paused_until
+            and self._requests.level >= 1
+            and self._tokens.level >= tokens
+        )
+
+    def _take(self, tokens: int) -> int:
+        """Take capacity for an admitted request. Returns the tokens taken."""
+        tokens = self._cap(tokens)
+        self._requests.level -= 1
+        self._tokens.level -= tokens
+        self._in_flight += 1
+        return tokens
+
+    def _finish(self) -> None:
+        """Mark an admitted request as no longer in flight."""
+        self._in_flight -= 1
+        if self._waiters:
+            self._wake()
+
+    def _wake(self) -> None:
+        """Admit the waiters at the front of the queue that fit, then reschedule."""
+        self._timer = None
+        self._refill()
+
+        while self._waiters:
+            future, tokens = self._waiters[0]
+            if future.done():  # Cancelled while waiting
+                self._waiters.popleft()
+                continue
+            if not self._fits(tokens):
+                break
+            self._waiters.popleft()
+            future.set_result(self._take(tokens))
+
+        self._schedule()
+
+    def _schedule(self) -> None:
+        """Set the timer for when the request at the front of the queue fits."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._waiters:
+            return
+
+        # Requests over the concurrency are woken when a request finishes instead.
+        if self._in_flight >= self._concurrency:
+            return
+
+        _, tokens = self._waiters[0]
+        delay = max(
+            self._paused_until - time.monotonic(),
+            self._requests.wait_time(1),
+            self._tokens.wait_time(self._cap(tokens)),
+        )
+        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    async def _acquire(self, tokens: int) -> int:
+        """Wait until there's capacity for a request with `tokens`, then take it.
+
+        Returns:
+            Number of tokens taken from the bucket.
+        """
+        self._refill()
+        if not self._waiters and self._fits(tokens):
+            return self._take(tokens)
 
-        current_requests = len(self._requests)
-        current_tokens = sum(tokens for _, tokens, _ in self._requests.values())
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((future, tokens))
+        if len(self._waiters) == 1:
+            self._schedule()
 
-        return current_requests, current_tokens
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted, but cancelled before running. Give the capacity back.
+                self._release(future.result())
+            elif self._waiters and self._waiters[0][0] is future:
+                self._wake()
+            raise
+
+    def _release(self, tokens: int) -> None:
+        """Return capacity taken by a request, e.g. if it was cancelled."""
+        self._requests.level += 1
+        self._tokens.level += tokens
+        self._finish()
+
+    def _adjust_tokens(self, delta: int) -> None:
+        """Charge `delta` more tokens (or refund, if negative) to the token bucket."""
+        self._refill()
+        self._tokens.level -= delta
+        if delta < 0 and self._waiters:
+            self._wake()
 
     @asynccontextmanager
     async def limit(
@@ -138,7 +369,8 @@ class ChatRateLimiter:
 
         Before the request, we estimate the number of tokens that will be spent based
         on the `max_token` request parameter. Use the update function for more precise
-        tracking.
+        tracking: the difference from the estimate is refunded to (or charged from) the
+        token bucket.
         """
         if messages:
             # Fine, we'll use that as-is
@@ -151,50 +383,86 @@ class ChatRateLimiter:
         else:
             raise ValueError("Either messages or contents need to be passed to limiter")
 
-        estimated_tokens = _count_tokens(messages, **kwargs)
-        request_id = uuid.uuid4().int
+        estimated_tokens = count_request_tokens(messages, **kwargs)
+        charged = await self._acquire(estimated_tokens)
+
+        # Callback for updating with actual token usage
+        async def update_with_actual_usage(
+            actual_tokens: int | ChatCompletion | GenerateContentResponse,
+        ) -> None:
+            nonlocal charged
+
+            if isinstance(actual_tokens, ChatCompletion):
+                usage = actual_tokens.usage
+                if usage is None:
+                    return
+                actual_tokens = usage.total_tokens
+            elif isinstance(actual_tokens, GenerateContentResponse):
+                usage = actual_tokens.usage_metadata
+                if usage is None or usage.total_token_count is None:
+                    return
+                actual_tokens = usage.total_token_count
+
+            self._adjust_tokens(actual_tokens - charged)
+            charged = actual_tokens
 
-        # Wait until there's capacity
-        while True:
-            async with self._lock:
-                current_requests, current_tokens = await self._get_current_usage()
+        try:
+            yield update_with_actual_usage
+        finally:
+            self._finish()
 
-                if (
-                    current_requests < self._request_limit
-                    and current_tokens + estimated_tokens <= self._token_limit
-                ):
-                    # Record estimated usage
-                    self._requests[request_id] = (time.time(), estimated_tokens, False)
-                    break
 
-            # No capacity, wait and retry
-            await asyncio.sleep(0.05)
+def _limit_headers(
+    headers: Mapping[str, str], kind: str
+) -> tuple[float | None, float | None, float | None]:
+    """Get (limit, remaining, reset seconds) for `kind` (requests or tokens).
 
-        try:
-            # Callback for updating with actual token usage
-            async def update_with_actual_usage(
-                actual_tokens: int | ChatCompletion | GenerateContentResponse,
-            ) -> None:
-                if isinstance(actual_tokens, ChatCompletion):
-                    usage = actual_tokens.usage
-                    if usage is None:
-                        return
-                    actual_tokens = usage.total_tokens
-                elif isinstance(actual_tokens, GenerateContentResponse):
-                    usage = actual_tokens.usage_metadata
-                    if usage is None or usage.total_token_count is None:
-                        return
-                    actual_tokens = usage.total_token_count
-
-                async with self._lock:
-                    if request_id in self._requests:
-                        timestamp, _, _ = self._requests[request_id]
-                        self._requests[request_id] = (timestamp, actual_tokens, True)
+    Missing or invalid headers are None.
+    """
+    limit = _parse_number(headers.get(f"x-ratelimit-limit-{kind}"))
+    remaining = _parse_number(headers.get(f"x-ratelimit-remaining-{kind}"))
+    reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+    return limit, remaining, reset
 
-            yield update_with_actual_usage
-        finally:
-            # We keep the request entry regardless of whether it was updated
-            pass
+
+def _has_headroom(
+    limit: float | None, remaining: float | None, _reset: float | None
+) -> bool:
+    if limit is None or remaining is None:
+        return True
+    return remaining >= HEADROOM * limit
+
+
+def _retry_after(headers: Mapping[str, str]) -> float | None:
+    """Seconds to wait before retrying, from the `retry-after(-ms)` headers."""
+    if (ms := _parse_number(headers.get("retry-after-ms"))) is not None:
+        return ms / 1000
+    return _parse_number(headers.get("retry-after"))
+
+
+def _parse_number(value: str | None) -> float | None:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _parse_duration(value: str | None) -> float | None:
+    """Parse durations like `6m0s`, `1.5s` or `20ms` into seconds.
+
+    Plain numbers are seconds. Returns None for missing or invalid values.
+    """
+    if value is None:
+        return None
+    if (number := _parse_number(value)) is not None:
+        return number
+
+    parts = _DURATION_RE.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value.strip():
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
 
 
 type Limiter = asyncio.Semaphore | AsyncLimiter
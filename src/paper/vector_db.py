@@ -1,26 +1,33 @@
 """Vector database for retrieving similar sentences by cosine similarity.
 
 Uses SentenceTransformers to build sentence embeddings and faiss to create the index.
+The index can be exact (flat) or approximate (HNSW, IVF), and the vectors can be stored
+in full precision or quantised to reduce the index size. See `IndexConfig`.
 """
 # pyright: basic
 
 import logging
 from collections.abc import Iterable, Sequence
+from enum import StrEnum
 from pathlib import Path
 from typing import Self
 
 import faiss  # type: ignore
+import numpy as np
 import orjson
 import typer
 
 from paper import embedding as emb
 from paper.embedding import DEFAULT_SENTENCE_MODEL
+from paper.sentence_store import SentenceStore
 from paper.types import Immutable
 from paper.util.serde import read_file_bytes, write_file_bytes
 
 DEFAULT_BATCH_SIZE = 1000
 DEFAULT_TOP_K = 5
 DEFAULT_SIMILARITY_THRESHOLD = 0.6
+DEFAULT_HNSW_M = 32
+DEFAULT_IVF_NLIST = 1024
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +58,149 @@ class SearchResult(Immutable):
     """Retrieved sentences with scores."""
 
 
+class IndexType(StrEnum):
+    """Type of faiss index used for vector search."""
+
+    FLAT = "flat"
+    """Exhaustive search. Exact, but linear in the database size."""
+    HNSW = "hnsw"
+    """Hierarchical navigable small world graph. Fast and accurate, but uses more
+    memory for the graph links. Tune with `IndexConfig.ef_search`."""
+    IVF_FLAT = "ivf-flat"
+    """Inverted file: vectors are clustered and only the closest clusters are searched.
+    Needs training. Tune with `IndexConfig.nprobe`."""
+    IVF_PQ = "ivf-pq"
+    """Inverted file with product-quantised vectors. Smallest index, least accurate.
+    Needs training. Tune with `IndexConfig.nprobe`."""
+
+
+class IndexConfig(Immutable):
+    """Parameters to build and search a faiss index. Saved in the database metadata."""
+
+    type: IndexType = IndexType.FLAT
+    """Index structure."""
+    precision: emb.StorageDtype = emb.StorageDtype.FLOAT32
+    """Precision of the stored vectors. Not used by IVF-PQ, which has its own
+    compression."""
+    hnsw_m: int = DEFAULT_HNSW_M
+    """HNSW: number of neighbours per node in the graph."""
+    ef_construction: int = 200
+    """HNSW: size of the candidate list when adding vectors. Higher is slower to build,
+    but gives a better graph."""
+    ef_search: int = 64
+    """HNSW: size of the candidate list when searching. Higher is slower but more
+    accurate."""
+    nlist: int = DEFAULT_IVF_NLIST
+    """IVF: number of clusters. The index must be trained with at least this many
+    vectors, ideally dozens of times more."""
+    nprobe: int = 16
+    """IVF: number of clusters visited when searching. Higher is slower but more
+    accurate."""
+    pq_m: int | None = None
+    """IVF-PQ: number of sub-quantisers. Must divide the vector dimensions. If None, uses
+    one per 8 dimensions."""
+    pq_bits: int = 8
+    """IVF-PQ: bits per sub-quantiser code."""
+
+    def factory_string(self, dimensions: int) -> str:
+        """Description of the index for `faiss.index_factory`.
+
+        Raises:
+            ValueError: if the IVF-PQ sub-quantisers don't divide `dimensions`, or if
+                IVF-PQ is used with reduced precision.
+        """
+        storage = {
+            emb.StorageDtype.FLOAT32: "Flat",
+            emb.StorageDtype.FLOAT16: "SQfp16",
+            emb.StorageDtype.INT8: "SQ8",
+        }[self.precision]
+
+        match self.type:
+            case IndexType.FLAT:
+                return storage
+            case IndexType.HNSW:
+                return f"HNSW{self.hnsw_m},{storage}"
+            case IndexType.IVF_FLAT:
+                return f"IVF{self.nlist},{storage}"
+            case IndexType.IVF_PQ:
+                if self.precision is not emb.StorageDtype.FLOAT32:
+                    raise ValueError("IVF-PQ compresses vectors with its own codes.")
+                pq_m = self.pq_m or dimensions // 8
+                if pq_m <= 0 or dimensions % pq_m != 0:
+                    raise ValueError(
+                        f"IVF-PQ sub-quantisers ({pq_m}) must divide the dimensions"
+                        f" ({dimensions})."
+                    )
+                return f"IVF{self.nlist},PQ{pq_m}x{self.pq_bits}"
+
+
+def create_index(dimensions: int, config: IndexConfig | None = None) -> faiss.Index:
+    """Create an empty inner product index from `config`.
+
+    The default is an exact flat index with float32 vectors. float16 and int8 precision
+    use faiss scalar quantisers, which halve and quarter the vector storage. The int8
+    quantiser learns the value range of each dimension, and IVF indexes learn their
+    clusters, so those must be trained before vectors are added (see
+    `VectorDatabase.add_sentences`).
+
+    The search parameters from `config` are applied to the new index.
+    """
+    config = config or IndexConfig()
+    index = faiss.index_factory(
+        dimensions, config.factory_string(dimensions), faiss.METRIC_INNER_PRODUCT
+    )
+    if config.type is IndexType.HNSW:
+        faiss.ParameterSpace().set_index_parameter(
+            index, "efConstruction", config.ef_construction
+        )
+
+    set_search_params(index, config)
+    return index
+
+
+def set_search_params(
+    index: faiss.Index,
+    config: IndexConfig,
+    *,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+) -> None:
+    """Set query-time parameters of `index` built from `config`.
+
+    Args:
+        index: Index to update.
+        config: Configuration the index was built with. Provides the default values.
+        nprobe: IVF clusters visited per query. Overrides `config.nprobe`.
+        ef_search: HNSW candidate list size. Overrides `config.ef_search`.
+    """
+    params = faiss.ParameterSpace()
+    match config.type:
+        case IndexType.HNSW:
+            params.set_index_parameter(index, "efSearch", ef_search or config.ef_search)
+        case IndexType.IVF_FLAT | IndexType.IVF_PQ:
+            params.set_index_parameter(index, "nprobe", nprobe or config.nprobe)
+        case IndexType.FLAT:
+            pass
+
+
+def train_index(index: faiss.Index, config: IndexConfig, vectors: emb.Matrix) -> None:
+    """Train `index` built from `config` on `vectors`.
+
+    Raises:
+        ValueError: if an IVF index would have fewer training vectors than clusters.
+    """
+    if config.type in (IndexType.IVF_FLAT, IndexType.IVF_PQ) and (
+        len(vectors) < config.nlist
+    ):
+        raise ValueError(
+            f"Training an IVF index with {config.nlist} clusters needs at least as many"
+            f" sentences. Got {len(vectors)}."
+        )
+
+    logger.info("Training %s index on %d vectors.", config.type, len(vectors))
+    index.train(vectors)  # type: ignore
+
+
 class VectorDatabase:
     """Database for embedded sentences."""
 
@@ -61,52 +211,89 @@ class VectorDatabase:
 
     encoder: emb.Encoder
     """Encoder model used to generate vector embeddings for sentences."""
-    index: faiss.IndexFlatIP
+    index: faiss.Index
     """Index for vector search."""
-    sentences: list[str]
-    """Input sentences."""
+    sentences: SentenceStore
+    """Input sentences, in the same order as the index vectors."""
     batch_size: int
     """Size of the batch during database construction."""
+    config: IndexConfig
+    """Parameters used to build and search the index."""
 
     def __init__(
         self,
         encoder: emb.Encoder,
-        index: faiss.IndexFlatIP,
-        sentences: list[str],
+        index: faiss.Index,
+        sentences: SentenceStore,
         batch_size: int,
+        config: IndexConfig | None = None,
     ) -> None:
         """Use `VectorDatabase.load` or `VectorDatabase.empty` to construct a new DB."""
         self.encoder = encoder
         self.index = index
         self.sentences = sentences
         self.batch_size = batch_size
+        self.config = config or IndexConfig()
 
     @classmethod
     def empty(
         cls,
         encoder_model: str = DEFAULT_SENTENCE_MODEL,
         batch_size: int = DEFAULT_BATCH_SIZE,
+        *,
+        encode_workers: int = 1,
+        config: IndexConfig | None = None,
     ) -> Self:
         """Create a new empty vector database with the given encoder.
 
         Args:
             encoder_model: Name of the model used to create sentence embeddings.
             batch_size: Number of sentences per batch when adding sentences to the index.
+            encode_workers: Number of CPU processes used to encode sentences.
+            config: Index type and parameters. Defaults to an exact float32 index.
+
+        Raises:
+            ValueError: if the model doesn't report its embedding dimensions.
         """
-        encoder = emb.Encoder(encoder_model)
-        index = faiss.IndexFlatIP(encoder.dimensions)
-        return cls(encoder=encoder, index=index, sentences=[], batch_size=batch_size)
+        encoder = emb.Encoder(encoder_model, workers=encode_workers)
+        dimensions = encoder.dimensions
+        if dimensions is None:
+            raise ValueError(
+                f"Model '{encoder_model}' doesn't report its embedding dimensions."
+            )
+
+        config = config or IndexConfig()
+        return cls(
+            encoder=encoder,
+            index=create_index(dimensions, config),
+            sentences=SentenceStore(),
+            batch_size=batch_size,
+            config=config,
+        )
 
     @classmethod
-    def load(cls, db_dir: Path, batch_size: int | None = None) -> Self:
+    def load(
+        cls,
+        db_dir: Path,
+        batch_size: int | None = None,
+        *,
+        encode_workers: int = 1,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+    ) -> Self:
         """Load a vector database from disk.
 
         Expects the files created by `save`. If `batch_size` is given, it overrides the
-        one from the metadata.
+        one from the metadata. The sentences are memory-mapped, so only the ones
+        retrieved by searches are loaded. Older databases with the sentences in the
+        metadata file are also supported, but those are loaded in memory.
 
         Args:
             db_dir: Directory containing the database files.
             batch_size: Optional batch size to override the saved value.
+            encode_workers: Number of CPU processes used to encode sentences.
+            nprobe: IVF clusters visited per query. Overrides the saved value.
+            ef_search: HNSW candidate list size. Overrides the saved value.
 
         Returns:
             A loaded VectorDatabase instance.
@@ -121,27 +308,44 @@ class VectorDatabase:
         index = faiss.read_index(str(index_path))
         metadata = orjson.loads(read_file_bytes(metadata_path))
 
+        # Older databases don't have an index config: they're always flat float32.
+        config = IndexConfig.model_validate(metadata.get("index", {}))
+        set_search_params(index, config, nprobe=nprobe, ef_search=ef_search)
+
         return cls(
             index=index,
-            encoder=emb.Encoder(metadata["model_name"]),
-            sentences=metadata["sentences"],
+            encoder=emb.Encoder(metadata["model_name"], workers=encode_workers),
+            sentences=SentenceStore.load(db_dir)
+            if SentenceStore.exists(db_dir)
+            else SentenceStore(metadata["sentences"]),
             batch_size=batch_size or int(metadata["batch_size"]),
+            config=config,
         )
 
     def add_sentences(self, sentences: Iterable[str]) -> None:
         """Add sentences to index in batches.
 
+        If the index needs training (IVF or int8 precision) and it's not trained yet,
+        it's trained on these sentences, so the first batch added should be
+        representative of the whole database.
+
         Args:
             sentences: Iterable of sentences to add to the database.
+
+        Raises:
+            ValueError: if an IVF index needs training and there are fewer sentences
+                than clusters.
         """
         sentences_ = list(sentences)
+        vectors = self.encoder.batch_encode(
+            sentences_, batch_size=self.batch_size, progress=True
+        )
+
+        if not self.index.is_trained:
+            train_index(self.index, self.config, vectors)
 
         self.sentences.extend(sentences_)
-        self.index.add(  # type: ignore
-            self.encoder.batch_encode(
-                sentences_, batch_size=self.batch_size, progress=True
-            )
-        )
+        self.index.add(vectors)  # type: ignore
 
     def search(
         self,
@@ -150,9 +354,7 @@ class VectorDatabase:
         threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
     ) -> list[SearchResult]:
         """Search sentences in database. Returns top `k` with similarity over `threshold`."""
-        query_vectors = self.encoder.batch_encode(
-            query_sentences, batch_size=self.batch_size
-        )
+        query_vectors = self._encode_queries(query_sentences)
         scores, indices = self.index.search(query_vectors, k)  # type: ignore
 
         return [
@@ -169,6 +371,52 @@ class VectorDatabase:
             for query, scores_row, indices_row in zip(query_sentences, scores, indices)
         ]
 
+    def search_range(
+        self,
+        query_sentences: Sequence[str],
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        limit: int | None = None,
+    ) -> list[SearchResult]:
+        """Search all sentences with similarity of at least `threshold`.
+
+        Unlike `search`, this doesn't fetch a fixed number of neighbours to filter
+        afterwards: faiss only returns the vectors within the threshold, however many
+        there are.
+
+        Args:
+            query_sentences: Sentences to search for in the database.
+            threshold: Minimum similarity score to consider a match.
+            limit: If given, keep at most this many matches per query.
+
+        Returns:
+            One result per query, with matches sorted by descending similarity.
+        """
+        query_vectors = self._encode_queries(query_sentences)
+        # faiss keeps inner products strictly greater than the radius. Use the closest
+        # smaller float so that `threshold` itself is included, like in `search`.
+        radius = float(np.nextafter(np.float32(threshold), np.float32(-np.inf)))
+        lims, scores, indices = self.index.range_search(  # type: ignore
+            query_vectors, radius
+        )
+
+        results: list[SearchResult] = []
+        for i, query in enumerate(query_sentences):
+            start, end = int(lims[i]), int(lims[i + 1])
+            order = np.argsort(-scores[start:end], kind="stable")[:limit]
+            results.append(
+                SearchResult.model_construct(
+                    query=query,
+                    matches=[
+                        SearchMatch.model_construct(
+                            sentence=self.sentences[int(indices[start + j])],
+                            score=float(scores[start + j]),
+                        )
+                        for j in order
+                    ],
+                )
+            )
+        return results
+
     def find_best(
         self,
         query_sentences: Sequence[str],
@@ -177,7 +425,8 @@ class VectorDatabase:
         """Find the best match for each query sentence.
 
         Returns the highest similarity match for each query sentence, or None if no
-        match is found above the threshold.
+        match is found above the threshold. Only the nearest neighbour is retrieved and
+        only matching sentences are read from the store.
 
         Args:
             query_sentences: Sentences to search for in the database.
@@ -187,17 +436,29 @@ class VectorDatabase:
             A list of SearchMatch objects (one per query) or None where no match was
             found.
         """
+        query_vectors = self._encode_queries(query_sentences)
+        scores, indices = self.index.search(query_vectors, 1)  # type: ignore
+
         return [
-            next(iter(result.matches), None)
-            for result in self.search(query_sentences, threshold=threshold, k=1)
+            SearchMatch.model_construct(
+                sentence=self.sentences[idx], score=float(score)
+            )
+            if idx >= 0 and score >= threshold
+            else None
+            for score, idx in zip(scores[:, 0], indices[:, 0])
         ]
 
+    def _encode_queries(self, query_sentences: Sequence[str]) -> emb.Matrix:
+        """Encode query sentences as a matrix for the index."""
+        return self.encoder.batch_encode(query_sentences, batch_size=self.batch_size)
+
     def save(self, db_dir: Path) -> None:
         """Save database to `db_dir`.
 
-        Saves two files:
+        Saves these files:
         - `VectorDatabase.INDEX_FILE`
         - `VectorDatabase.METADATA_FILE`
+        - `SentenceStore.OFFSETS_FILE` and `SentenceStore.DATA_FILE`
 
         Args:
             db_dir: Directory where to save the database files.
@@ -211,12 +472,13 @@ class VectorDatabase:
         metadata_path = db_dir / self.METADATA_FILE
 
         faiss.write_index(self.index, str(index_path))
+        self.sentences.save(db_dir)
 
         write_file_bytes(
             metadata_path,
             orjson.dumps({
                 "batch_size": self.batch_size,
                 "model_name": self.encoder.model_name,
-                "sentences": self.sentences,
+                "index": self.config.model_dump(mode="json"),
             }),
         )
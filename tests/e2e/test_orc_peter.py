@@ -6,7 +6,7 @@ import pytest
 
 from paper.util import git_root
 from paper.util.cmd import run, run_parallel_commands, title
-from tests.helpers import assertpath  # type: ignore[reportMissingImports]
+from tests.helpers import assertpath
 
 
 @pytest.mark.slow
@@ -0,0 +1,165 @@
+"""Local stand-in for the OpenAI Files and Batch APIs, to test batch jobs offline.
+
+Implements the subset of the API used by `paper.gpt.batch.BatchJob`: uploading files,
+creating and retrieving batches, and downloading file contents. Each chat request in a
+batch is answered by a `respond` function instead of a model.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Annotated, Any
+
+from fastapi import FastAPI, Form, HTTPException, UploadFile
+from fastapi.responses import Response
+
+type Responder = Callable[[dict[str, Any]], str | None]
+"""Gets the request body and returns the message content, or None for an error."""
+
+
+@dataclass
+class BatchServer:
+    """In-memory batch API. Batches complete after `polls_to_complete` retrievals."""
+
+    respond: Responder
+    polls_to_complete: int = 1
+    files: dict[str, bytes] = field(default_factory=dict[str, bytes])
+    batches: dict[str, dict[str, Any]] = field(
+        default_factory=dict[str, dict[str, Any]]
+    )
+    polls: dict[str, int] = field(default_factory=dict[str, int])
+    created: list[str] = field(default_factory=list[str])
+    """IDs of the batches created, in order."""
+
+    def app(self) -> FastAPI:
+        """Create application serving the API under `/v1`."""
+        app = FastAPI()
+
+        async def create_file(
+            file: UploadFile, purpose: Annotated[str, Form()]
+        ) -> dict[str, Any]:
+            return self._store_file(await file.read(), file.filename or "", purpose)
+
+        def file_content(file_id: str) -> Response:
+            if file_id not in self.files:
+                raise HTTPException(status_code=404, detail="File not found")
+            return Response(self.files[file_id], media_type="application/octet-stream")
+
+        def create_batch(body: dict[str, Any]) -> dict[str, Any]:
+            batch_id = f"batch-{len(self.batches)}"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": body["endpoint"],
+                "input_file_id": body["input_file_id"],
+                "completion_window": body["completion_window"],
+                "created_at": int(time.time()),
+                "status": "validating",
+            }
+            self.polls[batch_id] = 0
+            self.created.append(batch_id)
+            return self.batches[batch_id]
+
+        def list_batches() -> dict[str, Any]:
+            data = [self.batches[batch_id] for batch_id in reversed(self.created)]
+            return {"object": "list", "data": data, "has_more": False}
+
+        def retrieve_batch(batch_id: str) -> dict[str, Any]:
+            batch = self.batches[batch_id]
+            self.polls[batch_id] += 1
+            if batch["status"] != "completed":
+                if self.polls[batch_id] >= self.polls_to_complete:
+                    self._complete(batch)
+                else:
+                    batch["status"] = "in_progress"
+            return batch
+
+        app.add_api_route("/v1/files", create_file, methods=["POST"])
+        app.add_api_route("/v1/files/{file_id}/content", file_content, methods=["GET"])
+        app.add_api_route("/v1/batches", create_batch, methods=["POST"])
+        app.add_api_route("/v1/batches", list_batches, methods=["GET"])
+        app.add_api_route("/v1/batches/{batch_id}", retrieve_batch, methods=["GET"])
+        return app
+
+    def _store_file(
+        self, content: bytes, filename: str, purpose: str
+    ) -> dict[str, Any]:
+        file_id = f"file-{len(self.files)}"
+        self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def _complete(self, batch: dict[str, Any]) -> None:
+        """Answer every request in the batch and store the output and error files."""
+        outputs: list[str] = []
+        errors: list[str] = []
+
+        for line in self.files[batch["input_file_id"]].decode().splitlines():
+            request = json.loads(line)
+            content = self.respond(request["body"])
+            if content is None:
+                errors.append(
+                    json.dumps({
+                        "custom_id": request["custom_id"],
+                        "response": None,
+                        "error": {"code": "server_error", "message": "Failed"},
+                    })
+                )
+                continue
+
+            outputs.append(
+                json.dumps({
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": _completion(request["body"]["model"], content),
+                    },
+                    "error": None,
+                })
+            )
+
+        output = self._store_file("\n".join(outputs).encode(), "output", "batch_output")
+        batch["output_file_id"] = output["id"]
+        if errors:
+            error = self._store_file(
+                "\n".join(errors).encode(), "errors", "batch_output"
+            )
+            batch["error_file_id"] = error["id"]
+
+        batch["status"] = "completed"
+        batch["request_counts"] = {
+            "total": len(outputs) + len(errors),
+            "completed": len(outputs),
+            "failed": len(errors),
+        }
+
+
+def _completion(model: str, content: str) -> dict[str, Any]:
+    return {
+        "id": "chatcmpl-local",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": 1000,
+            "completion_tokens": 100,
+            "total_tokens": 1100,
+        },
+    }
@@ -0,0 +1,38 @@
+"""Fixtures to run the OpenAI client against a local stand-in server.
+
+Test modules define a `server` fixture with the stand-in to use, e.g. `BatchServer` or
+`RateLimitServer`. Its FastAPI app is served in a background thread for each test.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Generator
+from typing import TYPE_CHECKING
+
+import pytest
+
+from paper.gpt.run_gpt import OpenAIClient
+from tests.gpt.local_server import serve
+
+if TYPE_CHECKING:
+    from paper.gpt.response_cache import ResponseCache
+    from tests.gpt.local_server import AppServer, ClientFactory
+
+
+@pytest.fixture
+def base_url(server: AppServer) -> Generator[str]:
+    """Run `server` in a background thread. Yields the API base URL."""
+    with serve(server.app()) as url:
+        yield url
+
+
+@pytest.fixture
+def make_client(base_url: str) -> ClientFactory:
+    """Create new `OpenAIClient`s that send requests to the local server."""
+
+    def make(cache: ResponseCache | None = None) -> OpenAIClient:
+        return OpenAIClient(
+            api_key="key", model="gpt-4o-mini", seed=0, base_url=base_url, cache=cache
+        )
+
+    return make
@@ -0,0 +1,56 @@
+"""Run a local stand-in for the OpenAI API in a background thread.
+
+Used by the fixtures in `conftest.py`. The types are here so test modules can import
+them for their fixture annotations.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from collections.abc import Generator
+from typing import TYPE_CHECKING, Protocol
+
+import uvicorn
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
+    from paper.gpt.response_cache import ResponseCache
+    from paper.gpt.run_gpt import OpenAIClient
+
+
+class AppServer(Protocol):
+    """Stand-in server that builds a FastAPI app for its state."""
+
+    def app(self) -> FastAPI:
+        """FastAPI app that answers the API requests."""
+        ...
+
+
+class ClientFactory(Protocol):
+    """Creates a client for the local server with the given response cache."""
+
+    def __call__(self, cache: ResponseCache | None = None) -> OpenAIClient:
+        """Create the client."""
+        ...
+
+
+@contextlib.contextmanager
+def serve(app: FastAPI) -> Generator[str]:
+    """Run `app` in a background thread. Yields the API base URL."""
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.should_exit = True
+        thread.join()
@@ -0,0 +1,131 @@
+"""Local stand-in for the OpenAI chat API that enforces rate limits, to test clients.
+
+Requests and tokens are limited with token buckets that refill over `window` seconds.
+Every response has the `x-ratelimit-*` headers OpenAI sends. Requests over the limits get
+a 429 response with `retry-after-ms`.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class _Bucket:
+    limit: float
+    window: float
+    level: float = field(init=False)
+    updated: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self) -> None:
+        self.level = self.limit
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.window
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.limit, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reset(self) -> float:
+        """Seconds until the bucket is full again."""
+        return (self.limit - self.level) / self.rate
+
+
+@dataclass
+class RateLimitServer:
+    """Chat completions endpoint with request and token limits per `window` seconds.
+
+    Each request uses `tokens_per_request` tokens. Responses always have `content`.
+    """
+
+    request_limit: int
+    token_limit: int
+    window: float = 1
+    tokens_per_request: int = 100
+    content: str = "{}"
+    accepted: int = 0
+    rejected: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+    _requests: _Bucket = field(init=False)
+    _tokens: _Bucket = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Start with full buckets."""
+        self._requests = _Bucket(self.request_limit, self.window)
+        self._tokens = _Bucket(self.token_limit, self.window)
+
+    def app(self) -> FastAPI:
+        """Create application serving the API under `/v1`."""
+        app = FastAPI()
+
+        def chat(body: dict[str, Any]) -> JSONResponse:
+            with self._lock:
+                now = time.monotonic()
+                self._requests.refill(now)
+                self._tokens.refill(now)
+
+                allowed = (
+                    self._requests.level >= 1
+                    and self._tokens.level >= self.tokens_per_request
+                )
+                if allowed:
+                    self._requests.level -= 1
+                    self._tokens.level -= self.tokens_per_request
+                    self.accepted += 1
+                else:
+                    self.rejected += 1
+
+                headers = self._headers()
+                if not allowed:
+                    wait = max(
+                        (1 - self._requests.level) / self._requests.rate,
+                        (self.tokens_per_request - self._tokens.level)
+                        / self._tokens.rate,
+                    )
+                    headers["retry-after-ms"] = str(int(wait * 1000) + 1)
+
+            if not allowed:
+                return JSONResponse(
+                    {"error": {"message": "Rate limit reached", "type": "requests"}},
+                    status_code=429,
+                    headers=headers,
+                )
+            return JSONResponse(
+                _completion(body["model"], self.content), headers=headers
+            )
+
+        app.add_api_route("/v1/chat/completions", chat, methods=["POST"])
+        return app
+
+    def _headers(self) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        for kind, bucket in [("requests", self._requests), ("tokens", self._tokens)]:
+            headers[f"x-ratelimit-limit-{kind}"] = str(int(bucket.limit))
+            headers[f"x-ratelimit-remaining-{kind}"] = str(int(bucket.level))
+            headers[f"x-ratelimit-reset-{kind}"] = f"{int(bucket.reset() * 1000)}ms"
+        return headers
+
+
+def _completion(model: str, content: str) -> dict[str, Any]:
+    return {
+        "id": "chatcmpl-local",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 50, "completion_tokens": 50, "total_tokens": 100},
+    }
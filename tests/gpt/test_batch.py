@@ -0,0 +1,151 @@
+"""Tests for running requests with the Batch API against a local stand-in server."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from pydantic import BaseModel
+
+from paper.gpt.batch import BatchJob, BatchRequest, BatchState
+from paper.gpt.response_cache import ResponseCache
+from paper.gpt.run_gpt import GPTResult, _calc_cost
+from paper.util.serde import load_data_single, save_data
+from tests.gpt.batch_server import BatchServer
+
+if TYPE_CHECKING:
+    from tests.gpt.local_server import ClientFactory
+
+
+class Answer(BaseModel):
+    """Structured output for the requests."""
+
+    text: str
+
+
+def _respond(body: dict[str, Any]) -> str | None:
+    """Answer with the user prompt in upper case. Prompts with 'fail' are errors."""
+    prompt = body["messages"][1]["content"]
+    if "fail" in prompt:
+        return None
+    return json.dumps({"text": prompt.upper()})
+
+
+REQUESTS = [
+    BatchRequest(custom_id=str(i), system_prompt="system", user_prompt=prompt)
+    for i, prompt in enumerate(["first", "second", "please fail"])
+]
+COST = 0.5 * _calc_cost("gpt-4o-mini-2024-07-18", 1000, 100)
+
+
+@pytest.fixture
+def server() -> BatchServer:
+    return BatchServer(respond=_respond)
+
+
+@pytest.mark.asyncio
+async def test_run_batch(
+    server: BatchServer, make_client: ClientFactory, tmp_path: Path
+) -> None:
+    server.polls_to_complete = 2
+    client = make_client()
+
+    results = await client.run_batch(Answer, REQUESTS, tmp_path, poll_interval=0)
+
+    assert results == {
+        "0": GPTResult(result=Answer(text="FIRST"), cost=COST),
+        "1": GPTResult(result=Answer(text="SECOND"), cost=COST),
+        "2": GPTResult(result=None, cost=0),
+    }
+    assert server.created == ["batch-0"]
+    request = json.loads((tmp_path / "input.jsonl").read_text().splitlines()[0])
+    assert request["body"]["response_format"]["type"] == "json_schema"
+    assert (tmp_path / "errors.jsonl").exists()
+
+
+@pytest.mark.asyncio
+async def test_run_batch_resumes(
+    server: BatchServer, make_client: ClientFactory, tmp_path: Path
+) -> None:
+    server.polls_to_complete = 1_000_000
+    client = make_client()
+
+    task = asyncio.create_task(
+        client.run_batch(Answer, REQUESTS, tmp_path, poll_interval=0.01)
+    )
+    # The server runs in another thread, so there's no event to wait on.
+    while not server.polls.get("batch-0"):  # noqa: ASYNC110
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    server.polls_to_complete = 1
+    results = await make_client().run_batch(Answer, REQUESTS, tmp_path, poll_interval=0)
+
+    assert server.created == ["batch-0"]
+    assert results["0"].result == Answer(text="FIRST")
+
+    # Finished batches are read from the downloaded output without new requests.
+    polls = server.polls["batch-0"]
+    again = await make_client().run_batch(Answer, REQUESTS, tmp_path, poll_interval=0)
+    assert again == results
+    assert server.polls["batch-0"] == polls
+
+
+@pytest.mark.asyncio
+async def test_run_batch_finds_batch_without_saved_id(
+    server: BatchServer, make_client: ClientFactory, tmp_path: Path
+) -> None:
+    client = make_client()
+    await client.run_batch(Answer, REQUESTS, tmp_path, poll_interval=0)
+
+    # Interrupted after creating the batch, but before saving its ID.
+    state = load_data_single(tmp_path / BatchJob.STATE_FILE, BatchState)
+    save_data(
+        tmp_path / BatchJob.STATE_FILE,
+        state.model_copy(update={"batch_id": None, "status": None}),
+    )
+
+    results = await client.run_batch(Answer, REQUESTS, tmp_path, poll_interval=0)
+
+    assert server.created == ["batch-0"]
+    assert results["1"].result == Answer(text="SECOND")
+
+
+@pytest.mark.asyncio
+async def test_run_batch_new_requests_start_new_batch(
+    server: BatchServer, make_client: ClientFactory, tmp_path: Path
+) -> None:
+    client = make_client()
+
+    await client.run_batch(Answer, REQUESTS[:1], tmp_path, poll_interval=0)
+    results = await client.run_batch(Answer, REQUESTS[1:2], tmp_path, poll_interval=0)
+
+    assert server.created == ["batch-0", "batch-1"]
+    assert results == {"1": GPTResult(result=Answer(text="SECOND"), cost=COST)}
+
+
+@pytest.mark.asyncio
+async def test_run_batch_uses_cache(
+    server: BatchServer, make_client: ClientFactory, tmp_path: Path
+) -> None:
+    cache = ResponseCache(tmp_path / "llm.db")
+    client = make_client(cache)
+
+    await client.run_batch(Answer, REQUESTS, tmp_path / "first", poll_interval=0)
+    results = await client.run_batch(
+        Answer, REQUESTS, tmp_path / "second", poll_interval=0
+    )
+
+    # Only the failed request is submitted again.
+    assert len(server.created) == 2
+    assert results["0"] == GPTResult(result=Answer(text="FIRST"), cost=0)
+    assert results["2"].result is None
+
+    # The batch responses are also used by live requests.
+    live = await client.run(Answer, "system", "second")
+    assert live == GPTResult(result=Answer(text="SECOND"), cost=0)
@@ -0,0 +1,123 @@
+"""Unit tests for the best of N novelty probability."""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any
+
+import pytest
+
+from paper.gpt.evaluate_paper import GPTStructuredRaw
+from paper.gpt.novelty_utils import (
+    BestOfNMode,
+    get_novelty_best_of_n,
+    get_novelty_probability,
+)
+from paper.gpt.run_gpt import GPTResult
+from tests.helpers import FakeClient
+
+
+def _client(
+    ratings: Sequence[int | None],
+    probabilities: dict[str, float] | None = None,
+    *,
+    multi: bool = False,
+) -> FakeClient:
+    """Client that answers with `ratings` in order. None is an invalid response."""
+    pending = list(ratings)
+
+    def respond(_: str) -> dict[str, Any] | None:
+        rating = pending.pop(0)
+        return None if rating is None else {"rating": rating}
+
+    return FakeClient(respond, probabilities=probabilities, multi=multi)
+
+
+def _evaluation(label: int) -> GPTStructuredRaw:
+    return GPTStructuredRaw(
+        paper_summary="Summary",
+        supporting_evidence=[],
+        contradictory_evidence=[],
+        key_comparisons=[],
+        conclusion="Conclusion",
+        label=label,
+    )
+
+
+@pytest.mark.asyncio
+async def test_calls_mode_makes_one_request_per_rating() -> None:
+    client = _client([2, 3, 3, 4, 3])
+
+    result = await get_novelty_best_of_n(client, _evaluation(1), 5)
+
+    assert result.result == pytest.approx(0.75)
+    assert result.cost == 5
+    assert client.calls == ["run"] * 5
+
+
+@pytest.mark.asyncio
+async def test_n_mode_makes_one_request() -> None:
+    client = _client([2, 3, 3, 4, 3], multi=True)
+
+    result = await get_novelty_best_of_n(client, _evaluation(1), 5, mode=BestOfNMode.N)
+
+    assert result.result == pytest.approx(0.75)
+    assert result.cost == 1
+    assert client.calls == ["run_n"]
+
+
+@pytest.mark.asyncio
+async def test_n_mode_falls_back_to_separate_requests() -> None:
+    client = _client([1, None, 2])
+
+    result = await get_novelty_best_of_n(client, _evaluation(0), 3, mode=BestOfNMode.N)
+
+    # The invalid rating is skipped.
+    assert result.result == pytest.approx(3 / 8)
+    assert result.cost == 3
+    assert client.calls == ["run"] * 3
+
+
+@pytest.mark.asyncio
+async def test_logprobs_mode_uses_expected_rating() -> None:
+    client = _client([], {"1": 0, "2": 0, "3": 0.5, "4": 0.5})
+
+    result = await get_novelty_best_of_n(
+        client, _evaluation(1), 5, mode=BestOfNMode.LOGPROBS
+    )
+
+    assert result.result == pytest.approx(0.875)
+    assert client.calls == ["choice_probabilities"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("mode", "label", "expected"),
+    [
+        (BestOfNMode.CALLS, 0, 0.0),
+        (BestOfNMode.N, 1, 1.0),
+        (BestOfNMode.LOGPROBS, 1, 1.0),
+    ],
+)
+async def test_no_valid_ratings_uses_label(
+    mode: BestOfNMode, label: int, expected: float
+) -> None:
+    client = _client([None, None], multi=True)
+
+    result = await get_novelty_best_of_n(client, _evaluation(label), 2, mode=mode)
+
+    assert result.result == expected
+
+
+@pytest.mark.asyncio
+async def test_probability_reads_mode_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("BESTOFN", "3")
+    monkeypatch.setenv("BESTOFN_MODE", "n")
+    client = _client([4, 4, 3], multi=True)
+
+    result = await get_novelty_probability(
+        client, GPTResult(result=_evaluation(1), cost=0)
+    )
+
+    assert result.result == pytest.approx(11 / 12)
+    assert client.calls == ["run_n"]
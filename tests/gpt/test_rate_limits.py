@@ -0,0 +1,73 @@
+"""Tests for adapting the OpenAI client rate limits to a server that enforces them."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING
+
+import pytest
+from pydantic import BaseModel
+
+from tests.gpt.rate_limit_server import RateLimitServer
+
+if TYPE_CHECKING:
+    from paper.gpt.run_gpt import OpenAIClient
+    from tests.gpt.local_server import ClientFactory
+
+
+class Answer(BaseModel):
+    """Structured output for the requests."""
+
+    text: str
+
+
+@pytest.fixture
+def server() -> RateLimitServer:
+    # 10 requests per second. Much lower than the client's default limits.
+    return RateLimitServer(
+        request_limit=10, token_limit=1_000_000, content='{"text": "ok"}'
+    )
+
+
+async def _run_all(client: OpenAIClient, n: int) -> list[Answer | None]:
+    results = await asyncio.gather(
+        *(client.run(Answer, "system", f"request {i}") for i in range(n))
+    )
+    return [r.result for r in results]
+
+
+@pytest.mark.asyncio
+async def test_client_follows_server_limits(
+    server: RateLimitServer, make_client: ClientFactory
+) -> None:
+    client = make_client()
+    assert client.rate_limiter.request_limit > server.request_limit
+
+    # The first response tells the client the real limits.
+    await client.run(Answer, "system", "first")
+    assert client.rate_limiter.request_limit == server.request_limit
+
+    start = time.monotonic()
+    results = await _run_all(client, 30)
+    elapsed = time.monotonic() - start
+
+    assert results == [Answer(text="ok")] * 30
+    assert server.rejected <= 1
+    # 9 requests left in the bucket, then 10 per second.
+    assert elapsed == pytest.approx(2.1, abs=0.4)
+
+
+@pytest.mark.asyncio
+async def test_client_backs_off_after_rate_limit(
+    server: RateLimitServer, make_client: ClientFactory
+) -> None:
+    client = make_client()
+    initial_concurrency = client.rate_limiter.concurrency
+
+    # Nothing is known about the limits, so the first burst gets 429s.
+    results = await _run_all(client, 30)
+
+    assert results == [Answer(text="ok")] * 30
+    assert server.rejected > 0
+    assert client.rate_limiter.concurrency < initial_concurrency
@@ -0,0 +1,189 @@
+"""Unit tests for the persistent LLM response cache and its use in `LLMClient`."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from pydantic import BaseModel
+
+from paper.gpt.response_cache import CachedResponse, ResponseCache
+from paper.gpt.run_gpt import GPTResult
+from tests.helpers import FakeClient
+
+
+class Answer(BaseModel):
+    """Structured output for the fake client."""
+
+    text: str
+
+
+def _client(cache: ResponseCache | None, *, fail: bool = False) -> FakeClient:
+    """Client that answers with the user prompt, or always fails if `fail` is set."""
+    return FakeClient(lambda prompt: None if fail else {"text": prompt}, cache=cache)
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> ResponseCache:
+    return ResponseCache(tmp_path / "llm.db")
+
+
+def test_key_ignores_field_order() -> None:
+    assert ResponseCache.key({"a": 1, "b": "x"}) == ResponseCache.key({
+        "b": "x",
+        "a": 1,
+    })
+    assert ResponseCache.key({"a": 1}) != ResponseCache.key({"a": 2})
+
+
+def test_get_and_put(cache: ResponseCache) -> None:
+    assert cache.get("k") is None
+
+    cache.put("k", CachedResponse(content="hello", cost=0.5))
+
+    assert cache.get("k") == CachedResponse(content="hello", cost=0.5)
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.writes) == (1, 1, 1)
+
+
+def test_evicts_least_recently_used_over_entry_limit(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path / "llm.db", max_entries=2)
+    cache.put("a", CachedResponse(content="a", cost=0))
+    cache.put("b", CachedResponse(content="b", cost=0))
+    cache.get("a")
+    cache.put("c", CachedResponse(content="c", cost=0))
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats.evictions == 1
+
+
+def test_evicts_over_byte_limit(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path / "llm.db", max_bytes=10)
+    cache.put("a", CachedResponse(content="x" * 6, cost=0))
+    cache.put("b", CachedResponse(content="y" * 6, cost=0))
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+
+
+def test_replacing_entry_does_not_count_twice(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path / "llm.db", max_entries=2, max_bytes=10)
+    cache.put("a", CachedResponse(content="x" * 6, cost=0))
+    cache.put("a", CachedResponse(content="y" * 6, cost=0))
+    cache.put("b", CachedResponse(content="z" * 4, cost=0))
+
+    assert cache.stats.evictions == 0
+    assert cache.get("a") == CachedResponse(content="y" * 6, cost=0)
+
+
+def test_limits_include_entries_from_previous_runs(tmp_path: Path) -> None:
+    path = tmp_path / "llm.db"
+    cache = ResponseCache(path)
+    cache.put("a", CachedResponse(content="a", cost=0))
+    cache.put("b", CachedResponse(content="b", cost=0))
+    cache.close()
+
+    reopened = ResponseCache(path, max_entries=2)
+    reopened.put("c", CachedResponse(content="c", cost=0))
+
+    assert len(reopened) == 2
+    assert reopened.stats.evictions == 1
+
+
+def test_read_only(tmp_path: Path) -> None:
+    path = tmp_path / "llm.db"
+    with pytest.raises(FileNotFoundError):
+        ResponseCache(path, read_only=True)
+
+    writable = ResponseCache(path)
+    writable.put("a", CachedResponse(content="a", cost=0))
+    writable.close()
+
+    cache = ResponseCache(path, read_only=True)
+    cache.put("b", CachedResponse(content="b", cost=0))
+
+    assert cache.get("a") == CachedResponse(content="a", cost=0)
+    assert cache.get("b") is None
+    assert cache.stats.writes == 0
+
+
+def test_from_env(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("LLM_CACHE", raising=False)
+    assert ResponseCache.from_env() is None
+
+    monkeypatch.setenv("LLM_CACHE", str(tmp_path / "llm.db"))
+    monkeypatch.setenv("LLM_CACHE_MAX_MB", "1.5")
+    cache = ResponseCache.from_env()
+
+    assert cache is not None
+    assert cache.max_bytes == int(1.5 * 1024**2)
+    assert not cache.read_only
+
+
+@pytest.mark.asyncio
+async def test_client_run_uses_cache(cache: ResponseCache) -> None:
+    client = _client(cache)
+
+    first = await client.run(Answer, "system", "hello")
+    second = await client.run(Answer, "system", "hello")
+
+    assert first == GPTResult(result=Answer(text="hello"), cost=1)
+    assert second == GPTResult(result=Answer(text="hello"), cost=0)
+    assert client.prompts == ["hello"]
+
+    # A cache shared between clients answers the same request in a new run.
+    rerun = _client(cache)
+    assert (await rerun.run(Answer, "system", "hello")).result == Answer(text="hello")
+    assert rerun.prompts == []
+
+
+@pytest.mark.asyncio
+async def test_client_cache_key_includes_parameters(cache: ResponseCache) -> None:
+    client = _client(cache)
+
+    await client.run(Answer, "system", "hello")
+    await client.run(Answer, "system", "hello", temperature=0.5)
+    await client.run(Answer, "system", "hello", seed=1)
+    await client.run(Answer, "other system", "hello")
+    await client.plain("system", "hello")
+    await client.plain("system", "hello", search_level="low")
+    # Same as the default temperature and seed.
+    await client.run(Answer, "system", "hello", temperature=0, seed=0)
+
+    assert len(client.calls) == 6
+    assert cache.stats.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_client_plain_uses_cache(cache: ResponseCache) -> None:
+    client = _client(cache)
+
+    await client.plain("system", "hello")
+    result = await client.plain("system", "hello")
+
+    assert result == GPTResult(result="HELLO", cost=0)
+    assert client.prompts == ["hello"]
+
+
+@pytest.mark.asyncio
+async def test_client_does_not_cache_failures(cache: ResponseCache) -> None:
+    client = _client(cache, fail=True)
+
+    await client.run(Answer, "system", "hello")
+    await client.run(Answer, "system", "hello")
+
+    assert client.prompts == ["hello", "hello"]
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_client_without_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("LLM_CACHE", raising=False)
+    client = _client(None)
+
+    await client.run(Answer, "system", "hello")
+    await client.run(Answer, "system", "hello")
+
+    assert client.cache is None
+    assert client.prompts == ["hello", "hello"]
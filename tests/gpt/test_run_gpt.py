@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import math
 import os
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -18,6 +19,7 @@ from paper.gpt.run_gpt import (
     LLMClient,
     OpenAIClient,
     _calc_cost,
+    _choice_distribution,
     _find_best_match,
     count_tokens,
     get_rate_limiter,
@@ -362,6 +364,11 @@ class TestUtilityFunctions:
         assert count_tokens(result) <= max_tokens
 
 
+def test_choice_distribution_without_choices() -> None:
+    """No probabilities when none of the top tokens are choices."""
+    assert _choice_distribution([("The", -0.1), ("A", -2)], ["1", "2"]) is None
+
+
 class TestModelConfiguration:
     """Test model configuration and validation."""
 
@@ -695,6 +702,125 @@ class TestLLMClientMethods:
                 assert result.result == "Gemini search response"
                 assert result.cost > 0
 
+    @pytest.mark.asyncio
+    async def test_openai_run_n_single_request(self) -> None:
+        """Test OpenAI client run_n asks for all choices in one request."""
+        mock_completion = MagicMock()
+        mock_completion.usage.prompt_tokens = 100
+        mock_completion.usage.completion_tokens = 150
+        mock_completion.choices = [MagicMock() for _ in range(3)]
+        mock_completion.choices[0].message.parsed = LLMTestModel(message="a", value=1)
+        mock_completion.choices[1].message.parsed = None
+        mock_completion.choices[2].message.parsed = LLMTestModel(message="b", value=2)
+
+        with patch("paper.gpt.run_gpt.AsyncOpenAI") as mock_openai:
+            mock_client = AsyncMock()
+            mock_openai.return_value = mock_client
+            mock_client.beta.chat.completions.parse = AsyncMock(
+                return_value=mock_completion
+            )
+
+            client = OpenAIClient(api_key="test-key", model="gpt-4o-mini", seed=42)
+            client.client = mock_client
+
+            with patch.object(client.rate_limiter, "limit") as mock_limiter:
+                mock_limiter.return_value.__aenter__ = AsyncMock(
+                    return_value=AsyncMock()
+                )
+                mock_limiter.return_value.__aexit__ = AsyncMock(return_value=None)
+
+                result = await client.run_n(
+                    LLMTestModel, "You are a helpful assistant", "Generate", 3
+                )
+
+                assert result.result == [
+                    LLMTestModel(message="a", value=1),
+                    LLMTestModel(message="b", value=2),
+                ]
+                assert result.cost > 0
+                mock_client.beta.chat.completions.parse.assert_awaited_once()
+                call = mock_client.beta.chat.completions.parse.call_args
+                assert call.kwargs["n"] == 3
+
+    @pytest.mark.asyncio
+    async def test_openai_choice_probabilities(self) -> None:
+        """Test OpenAI client choice_probabilities reads the first token logprobs."""
+        mock_completion = MagicMock()
+        mock_completion.usage.prompt_tokens = 100
+        mock_completion.usage.completion_tokens = 1
+        top = [("4", 0.6), (" 3", 0.3), ("The", 0.1)]
+        mock_completion.choices = [MagicMock()]
+        mock_completion.choices[0].logprobs.content = [MagicMock()]
+        mock_completion.choices[0].logprobs.content[0].top_logprobs = [
+            MagicMock(token=token, logprob=math.log(prob)) for token, prob in top
+        ]
+
+        with patch("paper.gpt.run_gpt.AsyncOpenAI") as mock_openai:
+            mock_client = AsyncMock()
+            mock_openai.return_value = mock_client
+            mock_client.chat.completions.create = AsyncMock(
+                return_value=mock_completion
+            )
+
+            client = OpenAIClient(api_key="test-key", model="gpt-4o-mini", seed=42)
+            client.client = mock_client
+
+            with patch.object(client.rate_limiter, "limit") as mock_limiter:
+                mock_limiter.return_value.__aenter__ = AsyncMock(
+                    return_value=AsyncMock()
+                )
+                mock_limiter.return_value.__aexit__ = AsyncMock(return_value=None)
+
+                result = await client.choice_probabilities(
+                    "You are a helpful assistant", "Rate", ["1", "2", "3", "4"]
+                )
+
+                assert result.result == pytest.approx({
+                    "1": 0,
+                    "2": 0,
+                    "3": 1 / 3,
+                    "4": 2 / 3,
+                })
+                call = mock_client.chat.completions.create.call_args
+                assert call.kwargs["logprobs"] is True
+                assert call.kwargs["max_tokens"] == 1
+
+    @pytest.mark.asyncio
+    async def test_gemini_run_n_single_request(self) -> None:
+        """Test Gemini client run_n asks for all candidates in one request."""
+        mock_response = MagicMock()
+        mock_response.usage_metadata.prompt_token_count = 100
+        mock_response.usage_metadata.candidates_token_count = 150
+        texts = ['{"message": "a", "value": 1}', "invalid"]
+        mock_response.candidates = [MagicMock() for _ in texts]
+        for candidate, text in zip(mock_response.candidates, texts, strict=True):
+            candidate.content.parts = [MagicMock(text=text, thought=None)]
+
+        with patch("paper.gpt.run_gpt.genai.Client") as mock_genai:
+            mock_client = AsyncMock()
+            mock_genai.return_value = mock_client
+            mock_client.aio.models.generate_content = AsyncMock(
+                return_value=mock_response
+            )
+
+            client = GeminiClient(api_key="test-key", model="gemini-2.0-flash", seed=42)
+            client.client = mock_client
+
+            with patch.object(client.rate_limiter, "limit") as mock_limiter:
+                mock_limiter.return_value.__aenter__ = AsyncMock(
+                    return_value=AsyncMock()
+                )
+                mock_limiter.return_value.__aexit__ = AsyncMock(return_value=None)
+
+                result = await client.run_n(
+                    LLMTestModel, "You are a helpful assistant", "Generate", 2
+                )
+
+                assert result.result == [LLMTestModel(message="a", value=1)]
+                mock_client.aio.models.generate_content.assert_awaited_once()
+                call = mock_client.aio.models.generate_content.call_args
+                assert call.kwargs["config"].candidate_count == 2
+
     def test_gpt_result_operations(self) -> None:
         """Test GPTResult utility operations."""
         # Test pure
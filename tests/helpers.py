@@ -1,8 +1,17 @@
 """Helpers for unit tests."""
 
+import zlib
+from collections.abc import Callable, Mapping, Sequence
 from pathlib import Path
+from typing import Any, Literal, Self, override
 
+import numpy as np
+import numpy.typing as npt
 import pytest
+from pydantic import BaseModel
+
+from paper.gpt.response_cache import ResponseCache
+from paper.gpt.run_gpt import GPTResult, LLMClient
 
 
 def assertpath(path: Path) -> None:
@@ -11,3 +20,158 @@ def assertpath(path: Path) -> None:
         return
 
     pytest.fail(f"Path doesn't exist: '{path}'")
+
+
+def hash_vector(text: str, dimensions: int) -> np.ndarray:
+    """Deterministic pseudo-random vector for `text`. Not normalised."""
+    rng = np.random.default_rng(zlib.crc32(text.encode()))
+    return rng.standard_normal(dimensions).astype(np.float32)
+
+
+class FakeEncoder:
+    """Stand-in for `emb.Encoder` that records each batch it receives.
+
+    If `table` is given, vectors are looked up from it. Otherwise, each text gets a
+    vector from `hash_vector`, normalised if `normalise` is set.
+    """
+
+    model_name = "fake"
+
+    def __init__(
+        self,
+        table: Mapping[str, npt.ArrayLike] | None = None,
+        *,
+        dimensions: int = 8,
+        normalise: bool = False,
+    ) -> None:
+        self.table = (
+            None
+            if table is None
+            else {text: np.asarray(v, dtype=np.float32) for text, v in table.items()}
+        )
+        self.dimensions = dimensions
+        self.normalise = normalise
+        self.calls: list[list[str]] = []
+
+    def encode(self, text: str) -> np.ndarray:
+        """Vector for a single text. Not recorded in `calls`."""
+        if self.table is not None:
+            return self.table[text]
+
+        vector = hash_vector(text, self.dimensions)
+        if self.normalise:
+            vector /= np.linalg.norm(vector)
+        return vector
+
+    def batch_encode(self, texts: Sequence[str], *_: Any, **__: Any) -> np.ndarray:
+        """Vector for each text."""
+        self.calls.append(list(texts))
+        return np.vstack([self.encode(text) for text in texts])
+
+    def close(self) -> None:
+        """Nothing to clean up."""
+
+
+class FakeClient(LLMClient):
+    """`LLMClient` that answers without calling an API and records every call.
+
+    Structured requests are answered by `respond`, which gets the user prompt and
+    returns the output model's fields, or None for an invalid response. Plain requests
+    are answered with the upper-cased user prompt. Each API call costs 1.
+
+    The name of each API method called is recorded in `calls`, and its user prompt in
+    `prompts`.
+    """
+
+    def __init__(
+        self,
+        respond: Callable[[str], dict[str, Any] | None],
+        *,
+        cache: ResponseCache | None = None,
+        probabilities: dict[str, float] | None = None,
+        multi: bool = False,
+    ) -> None:
+        """Create client.
+
+        Args:
+            respond: Builds the structured output fields from the user prompt.
+            cache: Response cache. If None, uses `ResponseCache.from_env`.
+            probabilities: Answer for `choice_probabilities`.
+            multi: If True, `run_n` makes a single call for all N outputs. Otherwise,
+                it uses the default of one call per output.
+        """
+        super().__init__(api_key="key", model="fake", seed=0, cache=cache)
+        self.respond = respond
+        self.probabilities = probabilities
+        self.multi = multi
+        self.calls: list[str] = []
+        self.prompts: list[str] = []
+
+    @classmethod
+    def from_env(cls, *_: object, **__: object) -> Self:
+        """Not used."""
+        raise NotImplementedError
+
+    def _record(self, method: str, user_prompt: str) -> None:
+        self.calls.append(method)
+        self.prompts.append(user_prompt)
+
+    def _parse[T: BaseModel](self, class_: type[T], user_prompt: str) -> T | None:
+        fields = self.respond(user_prompt)
+        return None if fields is None else class_.model_validate(fields)
+
+    @override
+    async def _run[T: BaseModel](
+        self,
+        class_: type[T],
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: int | None = None,
+        temperature: float | None = None,
+        seed: int | None = None,
+    ) -> GPTResult[T | None]:
+        self._record("run", user_prompt)
+        return GPTResult(result=self._parse(class_, user_prompt), cost=1)
+
+    @override
+    async def _run_n[T: BaseModel](
+        self,
+        class_: type[T],
+        system_prompt: str,
+        user_prompt: str,
+        n: int,
+        temperature: float | None,
+        seed: int | None,
+    ) -> GPTResult[list[T]]:
+        if not self.multi:
+            return await super()._run_n(
+                class_, system_prompt, user_prompt, n, temperature, seed
+            )
+
+        self._record("run_n", user_prompt)
+        results = [self._parse(class_, user_prompt) for _ in range(n)]
+        return GPTResult(result=[r for r in results if r is not None], cost=1)
+
+    @override
+    async def _choice_probabilities(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        choices: Sequence[str],
+        temperature: float | None,
+    ) -> GPTResult[dict[str, float] | None]:
+        self._record("choice_probabilities", user_prompt)
+        return GPTResult(result=self.probabilities, cost=1)
+
+    @override
+    async def _plain(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: int | None = None,
+        search_level: Literal["low", "medium", "high"] | None = None,
+        temperature: float | None = None,
+        seed: int | None = None,
+    ) -> GPTResult[str | None]:
+        self._record("plain", user_prompt)
+        return GPTResult(result=user_prompt.upper(), cost=1)
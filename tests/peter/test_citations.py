@@ -0,0 +1,71 @@
+"""Unit tests for the PETER citation graph that don't require loading a model."""
+
+from types import SimpleNamespace
+from typing import Any, cast
+
+from paper import embedding as emb
+from paper.peerread import ContextPolarity
+from paper.peter.citations import Graph
+from tests.helpers import FakeEncoder
+
+TITLE_VECTORS = {
+    "main paper": [1.0, 0.0],
+    "close reference": [0.9, 0.1],
+    "far reference": [0.1, 0.9],
+    "other paper": [0.0, 1.0],
+}
+
+
+def _reference(title: str, polarity: ContextPolarity) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=title,
+        title=title,
+        title_peer=title.upper(),
+        abstract="",
+        polarity=polarity,
+        year=None,
+        authors=None,
+        venue=None,
+        citation_count=None,
+        reference_count=None,
+        influential_citation_count=None,
+        corpus_id=None,
+        url=None,
+        contexts=[],
+    )
+
+
+def test_from_papers_encodes_unique_titles_once() -> None:
+    close = _reference("close reference", ContextPolarity.POSITIVE)
+    far = _reference("far reference", ContextPolarity.POSITIVE)
+    papers = [
+        SimpleNamespace(id="p1", title="Main paper!", references=[far, close]),
+        SimpleNamespace(id="p2", title="Other paper", references=[close]),
+    ]
+    encoder = FakeEncoder(TITLE_VECTORS)
+
+    graph = Graph.from_papers(cast(emb.Encoder, encoder), cast(Any, papers))
+
+    assert len(encoder.calls) == 1
+    assert sorted(encoder.calls[0]) == sorted(TITLE_VECTORS)
+
+    result = graph.query("p1", k=2)
+    assert [c.title for c in result.positive] == ["close reference", "far reference"]
+    assert result.positive[0].score > result.positive[1].score
+    assert result.negative == []
+
+
+def test_merge_matches_building_all_papers() -> None:
+    close = _reference("close reference", ContextPolarity.POSITIVE)
+    far = _reference("far reference", ContextPolarity.NEGATIVE)
+    old = SimpleNamespace(id="p1", title="Main paper", references=[close])
+    old_updated = SimpleNamespace(id="p1", title="Main paper", references=[close, far])
+    new = SimpleNamespace(id="p2", title="Other paper", references=[far])
+    encoder = cast(emb.Encoder, FakeEncoder(TITLE_VECTORS))
+
+    merged = Graph.from_papers(encoder, cast(Any, [old])).merge(
+        Graph.from_papers(encoder, cast(Any, [old_updated, new]))
+    )
+    full = Graph.from_papers(encoder, cast(Any, [old_updated, new]))
+
+    assert merged == full
@@ -0,0 +1,124 @@
+"""Unit tests for the PETER semantic graph that don't require loading a model."""
+
+from pathlib import Path
+from typing import cast
+
+import numpy as np
+import pytest
+
+from paper import embedding as emb
+from paper.peter.semantic import Graph, QueryResult, _Components, _PaperRelated
+from tests.helpers import FakeEncoder
+
+NODE_VECTORS = {
+    "background a": [1.0, 0.0, 0.0],
+    "background b": [0.8, 0.6, 0.0],
+    "background c": [0.0, 0.6, 0.8],
+    "target a": [0.0, 0.0, 1.0],
+    "target b": [0.6, 0.0, 0.8],
+    "target c": [1.0, 0.0, 0.0],
+}
+QUERY_VECTORS = {
+    "query x": [1.0, 0.1, 0.0],
+    "query y": [0.0, 0.2, 1.0],
+    "query z": [0.5, 0.5, 0.5],
+}
+
+
+def _encoder() -> FakeEncoder:
+    return FakeEncoder(NODE_VECTORS | QUERY_VECTORS)
+
+
+def _paper(name: str) -> _PaperRelated:
+    return _PaperRelated(
+        title=f"paper {name}",
+        abstract="",
+        paper_id=name,
+        background=f"background {name}",
+        target=f"target {name}",
+    )
+
+
+@pytest.fixture
+def graph() -> Graph:
+    encoder = cast(emb.Encoder, _encoder())
+    papers = [_paper(name) for name in "abc"]
+
+    return Graph(
+        encoder=encoder,
+        backgrounds=_Components.from_node_paper(
+            encoder, {p.background: p for p in papers}
+        ),
+        targets=_Components.from_node_paper(encoder, {p.target: p for p in papers}),
+    )
+
+
+def test_query_many_matches_query(graph: Graph) -> None:
+    backgrounds = ["query x", "query y", "query z"]
+    targets = ["query y", "query x", "query z"]
+
+    many = graph.query_many(backgrounds, targets, k=1)
+    single = [graph.query(b, t, k=1) for b, t in zip(backgrounds, targets)]
+
+    assert many == single
+    assert any(result.backgrounds or result.targets for result in many)
+
+
+def test_query_threshold_many_keeps_targets(graph: Graph) -> None:
+    many = graph.query_threshold_many(
+        ["query x", "query z"], ["query x", "query z"], threshold=0.9, retrieved_k=1
+    )
+    single = [
+        graph.query_threshold(q, q, threshold=0.9, retrieved_k=1)
+        for q in ["query x", "query z"]
+    ]
+
+    assert many == single
+    assert [r.paper_id for r in many[0].backgrounds] == ["a"]
+    assert [r.paper_id for r in many[0].targets] == ["c"]
+    assert not many[1].backgrounds
+    assert not many[1].targets
+
+
+def test_chunked_memory_mapped_build(tmp_path: Path) -> None:
+    encoder = cast(emb.Encoder, _encoder())
+    node_to_paper = {p.background: p for p in map(_paper, "abc")}
+
+    in_memory = _Components.from_node_paper(encoder, node_to_paper)
+    mapped = _Components.from_node_paper(
+        encoder, node_to_paper, matrix_file=tmp_path / "m.npy", chunk_size=2
+    )
+
+    assert isinstance(mapped.embeddings, np.memmap)
+    assert mapped.nodes == in_memory.nodes
+    np.testing.assert_allclose(mapped.embeddings, in_memory.embeddings, rtol=1e-6)
+    np.testing.assert_allclose(np.linalg.norm(mapped.embeddings, axis=1), 1, rtol=1e-6)
+
+
+def test_with_nodes_encodes_only_new_nodes() -> None:
+    encoder = _encoder()
+    a, b, c = map(_paper, "abc")
+    components = _Components.from_node_paper(
+        cast(emb.Encoder, encoder), {a.background: a, b.background: b}
+    )
+    encoder.calls.clear()
+
+    b_updated = b.model_copy(update={"title": "paper b v2"})
+    updated = components.with_nodes(
+        cast(emb.Encoder, encoder), {b.background: b_updated, c.background: c}
+    )
+    full = _Components.from_node_paper(
+        cast(emb.Encoder, encoder), {p.background: p for p in (a, b, c)}
+    )
+
+    assert encoder.calls[0] == [c.background]
+    assert updated.nodes == [a.background, b.background, c.background]
+    assert updated.node_to_paper[b.background].title == "paper b v2"
+    np.testing.assert_allclose(updated.embeddings, full.embeddings, rtol=1e-6)
+
+
+def test_results_match_validated_models(graph: Graph) -> None:
+    (result,) = graph.query_many(["query x"], ["query x"], k=1)
+
+    assert result.backgrounds or result.targets
+    assert QueryResult.model_validate_json(result.model_dump_json()) == result
@@ -0,0 +1 @@
+"""Tests for the SciMON baseline graphs."""
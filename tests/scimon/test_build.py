@@ -0,0 +1,134 @@
+"""Unit tests for building the SciMON graphs sequentially and in parallel."""
+
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, cast
+
+import pytest
+
+from paper import embedding as emb
+from paper import gpt
+from paper import semantic_scholar as s2
+from paper.baselines.scimon import graph
+from paper.gpt.model import PaperTermRelation
+from tests.helpers import FakeEncoder
+
+
+@dataclass
+class Annotated:
+    """Fields of `gpt.PaperAnnotated` used to build the KG and semantic graphs."""
+
+    terms: gpt.PaperTerms
+    background: str
+
+    def target_terms(self) -> list[str]:
+        """Unique tasks."""
+        return sorted(set(self.terms.tasks))
+
+
+@dataclass
+class Reference:
+    """Fields of `s2.S2Reference` used to build the citation graph."""
+
+    title: str
+    title_peer: str
+    paper_id: str
+
+
+@dataclass
+class Paper:
+    """Fields of `s2.PaperWithS2Refs` used to build the citation graph."""
+
+    id: str
+    title: str
+    references: list[Reference] = field(default_factory=list[Reference])
+
+
+ANNOTATED = [
+    Annotated(
+        terms=gpt.PaperTerms(
+            tasks=[f"task {i}"],
+            methods=[],
+            metrics=[],
+            resources=[],
+            relations=[
+                PaperTermRelation(head=f"method {i}", tail=f"task {i}"),
+                PaperTermRelation(head="shared method", tail=f"task {i}"),
+            ],
+        ),
+        background=f"background {i}",
+    )
+    for i in range(5)
+]
+PAPERS = [
+    Paper(
+        id=str(i),
+        title=f"Paper {i}",
+        references=[Reference(f"Cited {j}", f"cited {j}", f"c{j}") for j in range(3)],
+    )
+    for i in range(3)
+]
+
+
+def _build(output_dir: Path, *, parallel: bool) -> None:
+    annotated = cast(Sequence[gpt.PaperAnnotated], ANNOTATED)
+    papers = cast(Sequence[s2.PaperWithS2Refs], PAPERS)
+    if parallel:
+        graph.Graph.build_parallel(
+            FakeEncoder.model_name, annotated, papers, output_dir
+        )
+    else:
+        graph.Graph.build(
+            cast(emb.Encoder, FakeEncoder(normalise=True)),
+            annotated,
+            papers,
+            output_dir,
+        )
+
+
+def _run_workers_in_threads(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Run the build workers in threads so they can use the fake encoder."""
+
+    def executor(max_workers: int, **_: Any) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers)
+
+    monkeypatch.setattr(graph, "ProcessPoolExecutor", executor)
+
+
+def test_build_parallel_matches_sequential(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def load(_: graph._EncoderSpec) -> FakeEncoder:
+        return FakeEncoder(normalise=True)
+
+    _run_workers_in_threads(monkeypatch)
+    monkeypatch.setattr(graph._EncoderSpec, "load", load)
+    monkeypatch.setattr(graph, "setup_logging", lambda: None)
+
+    _build(tmp_path / "sequential", parallel=False)
+    _build(tmp_path / "parallel", parallel=True)
+
+    sequential = sorted(p.name for p in (tmp_path / "sequential").iterdir())
+    assert sequential == sorted(p.name for p in (tmp_path / "parallel").iterdir())
+    assert "kg_embeddings.npy" in sequential
+    for name in sequential:
+        expected = (tmp_path / "sequential" / name).read_bytes()
+        assert (tmp_path / "parallel" / name).read_bytes() == expected, name
+
+
+def test_build_parallel_raises_worker_error(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def fail(_: graph._EncoderSpec) -> FakeEncoder:
+        raise RuntimeError("model not found")
+
+    _run_workers_in_threads(monkeypatch)
+    monkeypatch.setattr(graph._EncoderSpec, "load", fail)
+    monkeypatch.setattr(graph, "setup_logging", lambda: None)
+
+    with pytest.raises(RuntimeError, match="model not found"):
+        _build(tmp_path, parallel=True)
+
+    assert not (tmp_path / graph.Graph.METADATA_FILENAME).exists()
@@ -0,0 +1,124 @@
+"""Unit tests for the SciMON KG graph with lazily loaded embeddings."""
+
+from pathlib import Path
+from typing import cast
+
+import numpy as np
+import pytest
+
+from paper import embedding as emb
+from paper import gpt
+from paper.baselines.scimon import kg
+from paper.gpt.model import PaperTermRelation
+from tests.helpers import FakeEncoder
+
+
+def _terms(*relations: tuple[str, str]) -> gpt.PaperTerms:
+    return gpt.PaperTerms(
+        tasks=[],
+        methods=[],
+        metrics=[],
+        resources=[],
+        relations=[PaperTermRelation(head=h, tail=t) for h, t in relations],
+    )
+
+
+TERMS = [
+    _terms(("Neural Networks", "image classification"), ("BERT", "parsing")),
+    _terms(("neural networks!", "speech recognition")),
+]
+
+
+@pytest.fixture
+def encoder() -> FakeEncoder:
+    return FakeEncoder({
+        "neural networks": np.array([1, 0, 0], dtype=np.float32),
+        "bert": np.array([0, 1, 0], dtype=np.float32),
+        "bert model": np.array([0.2, 1, 0], dtype=np.float32),
+        "unknown term": np.array([0, 0, 1], dtype=np.float32),
+    })
+
+
+def test_exact_query_without_embeddings(encoder: FakeEncoder) -> None:
+    graph = kg.Graph.from_terms(cast(emb.Encoder, encoder), TERMS, embed=False)
+
+    result = graph.query("neural networks")
+
+    assert result.nodes == ["image classification", "speech recognition"]
+    assert not graph.has_embeddings
+    assert encoder.calls == []
+    assert graph.to_data().embeddings is None
+
+
+def test_fallback_encodes_missing_embeddings(encoder: FakeEncoder) -> None:
+    graph = kg.Graph.from_terms(cast(emb.Encoder, encoder), TERMS, embed=False)
+
+    assert graph.query("bert").nodes == ["parsing"]
+    assert graph.query("bert model").nodes == []
+
+    result = graph.query("bert model", fallback=True)
+
+    assert result == kg.QueryResult(match="bert", nodes=["parsing"])
+    assert encoder.calls == [["bert model"], ["neural networks", "bert"]]
+
+
+def test_sidecar_loaded_on_first_fallback(
+    encoder: FakeEncoder, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    built = kg.Graph.from_terms(cast(emb.Encoder, encoder), TERMS)
+    data = built.to_data(tmp_path / "kg_embeddings.npy")
+    assert data.embeddings is not None
+    assert data.embeddings.file == "kg_embeddings.npy"
+
+    loads: list[Path | None] = []
+    to_matrix = emb.MatrixData.to_matrix
+
+    def counting_to_matrix(
+        self: emb.MatrixData, base_dir: Path | None = None
+    ) -> emb.Matrix:
+        loads.append(base_dir)
+        return to_matrix(self, base_dir)
+
+    monkeypatch.setattr(emb.MatrixData, "to_matrix", counting_to_matrix)
+
+    graph = data.to_graph(cast(emb.Encoder, encoder), tmp_path)
+    assert graph.query("bert").nodes == ["parsing"]
+    assert loads == []
+
+    fallback = graph.query("bert model", fallback=True)
+    graph.query("unknown term", fallback=True)
+
+    assert loads == [tmp_path]
+    assert fallback == kg.QueryResult(match="bert", nodes=["parsing"])
+
+
+@pytest.mark.parametrize("embed", [True, False])
+def test_fallback_uses_cosine_with_unnormalised_vectors(embed: bool) -> None:
+    encoder = FakeEncoder({
+        "long": np.array([10, 0], dtype=np.float32),
+        "diagonal": np.array([1, 1], dtype=np.float32),
+        "query": np.array([1, 0.9], dtype=np.float32),
+    })
+    terms = [_terms(("long", "a"), ("diagonal", "b"))]
+    graph = kg.Graph.from_terms(cast(emb.Encoder, encoder), terms, embed=embed)
+
+    # "long" has the larger dot product with the query, but "diagonal" is closer.
+    result = graph.query("query", fallback=True)
+
+    assert result == kg.QueryResult(match="diagonal", nodes=["b"])
+
+
+def test_fallback_normalises_sidecar_embeddings(tmp_path: Path) -> None:
+    encoder = FakeEncoder({
+        "query": np.array([1, 0.9], dtype=np.float32),
+    })
+    data = kg.Graph(
+        nodes=["long", "diagonal"],
+        head_to_tails={"long": ["a"], "diagonal": ["b"]},
+        encoder=cast(emb.Encoder, encoder),
+        embeddings=np.array([[10, 0], [1, 1]], dtype=np.float32),
+    ).to_data(tmp_path / "kg_embeddings.npy", emb.StorageDtype.FLOAT16)
+
+    graph = data.to_graph(cast(emb.Encoder, encoder), tmp_path)
+
+    assert graph.query("query", fallback=True).match == "diagonal"
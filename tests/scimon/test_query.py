@@ -0,0 +1,108 @@
+"""Unit tests for batched SciMON graph queries that don't require loading a model."""
+
+from types import SimpleNamespace
+from typing import Any, cast
+
+import numpy as np
+import pytest
+
+from paper import embedding as emb
+from paper.baselines.scimon import citations, semantic
+from paper.baselines.scimon.graph import Graph
+from tests.helpers import (
+    FakeEncoder,
+    hash_vector,
+)
+
+DIMENSIONS = 16
+
+
+def _vector(text: str) -> np.ndarray:
+    return hash_vector(text, DIMENSIONS)
+
+
+NODES = [f"node {i}" for i in range(20)]
+QUERIES = [
+    ("background a", "method x", "task y"),
+    ("background b", "method z", "task y"),
+    ("background a", "method x", "task y"),
+]
+
+
+@pytest.fixture
+def encoder() -> FakeEncoder:
+    return FakeEncoder(dimensions=DIMENSIONS)
+
+
+@pytest.fixture
+def semantic_graph(encoder: FakeEncoder) -> semantic.Graph:
+    return semantic.Graph(
+        nodes=NODES,
+        embeddings=emb.normalize(np.vstack([_vector(n) for n in NODES])),
+        node_to_targets={node: [f"target of {node}"] for node in NODES},
+        encoder=cast(emb.Encoder, encoder),
+    )
+
+
+def _best_node(background: str, source: str, target: str) -> str:
+    """Best node computed one base input at a time."""
+    matrix = emb.normalize(np.vstack([_vector(n) for n in NODES]))
+    best_score, best_node = -np.inf, ""
+    for base_input in semantic._make_base_inputs(background, source, target):
+        scores = matrix @ emb.normalize(_vector(base_input)[None, :])[0]
+        if scores.max() > best_score:
+            best_score, best_node = scores.max(), NODES[int(scores.argmax())]
+    return best_node
+
+
+def test_semantic_query_many(
+    semantic_graph: semantic.Graph, encoder: FakeEncoder
+) -> None:
+    results = semantic_graph.query_many(QUERIES)
+
+    assert [r.match for r in results] == [_best_node(*q) for q in QUERIES]
+    assert [r.targets for r in results] == [[f"target of {r.match}"] for r in results]
+    # The repeated query's base inputs are encoded once, in a single call.
+    assert len(encoder.calls) == 1
+    assert len(encoder.calls[0]) == 4
+
+
+def test_semantic_query_many_empty(semantic_graph: semantic.Graph) -> None:
+    assert semantic_graph.query_many([]) == []
+
+
+def test_graph_query_many_matches_query_all(semantic_graph: semantic.Graph) -> None:
+    def ann(paper_id: str, background: str, relations: list[tuple[str, str]]) -> Any:
+        return SimpleNamespace(
+            id=paper_id,
+            background=background,
+            terms=SimpleNamespace(
+                relations=[SimpleNamespace(head=h, tail=t) for h, t in relations]
+            ),
+        )
+
+    anns = [
+        ann("p1", "background a", [("method x", "task y"), ("method z", "task w")]),
+        ann("p2", "background b", []),
+        ann("p3", "background c", [("method q", "task y")]),
+    ]
+    graph = Graph(
+        kg=cast(Any, None),
+        semantic=semantic_graph,
+        citations=citations.Graph(
+            title_to_id={},
+            id_to_cited={
+                paper_id: [
+                    citations.Citation(title=f"cited {paper_id}", paper_id="c", score=1)
+                ]
+                for paper_id in ("p1", "p2", "p3")
+            },
+        ),
+        encoder_model="hash",
+    )
+
+    results = graph.query_many(anns)
+
+    assert results == [graph.query_all(a) for a in anns]
+    assert results[1].semantic == []
+    assert results[2].citations == ["cited p3"]
@@ -0,0 +1,71 @@
+"""Unit tests for options passed from the command line to the encoder."""
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+from typer.testing import CliRunner
+
+from paper import embedding as emb
+from paper.baselines.scimon import build as scimon_build
+from paper.cli import app
+from paper.peter import cli as peter_cli
+
+
+class EncoderCreatedError(Exception):
+    """Raised by the fake encoder to stop the command once it has been created."""
+
+    def __init__(self, model_name: str, workers: int) -> None:
+        super().__init__(model_name, workers)
+        self.model_name = model_name
+        self.workers = workers
+
+
+def _fake_encoder(model_name: str, *_: Any, workers: int = 1, **__: Any) -> None:
+    raise EncoderCreatedError(model_name, workers)
+
+
+def _no_data(*_: Any, **__: Any) -> list[Any]:
+    return []
+
+
+@pytest.fixture(autouse=True)
+def fake_encoder(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Replace `emb.Encoder` so no model is loaded, and skip loading input data."""
+    monkeypatch.setattr(emb, "Encoder", _fake_encoder)
+    monkeypatch.setattr(peter_cli, "load_data", _no_data)
+    monkeypatch.setattr(scimon_build, "load_data", _no_data)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        pytest.param(
+            ["peter", "build", "--ann", "a", "--context", "c", "--output-dir", "o"],
+            id="peter",
+        ),
+        pytest.param(
+            [
+                *("baselines", "scimon", "build"),
+                *("--ann", "a", "--peerread", "p", "--output-dir", "o"),
+            ],
+            id="scimon",
+        ),
+        pytest.param(
+            ["baselines", "nova", "build", "--input", "i", "--output", "o"],
+            id="novascore",
+        ),
+    ],
+)
+def test_encode_workers_reach_encoder(
+    args: list[str], monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.chdir(tmp_path)
+
+    result = CliRunner().invoke(
+        app, [*args, "--model", "model", "--encode-workers", "3"]
+    )
+
+    assert isinstance(result.exception, EncoderCreatedError), result.output
+    assert result.exception.model_name == "model"
+    assert result.exception.workers == 3
@@ -0,0 +1,318 @@
+"""Unit tests for embedding helpers. Only the slow tests load a pretrained model."""
+
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.models import StaticEmbedding
+from tokenizers import Tokenizer, models, pre_tokenizers
+
+from paper.embedding import (
+    DEFAULT_SENTENCE_MODEL,
+    ONNX_EXPORT_DIR_ENV_VAR,
+    PARITY_MIN_COSINE,
+    Encoder,
+    EncoderBackend,
+    EncoderPool,
+    MatrixData,
+    StorageDtype,
+    _length_sorted_encode,
+    dequantize_int8,
+    embedding_parity,
+    normalize,
+    quantize_int8,
+    similarities,
+    top_k_cosine,
+    top_k_indices,
+    top_k_overlap,
+)
+
+
+def _fake_encode(texts: Sequence[str]) -> np.ndarray:
+    return np.array([[len(t), ord(t[0])] for t in texts], dtype=np.float32)
+
+
+def test_length_sorted_encode_restores_order() -> None:
+    texts = ["ccc", "a", "bbbbb", "dd"]
+    seen: list[list[str]] = []
+
+    def encode(items: Sequence[str]) -> np.ndarray:
+        seen.append(list(items))
+        return _fake_encode(items)
+
+    result = _length_sorted_encode(texts, [len(t) for t in texts], encode)
+
+    assert seen == [["a", "dd", "ccc", "bbbbb"]]
+    np.testing.assert_array_equal(result, _fake_encode(texts))
+
+
+def test_length_sorted_encode_stable_for_ties() -> None:
+    texts = ["b", "a", "c"]
+    seen: list[list[str]] = []
+
+    def encode(items: Sequence[str]) -> np.ndarray:
+        seen.append(list(items))
+        return _fake_encode(items)
+
+    _length_sorted_encode(texts, [1, 1, 1], encode)
+
+    assert seen == [texts]
+
+
+@pytest.fixture
+def matrix() -> np.ndarray:
+    return np.random.default_rng(0).normal(size=(50, 8)).astype(np.float32)
+
+
+def test_normalize_unit_rows(matrix: np.ndarray) -> None:
+    normalised = normalize(matrix)
+
+    np.testing.assert_allclose(np.linalg.norm(normalised, axis=1), 1, rtol=1e-5)
+    assert normalised.dtype == np.float32
+
+
+def test_normalize_zero_row() -> None:
+    normalised = normalize(np.zeros((2, 3), dtype=np.float32))
+
+    np.testing.assert_array_equal(normalised, 0)
+
+
+def test_top_k_cosine_matches_similarities(matrix: np.ndarray) -> None:
+    query = np.random.default_rng(1).normal(size=8).astype(np.float32)
+
+    scores, indices = top_k_cosine(query, normalize(matrix), k=5)
+
+    sims = similarities(query, matrix)
+    assert indices.tolist() == top_k_indices(sims, 5)
+    np.testing.assert_allclose(scores, sims[indices], rtol=1e-5)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_top_k_cosine_batch(matrix: np.ndarray) -> None:
+    queries = np.random.default_rng(2).normal(size=(4, 8)).astype(np.float32)
+    normalised = normalize(matrix)
+
+    scores, indices = top_k_cosine(queries, normalised, k=3)
+
+    assert scores.shape == indices.shape == (4, 3)
+    for query, row_scores, row_indices in zip(queries, scores, indices):
+        single_scores, single_indices = top_k_cosine(query, normalised, k=3)
+        np.testing.assert_array_equal(row_indices, single_indices)
+        np.testing.assert_allclose(row_scores, single_scores, rtol=1e-5)
+
+
+def test_top_k_cosine_k_larger_than_matrix(matrix: np.ndarray) -> None:
+    scores, indices = top_k_cosine(matrix[0], normalize(matrix), k=100)
+
+    assert sorted(indices.tolist()) == list(range(50))
+    assert indices[0] == 0
+    assert scores[0] == pytest.approx(1)
+
+
+def test_top_k_cosine_invalid_shapes(matrix: np.ndarray) -> None:
+    with pytest.raises(ValueError, match="compatible"):
+        top_k_cosine(np.ones(3, dtype=np.float32), matrix, k=1)
+
+
+def test_matrix_data_npy_is_memory_mapped(matrix: np.ndarray, tmp_path: Path) -> None:
+    data = MatrixData.from_matrix_npy(matrix, tmp_path / "m.npy")
+    loaded = data.to_matrix(tmp_path)
+
+    assert data.is_mapped
+    assert data.file == "m.npy"
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, matrix)
+
+
+def test_matrix_data_npy_float16(matrix: np.ndarray, tmp_path: Path) -> None:
+    data = MatrixData.from_matrix_npy(matrix, tmp_path / "m.npy", StorageDtype.FLOAT16)
+    loaded = data.to_matrix(tmp_path)
+
+    assert loaded.dtype == np.float32
+    np.testing.assert_allclose(loaded, matrix, rtol=1e-3)
+
+
+def test_matrix_data_npy_reuses_own_memory_map(
+    matrix: np.ndarray, tmp_path: Path
+) -> None:
+    path = tmp_path / "m.npy"
+    mapped = MatrixData.from_matrix_npy(matrix, path).to_matrix(tmp_path)
+    mtime = path.stat().st_mtime_ns
+
+    data = MatrixData.from_matrix_npy(mapped, path)
+
+    assert path.stat().st_mtime_ns == mtime
+    np.testing.assert_array_equal(data.to_matrix(tmp_path), matrix)
+
+
+def test_matrix_data_npy_replaces_own_memory_map(
+    matrix: np.ndarray, tmp_path: Path
+) -> None:
+    path = tmp_path / "m.npy"
+    mapped = MatrixData.from_matrix_npy(matrix, path).to_matrix(tmp_path)
+
+    data = MatrixData.from_matrix_npy(mapped, path, StorageDtype.FLOAT16)
+
+    np.testing.assert_array_equal(mapped, matrix)
+    np.testing.assert_allclose(data.to_matrix(tmp_path), matrix, rtol=1e-3)
+
+
+def test_matrix_data_inline_still_loads(matrix: np.ndarray) -> None:
+    data = MatrixData.model_validate_json(
+        MatrixData.from_matrix(matrix).model_dump_json()
+    )
+
+    assert not data.is_mapped
+    np.testing.assert_array_equal(data.to_matrix(), matrix)
+
+
+def test_matrix_data_npy_requires_base_dir(matrix: np.ndarray, tmp_path: Path) -> None:
+    data = MatrixData.from_matrix_npy(matrix, tmp_path / "m.npy")
+
+    with pytest.raises(ValueError, match="base directory"):
+        data.to_matrix()
+
+
+def test_quantize_int8_round_trip(matrix: np.ndarray) -> None:
+    quantised, scales = quantize_int8(matrix)
+
+    assert quantised.dtype == np.int8
+    assert np.abs(quantised).max() == 127
+    np.testing.assert_allclose(
+        dequantize_int8(quantised, scales), matrix, atol=scales.max() / 2
+    )
+
+
+def test_quantize_int8_zero_row() -> None:
+    quantised, scales = quantize_int8(np.zeros((2, 3), dtype=np.float32))
+
+    assert not quantised.any()
+    np.testing.assert_array_equal(scales, [1, 1])
+
+
+def test_matrix_data_npy_int8(matrix: np.ndarray, tmp_path: Path) -> None:
+    data = MatrixData.from_matrix_npy(matrix, tmp_path / "m.npy", StorageDtype.INT8)
+    loaded = data.to_matrix(tmp_path)
+
+    assert not data.is_mapped
+    assert (tmp_path / "m.scales.npy").exists()
+    assert data.nbytes == matrix.size + matrix.shape[0] * 4
+    assert loaded.dtype == np.float32
+    _, scales = quantize_int8(matrix)
+    np.testing.assert_allclose(loaded, matrix, atol=scales.max() / 2)
+
+
+def test_top_k_overlap() -> None:
+    reference = np.array([[0, 1, 2], [3, 4, 5]])
+    candidate = np.array([[2, 1, 0], [3, 6, 7]])
+
+    assert top_k_overlap(reference, candidate) == pytest.approx((1 + 1 / 3) / 2)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("backend", [EncoderBackend.ONNX, EncoderBackend.ONNX_INT8])
+def test_onnx_backend_parity(
+    backend: EncoderBackend, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pytest.importorskip("optimum.onnxruntime")
+    monkeypatch.setenv(ONNX_EXPORT_DIR_ENV_VAR, str(tmp_path))
+    texts = [
+        "Graph neural networks for citation recommendation.",
+        "We propose a retrieval method for scientific novelty assessment.",
+        "Transformers",
+        "A study of contrastive pre-training on biomedical abstracts with limited labels.",
+    ]
+
+    reference = Encoder(DEFAULT_SENTENCE_MODEL, "cpu", use_cache=False)
+    candidate = Encoder(DEFAULT_SENTENCE_MODEL, "cpu", use_cache=False, backend=backend)
+
+    parity = embedding_parity(reference, candidate, texts)
+
+    assert parity.min() >= PARITY_MIN_COSINE
+
+
+_TINY_VOCAB = ["[UNK]", "graph", "neural", "network", "paper", "novelty", "citation"]
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """Path to a small static-embedding model built locally, so no download is needed."""
+    tokenizer = Tokenizer(
+        models.WordLevel(
+            {word: i for i, word in enumerate(_TINY_VOCAB)}, unk_token=_TINY_VOCAB[0]
+        )
+    )
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    weights = np.random.default_rng(0).standard_normal((len(_TINY_VOCAB), 8))
+
+    path = tmp_path_factory.mktemp("tiny_model")
+    SentenceTransformer(
+        modules=[StaticEmbedding(tokenizer, embedding_weights=weights)]
+    ).save(str(path))
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def pool_encoder(tiny_model: str) -> Iterator[Encoder]:
+    """Encoder over `tiny_model`. The process pool is reused between tests."""
+    encoder = Encoder(tiny_model, "cpu", use_cache=False)
+    yield encoder
+    encoder.close()
+
+
+@pytest.mark.parametrize(
+    "texts",
+    [
+        pytest.param(
+            [
+                "graph neural network",
+                "paper",
+                "novelty citation graph",
+                "neural paper novelty",
+                "citation",
+            ],
+            id="uneven_shards",
+        ),
+        pytest.param(["graph neural network"], id="single"),
+        pytest.param([], id="empty"),
+    ],
+)
+def test_batch_encode_workers_match_single_process(
+    pool_encoder: Encoder, texts: list[str]
+) -> None:
+    # Batches of 2 over 5 texts give shards of 2, 2 and 1 rows.
+    expected = pool_encoder.batch_encode(texts, batch_size=2, workers=1)
+    result = pool_encoder.batch_encode(texts, batch_size=2, workers=2)
+
+    assert result.shape == (len(texts), 8)
+    np.testing.assert_allclose(result, expected, rtol=1e-6)
+
+
+def test_encoder_close_shuts_down_pool(tiny_model: str) -> None:
+    encoder = Encoder(tiny_model, "cpu", use_cache=False, workers=2)
+    encoder.batch_encode(["graph", "paper", "novelty"], batch_size=1)
+    pool = encoder._pool
+    assert pool is not None
+
+    encoder.close()
+
+    assert encoder._pool is None
+    with pytest.raises(RuntimeError, match="shutdown"):
+        pool.map([["graph"]])
+
+
+def test_encoder_pool_close(tiny_model: str) -> None:
+    pool = EncoderPool(tiny_model, workers=2)
+    assert len(list(pool.map([["graph"], ["paper"]]))) == 2
+
+    pool.close()
+
+    with pytest.raises(RuntimeError, match="shutdown"):
+        pool.map([["graph"]])
+
+
+def test_encoder_pool_needs_two_workers(tiny_model: str) -> None:
+    with pytest.raises(ValueError, match="at least 2 workers"):
+        EncoderPool(tiny_model, workers=1)
@@ -0,0 +1,128 @@
+"""Unit tests for the persistent embedding cache."""
+
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from paper.embedding_cache import EmbeddingCache
+
+
+class FakeModel:
+    """Deterministic 'model' that records which texts it was asked to encode."""
+
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        """Encode each text as (length, number of 'a's, 1)."""
+        self.calls.append(list(texts))
+        return np.array([[len(t), t.count("a"), 1.0] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> EmbeddingCache:
+    return EmbeddingCache(tmp_path / "cache.db")
+
+
+def test_only_misses_are_computed(cache: EmbeddingCache) -> None:
+    model = FakeModel()
+
+    first = cache.get_or_compute("m", ["aa", "b"], model)
+    second = cache.get_or_compute("m", ["b", "ccc", "aa"], model)
+
+    assert model.calls == [["aa", "b"], ["ccc"]]
+    np.testing.assert_array_equal(second, model(["b", "ccc", "aa"]))
+    np.testing.assert_array_equal(first, second[[2, 0]])
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 3
+
+
+def test_duplicates_are_computed_once(cache: EmbeddingCache) -> None:
+    model = FakeModel()
+
+    result = cache.get_or_compute("m", ["x", "y", "x"], model)
+
+    assert model.calls == [["x", "y"]]
+    assert result.shape == (3, 3)
+    np.testing.assert_array_equal(result[0], result[2])
+
+
+def test_keyed_by_model(cache: EmbeddingCache) -> None:
+    model = FakeModel()
+
+    cache.get_or_compute("m1", ["text"], model)
+    cache.get_or_compute("m2", ["text"], model)
+
+    assert model.calls == [["text"], ["text"]]
+
+
+def test_persists_across_instances(tmp_path: Path) -> None:
+    model = FakeModel()
+    path = tmp_path / "cache.db"
+
+    EmbeddingCache(path).get_or_compute("m", ["a", "b"], model)
+    reopened = EmbeddingCache(path)
+    reopened.get_or_compute("m", ["a", "b"], model)
+
+    assert len(model.calls) == 1
+    assert reopened.stats.hits == 2
+    assert len(reopened) == 2
+
+
+def test_evicts_least_recently_used(tmp_path: Path) -> None:
+    model = FakeModel()
+    cache = EmbeddingCache(tmp_path / "cache.db", max_entries=2)
+
+    cache.get_or_compute("m", ["a"], model)
+    cache.get_or_compute("m", ["b"], model)
+    cache.get_or_compute("m", ["a"], model)  # 'a' is now more recent than 'b'
+    cache.get_or_compute("m", ["c"], model)  # evicts 'b'
+
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+
+    model.calls.clear()
+    cache.get_or_compute("m", ["a", "b", "c"], model)
+    assert model.calls == [["b"]]
+
+
+def test_replacing_entry_does_not_count_twice(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path / "cache.db", max_entries=2)
+    vector = np.ones(2, dtype=np.float32)
+
+    cache.put_many("m", [("a", vector), ("a", vector)])
+    cache.put_many("m", [("a", vector)])
+    cache.put_many("m", [("b", vector)])
+
+    assert cache.stats.evictions == 0
+    assert len(cache) == 2
+
+
+def test_limit_includes_entries_from_previous_runs(tmp_path: Path) -> None:
+    path = tmp_path / "cache.db"
+    cache = EmbeddingCache(path)
+    cache.get_or_compute("m", ["a", "b"], FakeModel())
+    cache.close()
+
+    reopened = EmbeddingCache(path, max_entries=2)
+    reopened.get_or_compute("m", ["c"], FakeModel())
+
+    assert len(reopened) == 2
+    assert reopened.stats.evictions == 1
+
+
+def test_clear_resets_count(tmp_path: Path) -> None:
+    cache = EmbeddingCache(tmp_path / "cache.db", max_entries=2)
+    cache.get_or_compute("m", ["a", "b"], FakeModel())
+    cache.clear()
+    cache.get_or_compute("m", ["c", "d"], FakeModel())
+
+    assert cache.stats.evictions == 0
+    assert len(cache) == 2
+
+
+def test_invalid_max_entries(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="max_entries"):
+        EmbeddingCache(tmp_path / "cache.db", max_entries=0)
@@ -0,0 +1,153 @@
+"""Tests for the graph query server and its client, using an in-memory PETER graph."""
+
+from pathlib import Path
+from typing import cast
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from paper import embedding as emb
+from paper import graph_client
+from paper.graph_client import GraphClient, PeterClient, PeterPaper
+from paper.graph_server import LoadedGraphs, create_app
+from paper.peerread import ContextPolarity
+from paper.peter import citations, semantic
+from paper.peter.graph import Graph, _save_metadata
+from tests.helpers import FakeEncoder
+
+VECTORS = {
+    "background a": [1.0, 0.0],
+    "background b": [0.0, 1.0],
+    "target a": [0.6, 0.8],
+    "target b": [0.8, 0.6],
+    "query background": [0.9, 0.1],
+    "query target": [0.1, 0.9],
+}
+
+
+def _components(kind: str) -> semantic._Components:
+    papers = {
+        f"{kind} {name}": semantic._PaperRelated(
+            title=f"paper {name}",
+            abstract="",
+            paper_id=name,
+            background=f"background {name}",
+            target=f"target {name}",
+        )
+        for name in "ab"
+    }
+    nodes = sorted(papers)
+    return semantic._Components(
+        nodes=nodes,
+        embeddings=np.array([VECTORS[n] for n in nodes], dtype=np.float32),
+        node_to_paper=papers,
+    )
+
+
+@pytest.fixture
+def peter_graph() -> Graph:
+    encoder = FakeEncoder({
+        k: np.array(v, dtype=np.float32) for k, v in VECTORS.items()
+    })
+    empty: dict[ContextPolarity, list[citations.Citation]] = {
+        ContextPolarity.POSITIVE: [],
+        ContextPolarity.NEGATIVE: [],
+    }
+    return Graph(
+        citation=citations.Graph(title_to_id={}, id_polarity_to_cited={"q": empty}),
+        semantic=semantic.Graph(
+            encoder=cast(emb.Encoder, encoder),
+            backgrounds=_components("background"),
+            targets=_components("target"),
+        ),
+        encoder_model="fake",
+    )
+
+
+@pytest.fixture
+def app(peter_graph: Graph, tmp_path: Path) -> FastAPI:
+    _save_metadata(tmp_path / Graph.METADATA_FILENAME, "fake", version=1)
+    return create_app(
+        LoadedGraphs(peter=peter_graph, peter_dir=tmp_path.resolve(), peter_version=1)
+    )
+
+
+@pytest.fixture
+def client(app: FastAPI) -> GraphClient:
+    return GraphClient("http://test", http=TestClient(app))
+
+
+QUERY = [PeterPaper(id="q", background="query background", target="query target")]
+
+
+def test_health(client: GraphClient, tmp_path: Path) -> None:
+    info = client.info()
+
+    assert info.peter_dir == str(tmp_path.resolve())
+    assert info.peter_version == 1
+    assert info.scimon_dir is None
+
+
+def test_peter_query_matches_graph(client: GraphClient, peter_graph: Graph) -> None:
+    remote = PeterClient(client)
+
+    assert remote.query_many(QUERY, semantic_k=1, citation_k=1) == (
+        peter_graph.query_many(QUERY, semantic_k=1, citation_k=1)
+    )
+    assert remote.query_threshold_many(QUERY, 0.5, 0.5, 2) == (
+        peter_graph.query_threshold_many(QUERY, 0.5, 0.5, 2)
+    )
+
+
+def test_missing_graph_is_not_found(client: GraphClient) -> None:
+    # The test client may use a different HTTP library, so match the message.
+    with pytest.raises(Exception, match="404 Not Found"):
+        graph_client.ScimonClient(client).query_many([])
+
+
+@pytest.fixture
+def server_env(app: FastAPI, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Make `GraphClient.from_env` return a client for `app`."""
+
+    def from_env(_: type[GraphClient]) -> GraphClient:
+        return GraphClient("http://test", http=TestClient(app))
+
+    monkeypatch.setattr(GraphClient, "from_env", classmethod(from_env))
+
+
+@pytest.mark.usefixtures("server_env")
+def test_connect_checks_graph_dir(tmp_path: Path) -> None:
+    assert graph_client.connect(tmp_path, "peter") is not None
+    assert graph_client.connect(tmp_path / "other", "peter") is None
+    assert graph_client.connect(tmp_path, "scimon") is None
+
+
+def test_connect_without_server(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv(graph_client.SERVER_ENV_VAR, raising=False)
+
+    assert graph_client.connect(Path(), "peter") is None
+
+
+@pytest.mark.usefixtures("server_env")
+def test_connect_checks_peter_version(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # The graph was updated after the server loaded it.
+    _save_metadata(tmp_path / Graph.METADATA_FILENAME, "fake", version=2)
+    local = object()
+
+    def load(_: type[Graph], graph_dir: Path) -> object:
+        assert graph_dir == tmp_path
+        return local
+
+    monkeypatch.setattr(Graph, "load", classmethod(load))
+
+    assert graph_client.connect(tmp_path, "peter") is None
+    assert graph_client.load_peter(tmp_path) is local
+
+
+@pytest.mark.usefixtures("server_env")
+def test_load_peter_uses_server(tmp_path: Path) -> None:
+    assert isinstance(graph_client.load_peter(tmp_path), PeterClient)
@@ -0,0 +1,49 @@
+"""Unit tests for the memory-mapped sentence store."""
+
+from pathlib import Path
+
+import pytest
+
+from paper.sentence_store import SentenceStore
+
+SENTENCES = ["first sentence", "", "ünïcödé — text", "last one"]
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    SentenceStore(SENTENCES).save(tmp_path)
+    store = SentenceStore.load(tmp_path)
+
+    assert len(store) == len(SENTENCES)
+    assert list(store) == SENTENCES
+    assert store[-1] == SENTENCES[-1]
+    assert store[1:3] == SENTENCES[1:3]
+
+
+def test_append_and_save_in_place(tmp_path: Path) -> None:
+    SentenceStore(SENTENCES[:2]).save(tmp_path)
+    store = SentenceStore.load(tmp_path)
+
+    store.extend(SENTENCES[2:])
+    assert list(store) == SENTENCES
+
+    store.save(tmp_path)
+    assert list(SentenceStore.load(tmp_path)) == SENTENCES
+
+
+def test_empty(tmp_path: Path) -> None:
+    SentenceStore().save(tmp_path)
+    store = SentenceStore.load(tmp_path)
+
+    assert len(store) == 0
+    assert list(store) == []
+
+
+def test_index_out_of_range() -> None:
+    with pytest.raises(IndexError):
+        SentenceStore(SENTENCES)[len(SENTENCES)]
+
+
+def test_exists(tmp_path: Path) -> None:
+    assert not SentenceStore.exists(tmp_path)
+    SentenceStore(SENTENCES).save(tmp_path)
+    assert SentenceStore.exists(tmp_path)
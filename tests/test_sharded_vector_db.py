@@ -0,0 +1,153 @@
+"""Unit tests for the sharded vector database that don't require loading a model."""
+
+from pathlib import Path
+from typing import Any, cast
+
+import numpy as np
+import pytest
+
+from paper import embedding as emb
+from paper.sharded_vector_db import Manifest, ShardedVectorDatabase
+from paper.vector_db import IndexConfig, IndexType
+from tests.helpers import FakeEncoder
+
+SENTENCES = [f"s{i}" for i in range(300)]
+
+
+@pytest.fixture
+def encoder(monkeypatch: pytest.MonkeyPatch) -> FakeEncoder:
+    """Fake encoder, also returned by `emb.Encoder` for the loaded databases."""
+    rng = np.random.default_rng(0)
+    vectors = emb.normalize(
+        rng.standard_normal((len(SENTENCES), 16)).astype(np.float32)
+    )
+    fake = FakeEncoder(dict(zip(SENTENCES, vectors)))
+
+    def load(*_: Any, **__: Any) -> FakeEncoder:
+        return fake
+
+    monkeypatch.setattr(emb, "Encoder", load)
+    return fake
+
+
+def _create(
+    db_dir: Path, encoder: FakeEncoder, config: IndexConfig | None = None
+) -> ShardedVectorDatabase:
+    manifest = Manifest(
+        model_name=encoder.model_name, batch_size=10, index=config or IndexConfig()
+    )
+    return ShardedVectorDatabase(
+        db_dir, cast(emb.Encoder, encoder), manifest, shards=[], template=None
+    )
+
+
+def _load(db_dir: Path) -> ShardedVectorDatabase:
+    return ShardedVectorDatabase.load(db_dir)
+
+
+def test_shards_match_single_index(tmp_path: Path, encoder: FakeEncoder) -> None:
+    sharded = _create(tmp_path / "sharded", encoder)
+    for start in range(0, len(SENTENCES), 100):
+        sharded.add_sentences(SENTENCES[start : start + 100])
+
+    single = _create(tmp_path / "single", encoder)
+    single.add_sentences(SENTENCES)
+
+    queries = SENTENCES[:5]
+    assert sharded.num_shards == 3
+    assert [r.matches for r in sharded.search(queries, k=5, threshold=0)] == [
+        r.matches for r in single.search(queries, k=5, threshold=0)
+    ]
+    assert [r.matches for r in sharded.search_range(queries, threshold=0.5)] == [
+        r.matches for r in single.search_range(queries, threshold=0.5)
+    ]
+
+
+def test_add_only_writes_new_shard(tmp_path: Path, encoder: FakeEncoder) -> None:
+    db = _create(tmp_path, encoder)
+    first = db.add_sentences(SENTENCES[:100])
+    first_index = tmp_path / str(first) / "index.faiss"
+    mtime = first_index.stat().st_mtime_ns
+
+    db.add_sentences(SENTENCES[100:200])
+
+    assert first_index.stat().st_mtime_ns == mtime
+    loaded = _load(tmp_path)
+    assert loaded.num_shards == 2
+    assert len(loaded) == 200
+
+
+def test_delete_and_compact(tmp_path: Path, encoder: FakeEncoder) -> None:
+    db = _create(tmp_path, encoder)
+    for start in range(0, len(SENTENCES), 50):
+        db.add_sentences(SENTENCES[start : start + 50])
+
+    assert db.delete_sentences(["s0", "s123"]) == 2
+    assert db.find_best(["s0"], threshold=0.99) == [None]
+
+    loaded = _load(tmp_path)
+    assert len(loaded) == len(SENTENCES) - 2
+    assert loaded.find_best(["s0"], threshold=0.99) == [None]
+
+    assert loaded.compact(min_size=100) == 6
+    assert loaded.num_shards == 1
+    # The old shards are kept for readers of the previous manifest.
+    assert len(list(tmp_path.glob("shard-*"))) == 7
+
+    reloaded = _load(tmp_path)
+    assert len(reloaded) == len(SENTENCES) - 2
+    [best] = reloaded.find_best(["s1"], threshold=0.99)
+    assert best is not None
+    assert best.sentence == "s1"
+
+
+def test_ivf_trained_once(tmp_path: Path, encoder: FakeEncoder) -> None:
+    config = IndexConfig(type=IndexType.IVF_FLAT, nlist=4, nprobe=4)
+    db = _create(tmp_path, encoder, config)
+    db.add_sentences(SENTENCES[:200])
+    db.add_sentences(SENTENCES[200:202])
+
+    assert (tmp_path / ShardedVectorDatabase.TEMPLATE_FILE).exists()
+    [best] = db.find_best(["s201"], threshold=0.99)
+    assert best is not None
+    assert best.sentence == "s201"
+
+
+def test_retired_shards_removed_by_next_compaction(
+    tmp_path: Path, encoder: FakeEncoder
+) -> None:
+    db = _create(tmp_path, encoder)
+    old = [db.add_sentences(SENTENCES[start : start + 50]) for start in (0, 50)]
+    old_manifest = Manifest.model_validate_json(
+        (tmp_path / ShardedVectorDatabase.MANIFEST_FILE).read_bytes()
+    )
+
+    assert db.compact(min_size=100) == 2
+
+    # A reader that listed the shards before the switch can still open them.
+    assert [shard.name for shard in old_manifest.shards] == old
+    assert all((tmp_path / str(name) / "index.faiss").exists() for name in old)
+
+    loaded = _load(tmp_path)
+    assert len(loaded) == 100
+    assert loaded.compact(min_size=100) == 0
+    assert not any((tmp_path / str(name)).exists() for name in old)
+    assert len(_load(tmp_path)) == 100
+
+
+def test_delete_and_compact_do_not_load_encoder(
+    tmp_path: Path, encoder: FakeEncoder, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    db = _create(tmp_path, encoder)
+    db.add_sentences(SENTENCES[:50])
+    db.add_sentences(SENTENCES[50:100])
+
+    def fail(*_: object, **__: object) -> emb.Encoder:
+        raise AssertionError("Encoder loaded")
+
+    monkeypatch.setattr(emb, "Encoder", fail)
+    loaded = _load(tmp_path)
+
+    assert loaded.delete_sentences(["s1"]) == 1
+    assert loaded.compact(min_size=100) == 2
+    assert len(_load(tmp_path)) == 99
@@ -0,0 +1,132 @@
+"""Unit tests for vector database indexes that don't require loading a model."""
+
+from typing import cast
+
+import faiss  # type: ignore
+import numpy as np
+import pytest
+
+from paper import embedding as emb
+from paper.sentence_store import SentenceStore
+from paper.vector_db import (
+    IndexConfig,
+    IndexType,
+    VectorDatabase,
+    create_index,
+    set_search_params,
+)
+from tests.helpers import FakeEncoder
+
+
+@pytest.fixture
+def vectors() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return emb.normalize(rng.standard_normal((500, 16)).astype(np.float32))
+
+
+def _filled_index(config: IndexConfig, vectors: np.ndarray) -> faiss.Index:
+    index = create_index(vectors.shape[1], config)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+@pytest.mark.parametrize("precision", list(emb.StorageDtype))
+def test_create_index_precision(
+    precision: emb.StorageDtype, vectors: np.ndarray
+) -> None:
+    index = _filled_index(IndexConfig(precision=precision), vectors)
+    _, indices = index.search(vectors[:20], 1)
+
+    np.testing.assert_array_equal(indices[:, 0], np.arange(20))
+
+
+def test_create_index_reduces_size() -> None:
+    vectors = np.eye(32, dtype=np.float32)
+    sizes = [
+        faiss.serialize_index(
+            _filled_index(IndexConfig(precision=precision), vectors)
+        ).nbytes
+        for precision in emb.StorageDtype
+    ]
+
+    assert sizes == sorted(sizes, reverse=True)
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        IndexConfig(type=IndexType.HNSW, hnsw_m=8),
+        IndexConfig(type=IndexType.IVF_FLAT, nlist=8, nprobe=8),
+        IndexConfig(type=IndexType.IVF_PQ, nlist=8, nprobe=8, pq_m=16, pq_bits=4),
+    ],
+    ids=lambda c: c.type,
+)
+def test_approximate_index_recall(config: IndexConfig, vectors: np.ndarray) -> None:
+    index = _filled_index(config, vectors)
+    _, indices = index.search(vectors[:50], 5)
+    _, exact = _filled_index(IndexConfig(), vectors).search(vectors[:50], 5)
+
+    assert emb.top_k_overlap(exact, indices) >= 0.8
+
+
+def test_set_search_params(vectors: np.ndarray) -> None:
+    config = IndexConfig(type=IndexType.IVF_FLAT, nlist=8, nprobe=2)
+    index = _filled_index(config, vectors)
+    assert faiss.extract_index_ivf(index).nprobe == 2
+
+    set_search_params(index, config, nprobe=5)
+    assert faiss.extract_index_ivf(index).nprobe == 5
+
+
+def test_create_hnsw_index_params() -> None:
+    config = IndexConfig(
+        type=IndexType.HNSW, precision=emb.StorageDtype.INT8, ef_construction=77
+    )
+    hnsw = cast(faiss.IndexHNSW, faiss.downcast_index(create_index(16, config))).hnsw
+
+    assert hnsw.efConstruction == 77
+    assert hnsw.efSearch == config.ef_search
+
+
+def test_ivf_pq_invalid_sub_quantisers() -> None:
+    with pytest.raises(ValueError, match="must divide"):
+        create_index(16, IndexConfig(type=IndexType.IVF_PQ, pq_m=5))
+
+
+@pytest.fixture
+def db(vectors: np.ndarray) -> VectorDatabase:
+    sentences = [f"s{i}" for i in range(len(vectors))]
+    encoder = FakeEncoder(dict(zip(sentences, vectors)))
+    index = create_index(vectors.shape[1])
+    index.add(vectors)
+    return VectorDatabase(
+        cast(emb.Encoder, encoder), index, SentenceStore(sentences), batch_size=10
+    )
+
+
+def test_search_range_matches_search(db: VectorDatabase) -> None:
+    queries = ["s0", "s1", "s2"]
+
+    expected = db.search(queries, k=len(db.sentences), threshold=0.5)
+    result = db.search_range(queries, threshold=0.5)
+
+    assert [r.matches for r in result] == [r.matches for r in expected]
+    assert all(m.score >= 0.5 for r in result for m in r.matches)
+
+
+def test_search_range_limit(db: VectorDatabase) -> None:
+    result = db.search_range(["s0"], threshold=0.0, limit=3)
+
+    assert [m.sentence for m in result[0].matches] == [
+        m.sentence for m in db.search(["s0"], k=3, threshold=0.0)[0].matches
+    ]
+
+
+def test_find_best(db: VectorDatabase) -> None:
+    [best] = db.find_best(["s0"], threshold=0.99)
+
+    assert best is not None
+    assert best.sentence == "s0"
+    assert db.find_best(["s0"], threshold=1.1) == [None]
@@ -0,0 +1,297 @@
+"""Test the token bucket chat rate limiter."""
+
+import asyncio
+import contextlib
+import time
+
+import pytest
+
+from paper.util.rate_limiter import (
+    ChatRateLimiter,
+    Message,
+    _parse_duration,
+    count_request_tokens,
+)
+
+MESSAGES: list[Message] = [{"role": "user", "content": "Hello"}]
+TOKENS = count_request_tokens(MESSAGES, max_tokens=10)
+"""Estimated tokens for a request with `MESSAGES` and `max_tokens=10`."""
+
+
+async def _request(
+    limiter: ChatRateLimiter, order: list[int], idx: int, max_tokens: int = 10
+) -> float:
+    """Make a request through the limiter and record when it was admitted."""
+    async with limiter.limit(messages=MESSAGES, max_tokens=max_tokens):
+        order.append(idx)
+        return time.monotonic()
+
+
+@pytest.mark.asyncio
+async def test_admits_immediately_under_capacity() -> None:
+    limiter = ChatRateLimiter(request_limit=5, token_limit=100 * TOKENS)
+    order: list[int] = []
+
+    start = time.monotonic()
+    await asyncio.gather(*(_request(limiter, order, i) for i in range(5)))
+
+    assert time.monotonic() - start < 0.05
+    assert order == list(range(5))
+
+
+@pytest.mark.asyncio
+async def test_request_limit_waits_for_refill_in_order() -> None:
+    # One request every 0.1s once the first 2 are used.
+    limiter = ChatRateLimiter(
+        request_limit=10, token_limit=100 * TOKENS, bucket_size_in_seconds=1
+    )
+    for _ in range(8):
+        async with limiter.limit(messages=MESSAGES, max_tokens=10):
+            pass
+
+    order: list[int] = []
+    start = time.monotonic()
+    times = await asyncio.gather(*(_request(limiter, order, i) for i in range(5)))
+
+    assert order == list(range(5))
+    assert times[1] - start < 0.05
+    # The other 3 wait for the refill.
+    assert times[4] - start == pytest.approx(0.3, abs=0.08)
+
+
+@pytest.mark.asyncio
+async def test_token_limit_waits_for_refill() -> None:
+    limiter = ChatRateLimiter(
+        request_limit=100, token_limit=2 * TOKENS, bucket_size_in_seconds=1
+    )
+    order: list[int] = []
+
+    start = time.monotonic()
+    times = await asyncio.gather(*(_request(limiter, order, i) for i in range(3)))
+
+    assert times[1] - start < 0.05
+    assert times[2] - start == pytest.approx(0.5, abs=0.08)
+
+
+@pytest.mark.asyncio
+async def test_refund_wakes_waiters() -> None:
+    limiter = ChatRateLimiter(
+        request_limit=100, token_limit=TOKENS, bucket_size_in_seconds=60
+    )
+    order: list[int] = []
+
+    async with limiter.limit(messages=MESSAGES, max_tokens=10) as update:
+        waiter = asyncio.create_task(_request(limiter, order, 1))
+        await asyncio.sleep(0.01)
+        assert not order
+
+        # Nothing was actually used, so all the estimate is refunded.
+        await update(0)
+        await asyncio.wait_for(waiter, timeout=1)
+
+    assert order == [1]
+
+
+@pytest.mark.asyncio
+async def test_extra_usage_is_charged() -> None:
+    limiter = ChatRateLimiter(
+        request_limit=100, token_limit=2 * TOKENS, bucket_size_in_seconds=1
+    )
+    order: list[int] = []
+
+    async with limiter.limit(messages=MESSAGES, max_tokens=10) as update:
+        await update(3 * TOKENS)
+
+    # The bucket is at -TOKENS, so the next request waits until it refills to TOKENS.
+    start = time.monotonic()
+    admitted = await _request(limiter, order, 0)
+    assert admitted - start == pytest.approx(1, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_block_queue() -> None:
+    limiter = ChatRateLimiter(
+        request_limit=10, token_limit=100 * TOKENS, bucket_size_in_seconds=1
+    )
+    for _ in range(10):
+        async with limiter.limit(messages=MESSAGES, max_tokens=10):
+            pass
+
+    order: list[int] = []
+    first = asyncio.create_task(_request(limiter, order, 0))
+    second = asyncio.create_task(_request(limiter, order, 1))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    start = time.monotonic()
+    admitted = await second
+    assert order == [1]
+    # The second request takes the slot the first would have used.
+    assert admitted - start == pytest.approx(0.09, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_oversized_request_admitted_when_full() -> None:
+    limiter = ChatRateLimiter(request_limit=10, token_limit=TOKENS)
+    order: list[int] = []
+
+    await asyncio.wait_for(_request(limiter, order, 0, max_tokens=10_000), timeout=1)
+
+    assert order == [0]
+
+
+@pytest.mark.asyncio
+async def test_requires_messages_or_contents() -> None:
+    limiter = ChatRateLimiter(request_limit=10, token_limit=1000)
+
+    with pytest.raises(ValueError, match="Either messages or contents"):
+        async with limiter.limit():
+            pass
+
+
+def _headers(
+    requests: tuple[int, int, str], tokens: tuple[int, int, str] | None = None
+) -> dict[str, str]:
+    """Rate limit headers from (limit, remaining, reset) for requests and tokens."""
+    headers: dict[str, str] = {}
+    for kind, values in [("requests", requests), ("tokens", tokens)]:
+        if values is not None:
+            limit, remaining, reset = values
+            headers[f"x-ratelimit-limit-{kind}"] = str(limit)
+            headers[f"x-ratelimit-remaining-{kind}"] = str(remaining)
+            headers[f"x-ratelimit-reset-{kind}"] = reset
+    return headers
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("6m0s", 360),
+        ("1.5s", 1.5),
+        ("20ms", 0.02),
+        ("1h2m3s", 3723),
+        ("2", 2),
+        ("soon", None),
+        ("5s later", None),
+        (None, None),
+    ],
+)
+def test_parse_duration(value: str | None, expected: float | None) -> None:
+    assert _parse_duration(value) == pytest.approx(expected)
+
+
+@pytest.mark.asyncio
+async def test_observe_adopts_provider_limits() -> None:
+    limiter = ChatRateLimiter(request_limit=1000, token_limit=1_000_000)
+
+    # 4 of 10 requests used, back to full in 2s: 2 requests per second.
+    limiter.observe(200, _headers((10, 6, "2s"), (5000, 5000, "0s")))
+
+    assert limiter.request_limit == 10
+    assert limiter.token_limit == 5000
+
+    order: list[int] = []
+    start = time.monotonic()
+    times = await asyncio.gather(*(_request(limiter, order, i) for i in range(7)))
+
+    assert times[5] - start < 0.05
+    assert times[6] - start == pytest.approx(0.5, abs=0.08)
+
+
+@pytest.mark.asyncio
+async def test_observe_ignores_missing_headers() -> None:
+    limiter = ChatRateLimiter(request_limit=10, token_limit=100 * TOKENS)
+
+    limiter.observe(200, {"x-ratelimit-remaining-requests": "invalid"})
+
+    assert limiter.request_limit == 10
+    assert limiter.token_limit == 100 * TOKENS
+    assert limiter.concurrency == 10
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_halves_concurrency_and_pauses() -> None:
+    limiter = ChatRateLimiter(request_limit=100, token_limit=100 * TOKENS)
+    order: list[int] = []
+
+    async with contextlib.AsyncExitStack() as stack:
+        for _ in range(8):
+            await stack.enter_async_context(
+                limiter.limit(messages=MESSAGES, max_tokens=10)
+            )
+        limiter.observe(429, {"retry-after-ms": "200"})
+        assert limiter.concurrency == 4
+
+    # Nothing in flight, but requests still wait for the pause.
+    start = time.monotonic()
+    admitted = await _request(limiter, order, 0)
+    assert admitted - start == pytest.approx(0.2, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limits_requests_in_flight() -> None:
+    limiter = ChatRateLimiter(request_limit=100, token_limit=100 * TOKENS)
+    async with limiter.limit(messages=MESSAGES, max_tokens=10):
+        limiter.observe(429, {"retry-after": "0"})
+    assert limiter.concurrency == 1
+
+    order: list[int] = []
+    async with limiter.limit(messages=MESSAGES, max_tokens=10):
+        waiter = asyncio.create_task(_request(limiter, order, 1))
+        await asyncio.sleep(0.05)
+        assert not order
+
+    # Finishing the first request lets the second one in.
+    await asyncio.wait_for(waiter, timeout=1)
+    assert order == [1]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_grows_with_headroom() -> None:
+    limiter = ChatRateLimiter(request_limit=100, token_limit=100 * TOKENS)
+    async with limiter.limit(messages=MESSAGES, max_tokens=10):
+        limiter.observe(429, {"retry-after": "0"})
+    assert limiter.concurrency == 1
+
+    limiter.observe(200, _headers((100, 50, "30s")))
+    limiter.observe(200, _headers((100, 50, "30s")))
+    assert limiter.concurrency == 3
+
+    # Too close to the limit to grow.
+    limiter.observe(200, _headers((100, 5, "57s")))
+    assert limiter.concurrency == 3
+
+
+@pytest.mark.asyncio
+async def test_oversized_request_admitted_after_limit_shrinks() -> None:
+    limiter = ChatRateLimiter(
+        request_limit=100, token_limit=1_000_000, bucket_size_in_seconds=1
+    )
+    limiter.observe(200, _headers((100, 100, "0s"), (TOKENS, TOKENS, "0s")))
+    order: list[int] = []
+
+    await asyncio.wait_for(_request(limiter, order, 0, max_tokens=10_000), timeout=1)
+
+    assert order == [0]
+
+
+@pytest.mark.asyncio
+async def test_queued_request_rechecked_after_limit_shrinks() -> None:
+    limiter = ChatRateLimiter(
+        request_limit=100, token_limit=100 * TOKENS, bucket_size_in_seconds=60
+    )
+    order: list[int] = []
+
+    async with limiter.limit(messages=MESSAGES, max_tokens=10):
+        # Needs more than what's left, so it waits for the refill.
+        waiter = asyncio.create_task(
+            _request(limiter, order, 1, max_tokens=100 * TOKENS)
+        )
+        await asyncio.sleep(0.01)
+        assert not order
+
+        # The new limit is below the request, so it only needs a full bucket.
+        limiter.observe(200, _headers((100, 99, "0s"), (TOKENS, TOKENS, "0s")))
+        await asyncio.wait_for(waiter, timeout=1)
+
+    assert order == [1]